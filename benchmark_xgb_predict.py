@@ -0,0 +1,129 @@
+"""
+XGBoost Predict Benchmark
+เทียบ latency / throughput ของ XGBoost predictors สำหรับ batch sizes ตั้งแต่ 1 ถึง 1M แถว
+
+- sklearn_predict_proba: XGBClassifier.predict_proba (xgboost.pkl) - แปลง DMatrix ทุกครั้ง
+- booster_inplace_predict: Booster.inplace_predict (xgboost.ubj)
+- compiled_numpy: CompiledTrees.predict_proba (xgboost_trees.npz, NumPy อย่างเดียว)
+
+ทุกตัวใช้ input ที่ผ่าน preprocessor แล้ว (float32) ชุดเดียวกัน - วัดเฉพาะเวลา predict
+ผลลัพธ์: experiments/run_{RUN_NUMBER}_xgb_predict_benchmark/benchmark_results.csv
+
+Usage:
+    python benchmark_xgb_predict.py
+"""
+
+import pickle
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import MODELS_DIR, RUN_NUMBER
+from data_prep import get_prepared_data
+from logger_config import setup_logger
+from model_artifacts import load_model_artifacts
+from xgb_compiler import compile_booster
+
+logger = setup_logger("benchmark_xgb_predict")
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000, 1_000_000]
+
+# เวลาขั้นต่ำที่วัดต่อ (predictor, batch size) - batch เล็กจะถูกวนซ้ำจนครบเวลานี้
+MIN_MEASURE_SECONDS = 1.0
+MIN_REPEATS = 3
+
+
+def make_batch(X_encoded, batch_size):
+    """batch ขนาด batch_size จากแถวของ test set (วนซ้ำแถวถ้า test set เล็กกว่า)"""
+    idx = np.arange(batch_size) % X_encoded.shape[0]
+    return np.ascontiguousarray(X_encoded[idx])
+
+
+def time_predictor(predict, batch):
+    """
+    วัดเวลา predict(batch) ซ้ำจนครบ MIN_MEASURE_SECONDS (อย่างน้อย MIN_REPEATS รอบ)
+
+    Returns:
+        dict: latency (median / p95, ms) และ throughput (rows/s จาก median)
+    """
+    predict(batch)  # warm-up
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < MIN_REPEATS or time.perf_counter() - start < MIN_MEASURE_SECONDS:
+        t0 = time.perf_counter()
+        predict(batch)
+        timings.append(time.perf_counter() - t0)
+    timings = np.asarray(timings)
+    median = float(np.median(timings))
+    return {
+        "repeats": len(timings),
+        "latency_median_ms": median * 1000,
+        "latency_p95_ms": float(np.percentile(timings, 95)) * 1000,
+        "rows_per_s": batch.shape[0] / median,
+    }
+
+
+def run_benchmark(xgb_model, booster, compiled, X_encoded, batch_sizes=BATCH_SIZES):
+    """
+    Returns:
+        pd.DataFrame: 1 แถวต่อ (predictor, batch size) + speedup ของ compiled เทียบ sklearn
+    """
+    iteration_range = (0, 0)
+    best_iteration = booster.attr("best_iteration")
+    if best_iteration is not None:
+        iteration_range = (0, int(best_iteration) + 1)
+
+    predictors = {
+        "sklearn_predict_proba": lambda X: xgb_model.predict_proba(X)[:, 1],
+        "booster_inplace_predict": lambda X: booster.inplace_predict(
+            X, iteration_range=iteration_range, validate_features=False),
+        "compiled_numpy": compiled.predict_proba,
+    }
+
+    # ตรวจว่าทุก predictor ให้ผลเดียวกันก่อนวัดเวลา
+    check = make_batch(X_encoded, min(10_000, max(batch_sizes)))
+    reference = predictors["booster_inplace_predict"](check)
+    for name, predict in predictors.items():
+        max_diff = float(np.abs(predict(check) - reference).max())
+        logger.info(f"{name}: max |proba - booster| = {max_diff:.3g}")
+
+    results = []
+    for batch_size in batch_sizes:
+        batch = make_batch(X_encoded, batch_size)
+        for name, predict in predictors.items():
+            stats = time_predictor(predict, batch)
+            results.append({"predictor": name, "batch_size": batch_size, **stats})
+            logger.info(f"batch={batch_size:>9,} {name:<24} median {stats['latency_median_ms']:10.3f} ms "
+                        f"| p95 {stats['latency_p95_ms']:10.3f} ms | {stats['rows_per_s']:14,.0f} rows/s")
+
+    results_df = pd.DataFrame(results)
+    sklearn_rate = results_df[results_df["predictor"] == "sklearn_predict_proba"].set_index("batch_size")["rows_per_s"]
+    results_df["speedup_vs_sklearn"] = results_df["rows_per_s"] / results_df["batch_size"].map(sklearn_rate)
+    return results_df
+
+
+if __name__ == "__main__":
+    logger.info("=" * 70)
+    logger.info("XGBOOST PREDICT BENCHMARK")
+    logger.info("=" * 70)
+
+    models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    with open(models_dir / "xgboost.pkl", "rb") as f:
+        xgb_model = pickle.load(f)
+    artifacts = load_model_artifacts(models_dir)
+    booster = artifacts.booster
+    compiled = artifacts.compiled_trees or compile_booster(booster)
+
+    X_train, X_val, X_test, y_train, y_val, y_test, _, _ = get_prepared_data()
+    X_encoded = artifacts.transform_xgb(X_test)
+    logger.info(f"Test rows: {X_encoded.shape[0]:,} | trees: {compiled.n_trees} | depth: {compiled.depth}")
+
+    results_df = run_benchmark(xgb_model, booster, compiled, X_encoded)
+
+    output_dir = Path("experiments") / f"run_{RUN_NUMBER}_xgb_predict_benchmark"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / "benchmark_results.csv"
+    results_df.to_csv(results_path, index=False)
+    logger.info(f"Saved benchmark results to {results_path}")
@@ -0,0 +1,138 @@
+"""
+Binning Core
+ค่า bin edges / labels และฟังก์ชัน binning แบบ vectorized (NumPy ล้วน)
+ใช้ร่วมกันระหว่าง FixedBinnerForLR, FixedBinnerForXGBoost และโค้ด scoring
+"""
+
+from bisect import bisect_left
+
+import numpy as np
+
+# === Fixed bins (ไม่ต้องเรียนรู้) - pd.cut(right=True) คือช่วง (a, b] ===
+AGE_BINS = [0, 20, 30, 40, 50, 60, 200]
+AGE_LABELS = ["<20", "20-30", "31-40", "41-50", "51-60", ">60"]
+
+CREDIT_SCORE_BINS = [0, 615, 645, 665, 680, 698, 724, 752, 900]
+CREDIT_SCORE_LABELS = ["HH", "GG", "FF", "EE", "DD", "CC", "BB", "AA"]  # 0=worst, 7=best
+
+TENURE_BINS = [-1, 2, 5, 10, 20]
+TENURE_LABELS = ["New/At-Risk", "Emerging Loyalty", "Established/Loyal", "Long-Term"]
+
+# คอลัมน์ที่ใช้ fixed bins: (column, edges)
+FIXED_BINS = [
+    ("Age", AGE_BINS),
+    ("CreditScore", CREDIT_SCORE_BINS),
+    ("Tenure", TENURE_BINS),
+]
+
+
+def balance_labels(n_labels):
+    """Labels ของ Balance bins ตามจำนวน bins ที่เหลือหลังลบ quantiles ซ้ำ"""
+    if n_labels == 4:
+        return ["Q1-Low", "Q2-Medium-Low", "Q3-Medium-High", "Q4-High"]
+    elif n_labels == 3:
+        return ["Low", "Medium", "High"]
+    elif n_labels == 2:
+        return ["Low", "High"]
+    return [f"Q{i+1}" for i in range(n_labels)]
+
+
+def bin_codes(values, edges, include_lowest=False):
+    """
+    หา bin index ของแต่ละค่าด้วย np.searchsorted (ผลลัพธ์เหมือน pd.cut(right=True))
+
+    Args:
+        values: array ของค่าที่จะ bin
+        edges: bin edges (เรียงจากน้อยไปมาก)
+        include_lowest: ถ้า True ค่าที่เท่ากับ edges[0] จะอยู่ใน bin แรก
+
+    Returns:
+        np.ndarray (int8): bin index, -1 = ค่านอกช่วง bins หรือ NaN
+    """
+    values = np.asarray(values)
+    edges = np.asarray(edges, dtype=np.float64)
+
+    # side="left" + right=True: edges[i-1] < x <= edges[i] -> idx = i
+    idx = np.searchsorted(edges, values, side="left")
+    if include_lowest:
+        idx[values == edges[0]] = 1
+
+    codes = (idx - 1).astype(np.int8)
+    # idx == 0: ค่า <= edge แรก, idx == len(edges): ค่า > edge สุดท้าย หรือ NaN
+    codes[(idx == 0) | (idx == len(edges))] = -1
+    return codes
+
+
+def bin_code_one(value, edges, include_lowest=False):
+    """
+    หา bin index ของค่าเดียว (Python scalar) ด้วย bisect - ไม่ต้องสร้าง NumPy array
+
+    ใช้กฎเดียวกับ bin_codes(): edges[i-1] < x <= edges[i] -> i - 1
+
+    Args:
+        value: ค่าตัวเลขค่าเดียว
+        edges: bin edges (list เรียงจากน้อยไปมาก)
+        include_lowest: ถ้า True ค่าที่เท่ากับ edges[0] จะอยู่ใน bin แรก
+
+    Returns:
+        int: bin index, -1 = ค่านอกช่วง bins หรือ NaN
+    """
+    if include_lowest and value == edges[0]:
+        return 0
+    # NaN เทียบแล้วเป็น False ทุกครั้ง -> bisect_left คืน 0 -> -1
+    idx = bisect_left(edges, value)
+    if idx == 0 or idx == len(edges):
+        return -1
+    return idx - 1
+
+
+def build_int_lookup(edges):
+    """
+    สร้าง dense lookup table สำหรับค่า integer ที่มีขอบเขตจำกัด
+
+    table[v - offset] = bin index ของ v สำหรับทุก integer ในช่วง (edges[0], edges[-1]]
+
+    Returns:
+        tuple: (offset, table) - table เป็น int8 array
+    """
+    offset = int(np.floor(edges[0])) + 1  # right=True: edge แรกไม่รวมอยู่ใน bin
+    upper = int(np.floor(edges[-1]))
+    return offset, bin_codes(np.arange(offset, upper + 1), edges)
+
+
+def lookup_int_codes(values, lookup):
+    """
+    หา bin index ของ integer array ด้วยการ gather จาก lookup table ครั้งเดียว
+
+    ค่าที่อยู่นอกตาราง (รวมค่าติดลบ) ถูกตรวจพบใน pass เดียวกัน: หลังลบ offset แล้ว
+    มองเป็น unsigned ค่าติดลบจะกลายเป็นเลขใหญ่มาก จึงเทียบกับขนาดตารางครั้งเดียวพอ
+
+    Returns:
+        np.ndarray (int8): bin index, -1 = ค่านอกช่วง bins
+    """
+    offset, table = lookup
+    idx = np.asarray(values, dtype=np.intp) - offset
+    out_of_range = idx.view(np.uintp) >= len(table)
+    codes = table.take(idx, mode="clip")
+    codes[out_of_range] = -1
+    return codes
+
+
+# Lookup tables ของ fixed bins (สร้างครั้งเดียวตอน import)
+# เช่น Age: 1..200, CreditScore: 1..900, Tenure: 0..20
+FIXED_BIN_LOOKUPS = {col: build_int_lookup(edges) for col, edges in FIXED_BINS}
+
+# Fixed bin edges แบบ list ของ float สำหรับ bin_code_one()
+FIXED_BIN_EDGES = {col: [float(edge) for edge in edges] for col, edges in FIXED_BINS}
+
+
+def fixed_bin_codes(col, values):
+    """
+    Bin คอลัมน์ที่ใช้ fixed bins (Age / CreditScore / Tenure)
+
+    integer dtype ใช้ lookup table, dtype อื่น (เช่น float ที่อาจมี NaN) ใช้ searchsorted
+    """
+    values = np.asarray(values)
+    if values.dtype.kind in "iu":
+        return lookup_int_codes(values, FIXED_BIN_LOOKUPS[col])
+    return bin_codes(values, dict(FIXED_BINS)[col])
@@ -3,6 +3,15 @@ from pathlib import Path
 # === Path พื้นฐาน ===
 DATA_PATH = r"C:\Users\absat\Desktop\Side Project\Customer Churn Prediction\data\Churn_Modelling.csv"
 
+# === Data Cache ===
+# เก็บข้อมูลที่ parse แล้วเป็นไฟล์ binary (.npz) เพื่อไม่ต้อง parse CSV ซ้ำทุกครั้ง
+# cache จะถูกสร้างใหม่อัตโนมัติเมื่อไฟล์ CSV เปลี่ยน (size/mtime/content hash)
+USE_DATA_CACHE = True
+DATA_CACHE_DIR = None  # None = เก็บไว้ในโฟลเดอร์ .cache ข้างไฟล์ CSV
+
+# จำนวนแถวต่อ chunk เมื่ออ่าน CSV แบบ streaming (ไฟล์ที่ใหญ่เกิน RAM)
+CSV_CHUNK_SIZE = 100_000
+
 # === Target & Feature Config ===
 TARGET_COL = "Exited"
 
@@ -24,11 +33,61 @@ NUMERIC_COLS = [
     "EstimatedSalary",
 ]
 
+# === Compact dtype schema ===
+# dtype ที่ประกาศไว้สำหรับข้อมูลดิบ (ลด memory ของ DataFrame ลงหลายเท่า)
+# คอลัมน์ integer จะถูก downcast หลังตรวจสอบช่วงค่าแล้วเท่านั้น (ไม่มี overflow เงียบๆ)
+USE_COMPACT_DTYPES = True
+RAW_DTYPES = {
+    "CreditScore": "int16",
+    "Age": "int16",
+    "Tenure": "int8",
+    "NumOfProducts": "int8",
+    "HasCrCard": "int8",
+    "IsActiveMember": "int8",
+    "Exited": "int8",
+    "Geography": "category",
+    "Gender": "category",
+}
+
+# คอลัมน์เงิน - ใช้ float32 เฉพาะเมื่อเปิด opt-in (ความละเอียด ~7 หลัก)
+MONEY_COLS = ["Balance", "EstimatedSalary"]
+USE_FLOAT32_MONEY = False
+
+# === Feature Binning ===
+# Engine ของ binners: 'pandas' (pd.cut) หรือ 'numpy' (lookup table / np.searchsorted, เร็วกว่า)
+BINNING_ENGINE = 'numpy'
+# False = binners ไม่ copy input ทั้ง DataFrame (สร้างเฉพาะคอลัมน์ใหม่) - ลด memory ตอน transform batch ใหญ่
+BINNER_COPY = True
+# True = LR ใช้ FusedBinnerEncoderForLR (binning + one-hot ในขั้นเดียว ออกเป็น CSR โดยตรง)
+# False = FixedBinnerForLR + ColumnTransformer(OneHotEncoder) แบบเดิม (ผลลัพธ์เหมือนกัน)
+USE_FUSED_LR_ENCODER = True
+# ขนาด KLL sketch สำหรับ partial_fit() ของ binners (streaming fit ของ Balance quantiles)
+# rank error ประมาณ O(1/k): 200 -> ~1%, 2000 -> ~0.1% (memory ยังคงที่ไม่ขึ้นกับจำนวนแถว)
+QUANTILE_SKETCH_K = 2000
+# True = train_models bin ข้อมูลครั้งเดียวแล้วได้ทั้ง input ของ LR และ XGBoost (SharedBinner)
+# ใช้ได้เมื่อ USE_FUSED_LR_ENCODER = True (ไม่งั้นจะ transform แยกกันตามเดิม)
+USE_SHARED_BINNING = True
+
+# === Parallel Transform (batch scoring) ===
+# จำนวน processes ที่ score.py ใช้ transform + predict แต่ละ chunk (ParallelTransformer)
+# 1 = ใน process เดียวแบบเดิม, -1 = ทุก cores - แต่ละ chunk ถูกแบ่งเป็น blocks เท่าๆ กันตามจำนวน workers
+TRANSFORM_N_JOBS = 1
+# จำนวนแถวต่อ block ที่ส่งให้แต่ละ worker (default ของ ParallelTransformer เมื่อใช้นอก score.py)
+TRANSFORM_BLOCK_SIZE = 200_000
+
 # === Train / Val / Test Split ===
 TEST_SIZE = 0.15     # 15% สำหรับ test
 VAL_SIZE = 0.15      # 15% สำหรับ val (จากส่วน train ที่เหลือ)
 RANDOM_STATE = 42
 
+# บันทึก row indices ของ train/val/test + CV folds ไว้ใน models/run_{RUN_NUMBER}/
+# ทุก script (evaluate, threshold, SHAP) จะใช้แถวเดียวกับตอน train โดยไม่ต้อง split ใหม่
+USE_CACHED_SPLITS = True
+SPLIT_INDICES_FILE = "split_indices.npz"
+
+# รายงาน wall time / CPU time / peak RSS ของแต่ละ stage ของ train_models (JSON ใน models/run_{RUN_NUMBER}/)
+RUN_PROFILE_FILE = "run_profile.json"
+
 # === Model Training Config ===
 MODELS_DIR = "models"  # โฟลเดอร์เก็บ trained models
 PLOTS_DIR = "plots"    # โฟลเดอร์เก็บ visualizations
@@ -55,10 +114,47 @@ COST_RATIO = 10.0  # น้ำหนักของ minority class (Churn) เ
 # === Prediction Threshold ===
 # Threshold สำหรับการทำนาย (default = 0.5)
 PREDICTION_THRESHOLD = 0.54 
+
+# === Batch Scoring (score.py) ===
+# model ที่ใช้ score: 'xgb' หรือ 'lr'
+SCORE_MODEL = 'xgb'
+# คอลัมน์ที่คัดลอกจาก input ไปยัง output ถ้ามีในไฟล์ (ไว้ join ผลกลับกับข้อมูลลูกค้า)
+SCORE_ID_COLS = ["RowNumber", "CustomerId"]
+# จำนวนแถวต่อ chunk ตอน score - memory คงที่ไม่ขึ้นกับขนาดไฟล์
+SCORE_CHUNK_SIZE = 100_000
+
+# === Online Scoring Service (serve.py) ===
+SERVE_HOST = "127.0.0.1"
+SERVE_PORT = 8000
+# รวม requests ที่เข้ามาพร้อมกันเป็น micro-batch: ไม่เกิน SERVE_MAX_BATCH_SIZE แถว
+# และรอ request ถัดไปไม่เกิน SERVE_MAX_WAIT_MS หลังจาก request แรกของ batch
+SERVE_MAX_BATCH_SIZE = 64
+SERVE_MAX_WAIT_MS = 2.0
+# timeout ที่แต่ละ request รอผล (วินาที)
+SERVE_REQUEST_TIMEOUT_S = 5.0
+# จำนวน latencies ล่าสุดที่เก็บไว้คำนวณ percentiles ใน /metrics
+SERVE_LATENCY_WINDOW = 10_000
                               
 # Cross-Validation
 CV_FOLDS = 5
 
+# === Parallel Training ===
+# จำนวน CV folds ที่รันพร้อมกัน (1 = ทีละ fold แบบเดิม, -1 = ทุก cores)
+CV_N_JOBS = 1
+# True = train LR (ใน process แยก) พร้อมกับ XGBoost (มีผลเมื่อ budget มีอย่างน้อย 2 cores)
+TRAIN_PARALLEL = False
+# จำนวน CPU cores ทั้งหมดที่ training ใช้ได้ (-1 = ทุก cores)
+# แบ่งให้ LR / XGBoost และ CV folds โดยที่ (CV jobs x XGBoost threads) ไม่เกิน budget
+TRAIN_N_CPUS = -1
+
+# === Incremental Retraining ===
+# run number ของ run ก่อนหน้าที่จะ train ต่อด้วยข้อมูลใหม่ (None = train ใหม่ทั้งหมด)
+# ใช้ preprocessors ของ run นั้นโดยไม่ fit ใหม่ (bins / encodings ต้องตรงกับ models เดิม),
+# XGBoost boost ต่อจาก trees เดิม และ LR warm start จาก coefficients เดิม
+INCREMENTAL_FROM_RUN = None
+# จำนวน boosting rounds ที่เพิ่มต่อจาก model เดิม
+INCREMENTAL_XGB_N_ESTIMATORS = 20
+
 # Logistic Regression
 LR_MAX_ITER = 1000
 LR_SOLVER = 'lbfgs'
@@ -74,5 +170,13 @@ XGB_REG_ALPHA = 0.5
 XGB_MIN_CHILD_WEIGHT = 5
 XGB_GAMMA = 0.2
 XGB_COLSAMPLE_BYTREE = 0.8
+# True = สร้าง QuantileDMatrix ของ train set ครั้งเดียว แล้วใช้ร่วมกันทุก CV fold และ final fit
+# False = ให้ cross_validate / XGBClassifier.fit แปลงข้อมูลเองทุกครั้งแบบเดิม
+XGB_REUSE_DMATRIX = True
+# Early stopping ของ final fit บน validation set (None = train ครบ XGB_N_ESTIMATORS trees)
+# model ที่บันทึกจะเหลือเฉพาะ trees ถึง best_iteration
+XGB_EARLY_STOPPING_ROUNDS = None
+# metric ที่ติดตามบน validation set: 'logloss' หรือ 'auc'
+XGB_EVAL_METRIC = 'logloss'
 
 
@@ -0,0 +1,288 @@
+"""
+Data Cache Module
+เก็บ DataFrame ที่ parse และ validate แล้วเป็นไฟล์ binary แบบ columnar (NumPy .npz)
+เพื่อให้การโหลดครั้งถัดไปเป็นการอ่าน binary แทนการ parse CSV ใหม่ทุกครั้ง
+
+Cache จะถูก invalidate อัตโนมัติเมื่อ:
+- ขนาดไฟล์ / mtime เปลี่ยน และ content hash (SHA-256) ไม่ตรงกับที่บันทึกไว้
+- schema ที่ใช้ parse เปลี่ยน (schema_key)
+- รูปแบบ cache เปลี่ยน (CACHE_FORMAT_VERSION)
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from logger_config import setup_logger
+
+logger = setup_logger("data_cache")
+
+# เพิ่มเลขนี้ทุกครั้งที่เปลี่ยนรูปแบบการเก็บ cache
+CACHE_FORMAT_VERSION = 2
+
+# ขนาด block ที่ใช้อ่านไฟล์ตอนคำนวณ hash (8 MB)
+_HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def compute_file_fingerprint(path, with_hash=True):
+    """
+    คำนวณ fingerprint ของไฟล์ (size, mtime และ content hash)
+
+    Args:
+        path: path ของไฟล์
+        with_hash: ถ้า False จะไม่อ่านเนื้อไฟล์ (คืนแค่ size/mtime)
+
+    Returns:
+        dict: {'size': int, 'mtime_ns': int, 'sha256': str | None}
+    """
+    stat = Path(path).stat()
+    fingerprint = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': None,
+    }
+
+    if with_hash:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        fingerprint['sha256'] = digest.hexdigest()
+
+    return fingerprint
+
+
+def _cache_paths(source_path, cache_dir):
+    """
+    คืน path ของไฟล์ข้อมูล (.npz) และ metadata (.meta.json) ของ cache
+
+    ชื่อไฟล์มี hash ของ absolute path ของไฟล์ต้นฉบับ - ไฟล์ชื่อเดียวกันจากคนละโฟลเดอร์
+    ที่ใช้ cache_dir ร่วมกันจึงไม่เขียนทับ cache ของกันและกัน
+    """
+    source_path = Path(source_path)
+    path_key = hashlib.sha256(str(source_path.resolve()).encode('utf-8')).hexdigest()[:12]
+    name = f"{source_path.stem}-{path_key}"
+    cache_dir = Path(cache_dir)
+    return cache_dir / f"{name}.npz", cache_dir / f"{name}.meta.json"
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta, meta_path):
+    tmp_path = meta_path.with_name(meta_path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, meta_path)
+
+
+def _is_cache_fresh(meta, source_path, schema_key):
+    """
+    ตรวจสอบว่า cache ยังใช้ได้หรือไม่
+
+    ถ้า size และ mtime ตรงกันจะถือว่าใช้ได้ทันที (ไม่ต้องอ่านไฟล์)
+    ถ้าไม่ตรงจะคำนวณ content hash เทียบ เพื่อรองรับกรณีไฟล์ถูก touch/copy
+    แต่เนื้อหาเหมือนเดิม (จะอัปเดต mtime ใน metadata ให้ด้วย)
+    """
+    if meta is None:
+        return False, None
+    if meta.get('format_version') != CACHE_FORMAT_VERSION:
+        logger.info("Cache format version changed - cache is stale")
+        return False, None
+    if meta.get('schema_key') != schema_key:
+        logger.info("Parsing schema changed - cache is stale")
+        return False, None
+
+    cached = meta.get('source', {})
+    current = compute_file_fingerprint(source_path, with_hash=False)
+    if current['size'] == cached.get('size') and current['mtime_ns'] == cached.get('mtime_ns'):
+        return True, None
+
+    if current['size'] != cached.get('size'):
+        logger.info("Source file size changed - cache is stale")
+        return False, None
+
+    logger.debug("Source mtime changed - verifying content hash...")
+    current = compute_file_fingerprint(source_path, with_hash=True)
+    if current['sha256'] != cached.get('sha256'):
+        logger.info("Source content hash changed - cache is stale")
+        return False, current
+
+    logger.debug("Content hash unchanged - refreshing cached mtime")
+    return True, current
+
+
+def load_cached_frame(source_path, cache_dir, schema_key):
+    """
+    โหลด DataFrame จาก cache ถ้ายังไม่ stale
+
+    Args:
+        source_path: path ของไฟล์ CSV ต้นฉบับ
+        cache_dir: โฟลเดอร์ที่เก็บ cache
+        schema_key: string ที่อธิบาย schema ที่ใช้ parse (เปลี่ยน = invalidate)
+
+    Returns:
+        pd.DataFrame หรือ None ถ้าไม่มี cache / cache stale
+    """
+    npz_path, meta_path = _cache_paths(source_path, cache_dir)
+    if not npz_path.exists() or not meta_path.exists():
+        logger.debug(f"No cache found at {npz_path}")
+        return None
+
+    meta = _read_meta(meta_path)
+    fresh, refreshed = _is_cache_fresh(meta, source_path, schema_key)
+    if not fresh:
+        return None
+
+    try:
+        with np.load(npz_path, allow_pickle=False) as bundle:
+            data = {}
+            for col_info in meta['columns']:
+                name = col_info['name']
+                key = col_info['key']
+                if col_info['kind'] == 'category':
+                    data[name] = pd.Categorical.from_codes(
+                        bundle[f"{key}__codes"],
+                        categories=bundle[f"{key}__uniques"].astype(object),
+                        ordered=col_info.get('ordered', False),
+                    )
+                elif col_info['kind'] == 'object':
+                    codes = bundle[f"{key}__codes"]
+                    uniques = bundle[f"{key}__uniques"].astype(object)
+                    # code -1 = ค่าว่าง (NaN) ตอนบันทึก
+                    values = np.full(len(codes), None, dtype=object)
+                    valid = codes >= 0
+                    values[valid] = uniques[codes[valid]]
+                    data[name] = values
+                else:
+                    data[name] = bundle[key]
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Failed to read cache {npz_path}: {e}")
+        return None
+
+    df = pd.DataFrame(data, columns=[c['name'] for c in meta['columns']])
+
+    if refreshed is not None:
+        meta['source'] = refreshed
+        try:
+            _write_meta(meta, meta_path)
+        except OSError as e:
+            logger.warning(f"Could not refresh cache metadata: {e}")
+
+    logger.info(f"Loaded {len(df)} rows from cache: {npz_path}")
+    return df
+
+
+def save_cached_frame(df, source_path, cache_dir, schema_key):
+    """
+    บันทึก DataFrame ลง cache (.npz + .meta.json)
+
+    คอลัมน์ตัวเลขเก็บเป็น array ตรงๆ (คง dtype เดิม เช่น int8/float32)
+    คอลัมน์ string/category เก็บเป็น integer codes + ค่า unique (ไม่ต้องใช้ pickle)
+
+    Args:
+        df: DataFrame ที่ parse และ validate แล้ว
+        source_path: path ของไฟล์ CSV ต้นฉบับ
+        cache_dir: โฟลเดอร์ที่เก็บ cache
+        schema_key: string ที่อธิบาย schema ที่ใช้ parse
+    """
+    npz_path, meta_path = _cache_paths(source_path, cache_dir)
+    npz_path.parent.mkdir(parents=True, exist_ok=True)
+
+    arrays = {}
+    columns = []
+    for i, name in enumerate(df.columns):
+        key = f"c{i}"
+        series = df[name]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            arrays[f"{key}__codes"] = series.cat.codes.to_numpy()
+            arrays[f"{key}__uniques"] = np.asarray(series.cat.categories, dtype=str)
+            columns.append({'name': name, 'key': key, 'kind': 'category',
+                            'ordered': bool(series.cat.ordered)})
+        elif not pd.api.types.is_numeric_dtype(series.dtype):
+            codes, uniques = pd.factorize(series, use_na_sentinel=True)
+            arrays[f"{key}__codes"] = codes.astype(np.int32)
+            arrays[f"{key}__uniques"] = np.asarray(uniques, dtype=str)
+            columns.append({'name': name, 'key': key, 'kind': 'object'})
+        else:
+            arrays[key] = series.to_numpy()
+            columns.append({'name': name, 'key': key, 'kind': 'numeric', 'dtype': str(series.dtype)})
+
+    meta = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'schema_key': schema_key,
+        'source': compute_file_fingerprint(source_path, with_hash=True),
+        'n_rows': len(df),
+        'columns': columns,
+    }
+
+    # เขียนไฟล์ชั่วคราวก่อนแล้วค่อย rename เพื่อไม่ให้เหลือ cache ที่เขียนไม่ครบ
+    tmp_path = npz_path.with_name(npz_path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, npz_path)
+    _write_meta(meta, meta_path)
+
+    logger.info(f"Saved data cache to {npz_path}")
+
+
+def save_split_indices(path, indices, meta):
+    """
+    บันทึก row indices ของ train/val/test และ CV fold assignments เป็นไฟล์ .npz
+
+    Args:
+        path: path ของไฟล์ (.npz)
+        indices: dict ของ integer arrays เช่น {'train': ..., 'val': ..., 'test': ..., 'cv_fold': ...}
+        meta: dict ของค่าที่ใช้ตรวจสอบว่า split ยังใช้ได้ (เช่น n_rows, test_size)
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, meta=np.array(json.dumps(meta, sort_keys=True)), **indices)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Saved split indices to {path}")
+
+
+def load_split_indices(path, expected_meta):
+    """
+    โหลด split indices ถ้า meta ตรงกับ expected_meta
+
+    Args:
+        path: path ของไฟล์ (.npz)
+        expected_meta: dict ที่ต้องตรงกับ meta ที่บันทึกไว้
+
+    Returns:
+        dict ของ integer arrays หรือ None ถ้าไม่มีไฟล์ / meta ไม่ตรง
+    """
+    path = Path(path)
+    if not path.exists():
+        logger.debug(f"No split indices found at {path}")
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as bundle:
+            meta = json.loads(str(bundle['meta']))
+            indices = {key: bundle[key] for key in bundle.files if key != 'meta'}
+    except (OSError, KeyError, ValueError) as e:
+        logger.warning(f"Failed to read split indices {path}: {e}")
+        return None
+
+    if meta != json.loads(json.dumps(expected_meta, sort_keys=True)):
+        changed = sorted(k for k in set(meta) | set(expected_meta) if meta.get(k) != expected_meta.get(k))
+        logger.warning(f"Split indices at {path} are stale (changed: {changed}) - re-splitting")
+        return None
+
+    logger.info(f"Loaded split indices from {path}")
+    return indices
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import logging
+
+import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, StratifiedKFold
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.pipeline import Pipeline
@@ -16,13 +20,121 @@ from config import (
     TEST_SIZE,
     VAL_SIZE,
     RANDOM_STATE,
+    USE_DATA_CACHE,
+    DATA_CACHE_DIR,
+    CSV_CHUNK_SIZE,
+    USE_COMPACT_DTYPES,
+    RAW_DTYPES,
+    MONEY_COLS,
+    USE_FLOAT32_MONEY,
+    MODELS_DIR,
+    RUN_NUMBER,
+    CV_FOLDS,
+    USE_CACHED_SPLITS,
+    SPLIT_INDICES_FILE,
+    BINNING_ENGINE,
+    BINNER_COPY,
+    USE_FUSED_LR_ENCODER,
+    QUANTILE_SKETCH_K,
 )
-from feature_binning import FixedBinnerForLR, FixedBinnerForXGBoost
+from data_cache import load_cached_frame, save_cached_frame, load_split_indices, save_split_indices
+from feature_binning import FixedBinnerForLR, FixedBinnerForXGBoost, FusedBinnerEncoderForLR, SharedBinner
 from logger_config import setup_logger
+from run_profiler import profile_stage
 
 # สร้าง logger สำหรับ module นี้
 logger = setup_logger("data_prep")
 
+# คอลัมน์ที่ต้องมีในไฟล์ข้อมูลดิบ
+REQUIRED_COLS = DROP_COLS + CATEGORICAL_COLS + NUMERIC_COLS + [TARGET_COL]
+
+
+def _get_cache_dir(data_path: Path) -> Path:
+    """โฟลเดอร์เก็บ cache: ใช้ DATA_CACHE_DIR ถ้ากำหนดไว้ ไม่งั้นใช้ .cache ข้างไฟล์ CSV"""
+    if DATA_CACHE_DIR:
+        return Path(DATA_CACHE_DIR)
+    return data_path.parent / ".cache"
+
+
+def _get_cache_schema_key() -> str:
+    """string อธิบาย schema ที่ใช้ parse - ถ้าเปลี่ยน cache เดิมจะถูก invalidate"""
+    dtypes = get_raw_dtypes()
+    dtype_desc = ",".join(f"{col}:{dtypes[col]}" for col in sorted(dtypes))
+    return f"required={','.join(REQUIRED_COLS)};dtypes={dtype_desc}"
+
+
+def get_raw_dtypes() -> dict:
+    """
+    คืน dtype schema ของข้อมูลดิบตาม config
+    
+    Returns:
+        dict: {column: dtype} (ว่างถ้าปิด USE_COMPACT_DTYPES)
+    """
+    if not USE_COMPACT_DTYPES:
+        return {}
+    
+    dtypes = dict(RAW_DTYPES)
+    if USE_FLOAT32_MONEY:
+        for col in MONEY_COLS:
+            dtypes[col] = "float32"
+    return dtypes
+
+
+def _get_read_csv_dtypes(dtypes: dict) -> dict:
+    """
+    dtype ที่ส่งให้ pd.read_csv โดยตรง: เฉพาะ category และ float
+    
+    ไม่ส่ง integer dtype แคบๆ ให้ read_csv เพราะค่าที่เกินช่วงจะ overflow
+    แบบเงียบๆ (เช่น 300 -> int8 = 44) - integer จะถูก downcast ทีหลัง
+    """
+    return {
+        col: dtype for col, dtype in dtypes.items()
+        if dtype == "category" or np.dtype(dtype).kind == "f"
+    }
+
+
+def _downcast_int_columns(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+    """
+    Downcast คอลัมน์ integer ตาม schema หลังตรวจสอบว่าค่าอยู่ในช่วงของ dtype
+    
+    คอลัมน์ที่มีค่าเกินช่วงหรือไม่ใช่ integer จะคง dtype เดิมไว้และ log warning
+    """
+    for col, dtype in dtypes.items():
+        if col not in df.columns or dtype == "category":
+            continue
+        target = np.dtype(dtype)
+        if target.kind not in "iu":
+            continue
+        
+        values = df[col]
+        if not pd.api.types.is_integer_dtype(values.dtype):
+            logger.warning(f"Column {col} is {values.dtype}, not integer - keeping original dtype")
+            continue
+        
+        info = np.iinfo(target)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            logger.warning(
+                f"Column {col} has values outside {target} range "
+                f"[{info.min}, {info.max}] - keeping {values.dtype}"
+            )
+            continue
+        df[col] = values.astype(target)
+    return df
+
+
+def _check_required_columns(columns, required_cols, source="CSV"):
+    """
+    ตรวจสอบว่ามีคอลัมน์ที่จำเป็นครบ
+
+    Raises:
+        ValueError: ถ้าคอลัมน์ไม่ครบ
+    """
+    missing_cols = [col for col in required_cols if col not in columns]
+    if missing_cols:
+        error_msg = f"Missing required columns in {source}: {missing_cols}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
 
 def load_raw_data() -> pd.DataFrame:
     """
@@ -47,9 +159,17 @@ def load_raw_data() -> pd.DataFrame:
     
     logger.debug(f"File exists. Size: {data_path.stat().st_size / 1024:.2f} KB")
     
-    # โหลด CSV
+    # ลองโหลดจาก cache ก่อน (ข้อมูลใน cache ผ่านการ validate มาแล้ว)
+    if USE_DATA_CACHE:
+        df = load_cached_frame(data_path, _get_cache_dir(data_path), _get_cache_schema_key())
+        if df is not None:
+            logger.info(f"Loaded {len(df)} rows, {len(df.columns)} columns (from cache)")
+            return df
+    
+    # โหลด CSV (category/float ตาม schema ถูก parse ตรงๆ ส่วน integer downcast ทีหลัง)
+    dtypes = get_raw_dtypes()
     try:
-        df = pd.read_csv(DATA_PATH)
+        df = pd.read_csv(DATA_PATH, dtype=_get_read_csv_dtypes(dtypes))
     except pd.errors.EmptyDataError:
         error_msg = "CSV file is empty"
         logger.error(error_msg)
@@ -61,73 +181,305 @@ def load_raw_data() -> pd.DataFrame:
     
     logger.info(f"Loaded {len(df)} rows, {len(df.columns)} columns")
     logger.debug(f"Columns: {list(df.columns)}")
-    logger.debug(f"Memory usage: {df.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MB")
     
     # ตรวจสอบคอลัมน์ที่จำเป็น
-    required_cols = DROP_COLS + CATEGORICAL_COLS + NUMERIC_COLS + [TARGET_COL]
-    missing_cols = [col for col in required_cols if col not in df.columns]
-    if missing_cols:
-        error_msg = f"Missing required columns in CSV: {missing_cols}"
-        logger.error(error_msg)
-        raise ValueError(error_msg)
+    _check_required_columns(df.columns, REQUIRED_COLS)
     
     logger.debug("All required columns present")
-    logger.debug(f"Target column '{TARGET_COL}' distribution: {df[TARGET_COL].value_counts().to_dict()}")
+    
+    df = _downcast_int_columns(df, dtypes)
+    # สถิติที่ต้องสแกนทั้งคอลัมน์ คำนวณเฉพาะตอนเปิด DEBUG
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Memory usage: {df.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MB")
+        logger.debug(f"Target column '{TARGET_COL}' distribution: {df[TARGET_COL].value_counts().to_dict()}")
+    
+    # บันทึก cache ไว้ใช้ครั้งถัดไป (ถ้าบันทึกไม่ได้ก็ยังใช้ข้อมูลต่อได้ตามปกติ)
+    if USE_DATA_CACHE:
+        try:
+            save_cached_frame(df, data_path, _get_cache_dir(data_path), _get_cache_schema_key())
+        except OSError as e:
+            logger.warning(f"Could not write data cache: {e}")
     
     return df
 
 
-def train_val_test_split(df: pd.DataFrame):
+def iter_raw_data_chunks(chunk_size=CSV_CHUNK_SIZE, data_path=None, required_cols=None, usecols_only=True,
+                         optional_cols=None):
     """
-    แยก df เป็น train / val / test โดย stratify ตาม TARGET_COL
+    อ่านไฟล์ CSV ทีละ chunk สำหรับไฟล์ที่ใหญ่เกินกว่าจะโหลดเข้า RAM ทั้งหมด
+    
+    Memory สูงสุดขึ้นกับ chunk_size ไม่ใช่ขนาดไฟล์
+    แต่ละ chunk ถูกตรวจสอบคอลัมน์ด้วยเงื่อนไขเดียวกับ load_raw_data()
     
     Args:
-        df: DataFrame ที่โหลดมาจาก load_raw_data()
+        chunk_size: จำนวนแถวต่อ chunk
+        data_path: path ของไฟล์ CSV (default: DATA_PATH)
+        required_cols: คอลัมน์ที่ต้องมี (default: REQUIRED_COLS)
+        usecols_only: ถ้า True จะ parse เฉพาะ required_cols (ลด memory ต่อ chunk)
+        optional_cols: คอลัมน์ที่ parse ด้วยถ้ามีในไฟล์ (เช่น ID ของลูกค้า) - ไม่มีก็ไม่ error
     
-    Returns:
-        tuple: (X_train, X_val, X_test, y_train, y_val, y_test)
+    Yields:
+        pd.DataFrame: ข้อมูลทีละ chunk ตาม dtype schema (index ต่อเนื่องจาก chunk ก่อนหน้า)
+            หมายเหตุ: categories ของคอลัมน์ category อาจต่างกันในแต่ละ chunk
+    
+    Raises:
+        FileNotFoundError: ถ้าไฟล์ไม่พบ
+        ValueError: ถ้าไฟล์เสียหาย คอลัมน์ไม่ครบ หรือ chunk_size ไม่ถูกต้อง
+    
+    Usage:
+        for chunk in iter_raw_data_chunks(chunk_size=500_000):
+            X_chunk = chunk.drop(columns=DROP_COLS + [TARGET_COL])
+            ...
     """
-    logger.debug(f"Entering train_val_test_split() with df shape {df.shape}")
-    logger.info("Splitting data into train/val/test sets...")
+    data_path = Path(data_path if data_path is not None else DATA_PATH)
+    required_cols = list(required_cols) if required_cols is not None else REQUIRED_COLS
+    
+    if chunk_size is None or chunk_size <= 0:
+        error_msg = f"chunk_size must be a positive integer, got {chunk_size}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    
+    logger.info(f"Streaming data from: {data_path} (chunk_size={chunk_size})")
+    if not data_path.exists():
+        error_msg = f"Data file not found: {data_path}"
+        logger.error(error_msg)
+        raise FileNotFoundError(error_msg)
+    
+    # ใช้ callable แทน list เพื่อให้คอลัมน์ที่หายไปถูกรายงานโดย _check_required_columns
+    required_set = set(required_cols) | set(optional_cols or [])
+    usecols = (lambda col: col in required_set) if usecols_only else None
+    
+    dtypes = get_raw_dtypes()
+    
+    n_rows = 0
+    n_chunks = 0
+    try:
+        with pd.read_csv(data_path, chunksize=chunk_size, usecols=usecols,
+                         dtype=_get_read_csv_dtypes(dtypes)) as reader:
+            for chunk in reader:
+                _check_required_columns(chunk.columns, required_cols, source=f"CSV chunk {n_chunks}")
+                chunk = _downcast_int_columns(chunk, dtypes)
+                n_chunks += 1
+                n_rows += len(chunk)
+                logger.debug(f"Chunk {n_chunks}: {len(chunk)} rows (total {n_rows})")
+                yield chunk
+    except pd.errors.EmptyDataError:
+        error_msg = "CSV file is empty"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    except (pd.errors.ParserError, UnicodeDecodeError) as e:
+        error_msg = f"Error reading CSV file: {str(e)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    
+    logger.info(f"Streamed {n_rows} rows in {n_chunks} chunks")
 
-    # ตัดคอลัมน์ที่ไม่ใช้
-    logger.debug(f"Dropping columns: {DROP_COLS}")
-    df = df.drop(columns=DROP_COLS)
-    logger.debug(f"Shape after dropping: {df.shape}")
 
-    # แยก X, y
-    X = df.drop(columns=[TARGET_COL])
-    y = df[TARGET_COL]
-    logger.debug(f"X shape: {X.shape}, y shape: {y.shape}")
-    logger.debug(f"Target distribution: {y.value_counts(normalize=True).to_dict()}")
+def iter_parquet_chunks(data_path, chunk_size=CSV_CHUNK_SIZE, required_cols=None, optional_cols=None):
+    """
+    อ่านไฟล์ Parquet ทีละ chunk (row batches) - เหมือน iter_raw_data_chunks() สำหรับ CSV
+
+    ต้องมี pyarrow (optional dependency: pip install pyarrow)
+
+    Args:
+        data_path: path ของไฟล์ Parquet
+        chunk_size: จำนวนแถวสูงสุดต่อ chunk
+        required_cols: คอลัมน์ที่ต้องมี (default: REQUIRED_COLS)
+        optional_cols: คอลัมน์ที่อ่านด้วยถ้ามีในไฟล์
+
+    Yields:
+        pd.DataFrame: ข้อมูลทีละ chunk (index ต่อเนื่องจาก chunk ก่อนหน้า)
+
+    Raises:
+        FileNotFoundError: ถ้าไฟล์ไม่พบ
+        ValueError: ถ้าไม่มี pyarrow ไฟล์เสียหาย หรือคอลัมน์ไม่ครบ
+    """
+    data_path = Path(data_path)
+    required_cols = list(required_cols) if required_cols is not None else REQUIRED_COLS
+
+    if chunk_size is None or chunk_size <= 0:
+        error_msg = f"chunk_size must be a positive integer, got {chunk_size}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        error_msg = "Reading Parquet files requires pyarrow (pip install pyarrow)"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    logger.info(f"Streaming data from: {data_path} (chunk_size={chunk_size})")
+    if not data_path.exists():
+        error_msg = f"Data file not found: {data_path}"
+        logger.error(error_msg)
+        raise FileNotFoundError(error_msg)
+
+    try:
+        parquet_file = pq.ParquetFile(data_path)
+    except Exception as e:
+        error_msg = f"Error reading Parquet file: {str(e)}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    file_columns = parquet_file.schema_arrow.names
+    _check_required_columns(file_columns, required_cols, source="Parquet")
+    columns = required_cols + [col for col in (optional_cols or []) if col in file_columns and col not in required_cols]
+
+    dtypes = get_raw_dtypes()
+    n_rows = 0
+    n_chunks = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+        chunk = batch.to_pandas()
+        chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+        chunk = _downcast_int_columns(chunk, dtypes)
+        n_chunks += 1
+        n_rows += len(chunk)
+        logger.debug(f"Chunk {n_chunks}: {len(chunk)} rows (total {n_rows})")
+        yield chunk
 
+    logger.info(f"Streamed {n_rows} rows in {n_chunks} chunks")
+
+
+def _split_meta(y) -> dict:
+    """ค่าที่ใช้ตรวจสอบว่า split indices ที่บันทึกไว้ยังตรงกับข้อมูลและ config ปัจจุบัน"""
+    y_values = np.ascontiguousarray(np.asarray(y, dtype=np.int8))
+    return {
+        'n_rows': int(len(y_values)),
+        'target_sha256': hashlib.sha256(y_values.tobytes()).hexdigest(),
+        'test_size': TEST_SIZE,
+        'val_size': VAL_SIZE,
+        'random_state': RANDOM_STATE,
+        'cv_folds': CV_FOLDS,
+    }
+
+
+def compute_split_indices(y) -> dict:
+    """
+    คำนวณ row positions ของ train / val / test (stratify ตาม y) และ CV fold ของแต่ละแถวใน train
+    
+    ใช้ train_test_split 2 ครั้งเหมือนเดิม (ผลลัพธ์ขึ้นกับ y และ RANDOM_STATE เท่านั้น)
+    CV folds ตรงกับ cross_validate(cv=CV_FOLDS) ของ classifier (StratifiedKFold ไม่ shuffle)
+    
+    Args:
+        y: target ของข้อมูลทั้งหมด
+    
+    Returns:
+        dict: {'train', 'val', 'test', 'cv_fold'} เป็น integer arrays
+    """
+    y = np.asarray(y)
+    positions = np.arange(len(y), dtype=np.int64)
+    
     # แบ่ง train+val vs test ก่อน
     logger.debug(f"Splitting train+val vs test (test_size={TEST_SIZE})")
-    X_temp, X_test, y_temp, y_test = train_test_split(
-        X,
-        y,
+    temp_idx, test_idx = train_test_split(
+        positions,
         test_size=TEST_SIZE,
         random_state=RANDOM_STATE,
         stratify=y,
     )
-    logger.debug(f"Test set: {len(X_test)} samples")
-
+    
     # จากส่วน temp แบ่งเป็น train / val ตามสัดส่วนที่เหลือ
     val_size_adjusted = VAL_SIZE / (1 - TEST_SIZE)
     logger.debug(f"Splitting train vs val (adjusted val_size={val_size_adjusted:.4f})")
-
-    X_train, X_val, y_train, y_val = train_test_split(
-        X_temp,
-        y_temp,
+    train_idx, val_idx = train_test_split(
+        temp_idx,
         test_size=val_size_adjusted,
         random_state=RANDOM_STATE,
-        stratify=y_temp,
+        stratify=y[temp_idx],
     )
+    
+    # CV fold ของแต่ละแถวใน train (ตามลำดับของ train_idx)
+    cv_fold = np.empty(len(train_idx), dtype=np.int8)
+    splitter = StratifiedKFold(n_splits=CV_FOLDS)
+    for fold, (_, fold_idx) in enumerate(splitter.split(train_idx, y[train_idx])):
+        cv_fold[fold_idx] = fold
+    
+    index_dtype = np.int32 if len(y) < np.iinfo(np.int32).max else np.int64
+    return {
+        'train': train_idx.astype(index_dtype),
+        'val': val_idx.astype(index_dtype),
+        'test': test_idx.astype(index_dtype),
+        'cv_fold': cv_fold,
+    }
+
+
+def get_split_indices(y, run_dir=None, save=False) -> dict:
+    """
+    โหลด split indices ของ run ปัจจุบัน (ถ้ามีและยังตรงกับข้อมูล) หรือคำนวณใหม่ใน memory
+    
+    บันทึกลงไฟล์เฉพาะเมื่อ save=True (train_models เท่านั้น) - scripts ที่อ่านอย่างเดียว
+    (evaluate, threshold, SHAP) จึงไม่เขียนทับ split ของ run ที่ train ไว้แล้ว
+    
+    Args:
+        y: target ของข้อมูลทั้งหมด
+        run_dir: โฟลเดอร์ของ run (default: models/run_{RUN_NUMBER})
+        save: บันทึก split ที่คำนวณใหม่ลง run_dir หรือไม่
+    
+    Returns:
+        dict: {'train', 'val', 'test', 'cv_fold'} เป็น integer arrays
+    """
+    if not USE_CACHED_SPLITS:
+        return compute_split_indices(y)
+    
+    run_dir = Path(run_dir) if run_dir is not None else Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    path = run_dir / SPLIT_INDICES_FILE
+    meta = _split_meta(y)
+    
+    indices = load_split_indices(path, meta)
+    if indices is None:
+        indices = compute_split_indices(y)
+        if not save:
+            return indices
+        try:
+            save_split_indices(path, indices, meta)
+        except OSError as e:
+            logger.warning(f"Could not save split indices: {e}")
+    return indices
+
+
+def train_val_test_split(df: pd.DataFrame, split_indices: dict | None = None):
+    """
+    แยก df เป็น train / val / test โดย stratify ตาม TARGET_COL
+    
+    Args:
+        df: DataFrame ที่โหลดมาจาก load_raw_data()
+        split_indices: row positions จาก get_split_indices() (ถ้าไม่ส่งจะคำนวณใหม่)
+    
+    Returns:
+        tuple: (X_train, X_val, X_test, y_train, y_val, y_test)
+    """
+    logger.debug(f"Entering train_val_test_split() with df shape {df.shape}")
+    logger.info("Splitting data into train/val/test sets...")
+
+    # คอลัมน์ feature = ทุกคอลัมน์ยกเว้น DROP_COLS และ target
+    logger.debug(f"Dropping columns: {DROP_COLS}")
+    feature_positions = [
+        i for i, col in enumerate(df.columns)
+        if col not in DROP_COLS and col != TARGET_COL
+    ]
+    target_position = df.columns.get_loc(TARGET_COL)
+    logger.debug(f"Feature columns: {[df.columns[i] for i in feature_positions]}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Target distribution: {df[TARGET_COL].value_counts(normalize=True).to_dict()}")
+
+    if split_indices is None:
+        split_indices = compute_split_indices(df[TARGET_COL])
+
+    # slice แถวและคอลัมน์ในครั้งเดียว (ไม่ต้อง drop/copy ทั้ง DataFrame ก่อน)
+    def take(name):
+        rows = split_indices[name]
+        return df.iloc[rows, feature_positions], df.iloc[rows, target_position]
+
+    X_train, y_train = take('train')
+    X_val, y_val = take('val')
+    X_test, y_test = take('test')
 
     logger.info(f"Split complete - Train: {len(X_train)}, Val: {len(X_val)}, Test: {len(X_test)}")
-    logger.debug(f"Train target dist: {y_train.value_counts(normalize=True).to_dict()}")
-    logger.debug(f"Val target dist: {y_val.value_counts(normalize=True).to_dict()}")
-    logger.debug(f"Test target dist: {y_test.value_counts(normalize=True).to_dict()}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Train target dist: {y_train.value_counts(normalize=True).to_dict()}")
+        logger.debug(f"Val target dist: {y_val.value_counts(normalize=True).to_dict()}")
+        logger.debug(f"Test target dist: {y_test.value_counts(normalize=True).to_dict()}")
 
     return X_train, X_val, X_test, y_train, y_val, y_test
 
@@ -143,6 +495,13 @@ def build_preprocess_pipeline_lr():
     logger.debug("Entering build_preprocess_pipeline_lr()")
     logger.info("Building preprocessing pipeline for Logistic Regression...")
     
+    if USE_FUSED_LR_ENCODER:
+        # binning + one-hot ในขั้นเดียว (ชื่อ step "encoder" เหมือนเดิม - get_feature_names_out() ใช้ได้เหมือนเดิม)
+        preprocessor = Pipeline(steps=[("encoder", FusedBinnerEncoderForLR(sketch_k=QUANTILE_SKETCH_K))])
+        logger.info("LR Pipeline created successfully (fused binning + one-hot encoder)")
+        logger.debug(f"Pipeline steps: {[step[0] for step in preprocessor.steps]}")
+        return preprocessor
+    
     # คอลัมน์ binned ที่จะถูกสร้างจาก FixedBinnerForLR
     binned_cols = ["Age_bin", "CreditScore_bin", "Tenure_bin", "Balance_bin"]
     logger.debug(f"Binned columns: {binned_cols}")
@@ -155,7 +514,7 @@ def build_preprocess_pipeline_lr():
     preprocessor = Pipeline(
         steps=[
             # ขั้นที่ 1: ทำ binning ทั้งหมดก่อน
-            ("binner", FixedBinnerForLR()),
+            ("binner", FixedBinnerForLR(engine=BINNING_ENGINE, copy=BINNER_COPY, sketch_k=QUANTILE_SKETCH_K)),
             
             # ขั้นที่ 2: OneHot encode categorical columns
             ("encoder", ColumnTransformer(
@@ -189,7 +548,7 @@ def build_preprocess_pipeline_xgb():
     # XGBoost ใช้แค่ FixedBinnerForXGBoost (ไม่ต้อง OneHot)
     preprocessor = Pipeline(
         steps=[
-            ("binner", FixedBinnerForXGBoost()),
+            ("binner", FixedBinnerForXGBoost(engine=BINNING_ENGINE, copy=BINNER_COPY, sketch_k=QUANTILE_SKETCH_K)),
         ]
     )
 
@@ -199,7 +558,68 @@ def build_preprocess_pipeline_xgb():
     return preprocessor
 
 
-def get_prepared_data():
+def build_shared_binner(preprocessor_lr, preprocessor_xgb):
+    """
+    สร้าง SharedBinner จาก preprocessors ของ LR และ XGBoost (bin ครั้งเดียวใช้ได้ทั้ง 2 model)
+    
+    transformers ใน pipelines จะถูก fit ผ่าน SharedBinner โดยตรง
+    จึง pickle pipelines เดิมไปใช้ต่อได้ตามปกติ
+    
+    Returns:
+        SharedBinner หรือ None ถ้า pipelines ไม่รองรับ (เช่น LR ใช้ OneHotEncoder แบบเดิม)
+    """
+    lr_steps = getattr(preprocessor_lr, "steps", [])
+    xgb_steps = getattr(preprocessor_xgb, "steps", [])
+    if (len(lr_steps) == 1 and isinstance(lr_steps[0][1], FusedBinnerEncoderForLR)
+            and len(xgb_steps) == 1 and isinstance(xgb_steps[0][1], FixedBinnerForXGBoost)):
+        return SharedBinner(lr_steps[0][1], xgb_steps[0][1])
+    
+    logger.info("Preprocessors do not support shared binning - transforming separately")
+    return None
+
+
+def fit_preprocessor_streaming(preprocessor, chunk_size=CSV_CHUNK_SIZE, data_path=None):
+    """
+    Fit preprocessor แบบ streaming ทีละ chunk จากไฟล์ CSV (สำหรับข้อมูลที่ใหญ่เกิน RAM)
+    
+    ทุกแถวในไฟล์ถูกใช้เป็น training data - ใช้กับไฟล์ข้อมูลย้อนหลังที่ไม่มี val/test ปนอยู่
+    Balance quantiles ประมาณจาก KLL sketch (ดู QUANTILE_SKETCH_K)
+    
+    ถ้าแบ่งไฟล์ให้หลาย workers: ให้แต่ละ worker เรียก partial_fit() กับส่วนของตัวเอง
+    แล้วรวมผลด้วย binner.merge(other_binner)
+    
+    Args:
+        preprocessor: Pipeline ที่มี step เดียวซึ่งรองรับ partial_fit()
+            (build_preprocess_pipeline_xgb() หรือ build_preprocess_pipeline_lr() แบบ fused)
+        chunk_size: จำนวนแถวต่อ chunk
+        data_path: path ของไฟล์ CSV (default: DATA_PATH)
+    
+    Returns:
+        preprocessor ที่ fit แล้ว
+    
+    Raises:
+        ValueError: ถ้า preprocessor ไม่รองรับ streaming fit
+    """
+    steps = getattr(preprocessor, "steps", [("preprocessor", preprocessor)])
+    if len(steps) != 1 or not hasattr(steps[0][1], "partial_fit"):
+        error_msg = (
+            f"Preprocessor steps {[name for name, _ in steps]} do not support streaming fit. "
+            "Use a single-step pipeline (e.g. USE_FUSED_LR_ENCODER = True)."
+        )
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    
+    transformer = steps[0][1]
+    n_rows = 0
+    for chunk in iter_raw_data_chunks(chunk_size=chunk_size, data_path=data_path):
+        transformer.partial_fit(chunk.drop(columns=DROP_COLS + [TARGET_COL]))
+        n_rows += len(chunk)
+    
+    logger.info(f"Fitted {type(transformer).__name__} on {n_rows} rows (streaming)")
+    return preprocessor
+
+
+def get_prepared_data(return_split_indices=False, save_split=False):
     """
     ฟังก์ชันหลักสำหรับใช้ในไฟล์ train model:
     - return X_train, X_val, X_test (ยังไม่ transform)
@@ -207,15 +627,25 @@ def get_prepared_data():
     - preprocessor_lr: สำหรับ Logistic Regression (with OneHot)
     - preprocessor_xgb: สำหรับ XGBoost (with Label Encoding)
     
+    Train/val/test ถูก slice จาก split indices ที่บันทึกไว้ของ run ปัจจุบัน (ถ้ามี)
+    
+    Args:
+        return_split_indices: ถ้า True จะคืน split indices (รวม 'cv_fold') ต่อท้าย tuple ด้วย
+        save_split: บันทึก split indices ลง models/run_{RUN_NUMBER}/ ถ้ายังไม่มี (ใช้ตอน train เท่านั้น)
+    
     Returns:
         tuple: (X_train, X_val, X_test, y_train, y_val, y_test, preprocessor_lr, preprocessor_xgb)
+            หรือ (..., split_indices) ถ้า return_split_indices=True
     """
     logger.info("="*60)
     logger.info("Starting data preparation pipeline")
     logger.info("="*60)
     
-    df = load_raw_data()
-    X_train, X_val, X_test, y_train, y_val, y_test = train_val_test_split(df)
+    with profile_stage("load_data"):
+        df = load_raw_data()
+    with profile_stage("split"):
+        split_indices = get_split_indices(df[TARGET_COL], save=save_split)
+        X_train, X_val, X_test, y_train, y_val, y_test = train_val_test_split(df, split_indices)
     
     # สร้าง preprocessor ทั้ง 2 แบบ
     preprocessor_lr = build_preprocess_pipeline_lr()
@@ -225,6 +655,8 @@ def get_prepared_data():
     logger.info("Created 2 preprocessors: LR (OneHot) and XGBoost (Label Encoding)")
     logger.info("="*60)
     
+    if return_split_indices:
+        return X_train, X_val, X_test, y_train, y_val, y_test, preprocessor_lr, preprocessor_xgb, split_indices
     return X_train, X_val, X_test, y_train, y_val, y_test, preprocessor_lr, preprocessor_xgb
 
 
@@ -5,7 +5,6 @@ Model Evaluation Script
 
 import numpy as np
 import pandas as pd
-import pickle
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
@@ -13,6 +12,7 @@ from sklearn.metrics import confusion_matrix, roc_curve, auc, precision_recall_c
 
 from logger_config import setup_logger
 from config import MODELS_DIR, PLOTS_DIR, RUN_NUMBER
+from model_artifacts import load_model_artifacts
 
 logger = setup_logger("evaluate_models")
 
@@ -31,26 +31,15 @@ def create_directories():
 
 
 def load_models():
-    """โหลด trained models"""
+    """โหลด trained models + preprocessors จาก native artifacts (run เก่าที่มีแต่ .pkl จะ fallback ไปโหลด .pkl)"""
     run_dir = f"run_{RUN_NUMBER}"
     models_dir = Path(MODELS_DIR) / run_dir
     
     logger.info(f"Loading models from Run #{RUN_NUMBER}...")
-    with open(models_dir / "logistic_regression.pkl", 'rb') as f:
-        lr_model = pickle.load(f)
-    
-    with open(models_dir / "xgboost.pkl", 'rb') as f:
-        xgb_model = pickle.load(f)
-    
-    # โหลดทั้ง 2 preprocessors
-    with open(models_dir / "preprocessor_lr.pkl", 'rb') as f:
-        preprocessor_lr = pickle.load(f)
-    
-    with open(models_dir / "preprocessor_xgb.pkl", 'rb') as f:
-        preprocessor_xgb = pickle.load(f)
+    artifacts = load_model_artifacts(models_dir)
     
     logger.info("Models and preprocessors loaded successfully")
-    return lr_model, xgb_model, preprocessor_lr, preprocessor_xgb
+    return artifacts
 
 
 def plot_confusion_matrix(y_true, y_pred, model_name, save_path):
@@ -121,10 +110,8 @@ def plot_precision_recall_curves(y_test, lr_proba, xgb_proba, save_path):
     logger.info(f"Saved PR curves to {save_path}")
 
 
-def plot_feature_importance_lr(lr_model, feature_names, save_path, top_n=15):
-    """สร้าง Feature Importance plot สำหรับ Logistic Regression"""
-    # ดึง coefficients
-    coefficients = lr_model.coef_[0]
+def plot_feature_importance_lr(coefficients, feature_names, save_path, top_n=15):
+    """สร้าง Feature Importance plot สำหรับ Logistic Regression (coefficients = coef_[0])"""
     
     # สร้าง DataFrame
     importance_df = pd.DataFrame({
@@ -171,27 +158,23 @@ if __name__ == "__main__":
     plots_dir = create_directories()
     
     # โหลด models และ preprocessors
-    lr_model, xgb_model, preprocessor_lr, preprocessor_xgb = load_models()
+    artifacts = load_models()
     
     # โหลดข้อมูล test (ต้อง import และ transform)
     from data_prep import get_prepared_data
     logger.info("Loading test data...")
     X_train, X_val, X_test, y_train, y_val, y_test, _, _ = get_prepared_data()
     
-    # Transform ด้วย preprocessor ที่เหมาะสม
-    logger.info("Transforming test data...")
-    X_test_lr = preprocessor_lr.transform(X_test)
-    X_test_xgb = preprocessor_xgb.transform(X_test)
-    
-    logger.info(f"LR features: {X_test_lr.shape[1]}, XGBoost features: {X_test_xgb.shape[1]}")
+    logger.info(f"LR features: {len(artifacts.lr_feature_names)}, "
+                f"XGBoost features: {len(artifacts.xgb_feature_names)}")
     
-    # Predictions
+    # Predictions (artifacts transform ข้อมูลดิบเองด้วย preprocessor ของแต่ละ model)
     logger.info("Generating predictions...")
-    lr_pred = lr_model.predict(X_test_lr)
-    lr_proba = lr_model.predict_proba(X_test_lr)[:, 1]
+    lr_pred = artifacts.predict_lr(X_test)
+    lr_proba = artifacts.predict_proba_lr(X_test)
     
-    xgb_pred = xgb_model.predict(X_test_xgb)
-    xgb_proba = xgb_model.predict_proba(X_test_xgb)[:, 1]
+    xgb_pred = artifacts.predict_xgb(X_test)
+    xgb_proba = artifacts.predict_proba_xgb(X_test)
     
     
     # 1. Confusion Matrices
@@ -214,12 +197,11 @@ if __name__ == "__main__":
     # 4. Feature Importance
     logger.info("Creating feature importance plots...")
     
-    # สำหรับ LR ต้องดึง feature names จาก preprocessor
-    feature_names = preprocessor_lr.named_steps['encoder'].get_feature_names_out()
-    plot_feature_importance_lr(lr_model, feature_names, 
+    # feature names ของ LR ถูกบันทึกไว้คู่กับ coefficients
+    plot_feature_importance_lr(artifacts.lr_coef, artifacts.lr_feature_names, 
                               plots_dir / "feature_importance_lr.png")
     
-    plot_feature_importance_xgb(xgb_model, 
+    plot_feature_importance_xgb(artifacts.booster, 
                                plots_dir / "feature_importance_xgb.png")
     
     logger.info("="*70)
@@ -1,13 +1,178 @@
 from __future__ import annotations
+import logging
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.base import BaseEstimator, TransformerMixin
+from binning_core import (
+    AGE_BINS, AGE_LABELS,
+    CREDIT_SCORE_BINS, CREDIT_SCORE_LABELS,
+    TENURE_BINS, TENURE_LABELS,
+    FIXED_BINS, FIXED_BIN_EDGES,
+    balance_labels, bin_code_one, bin_codes, fixed_bin_codes,
+)
 from logger_config import setup_logger
+from quantile_sketch import DEFAULT_K, KLLSketch
 
 # สร้าง logger สำหรับ module นี้
 logger = setup_logger("feature_binning")
 
 
+def _numeric_bin_codes(X, balance_quantiles):
+    """
+    Bin Age / CreditScore / Tenure / Balance เป็น int8 matrix (n_rows, 4) ตามลำดับนี้
+    
+    - Age, CreditScore, Tenure: integer ใช้ lookup table (gather ครั้งเดียว), dtype อื่นใช้ searchsorted
+    - Balance: searchsorted กับ quantiles ที่เรียนรู้มา (include_lowest=True)
+    
+    Raises:
+        ValueError: ถ้ามีค่านอกช่วง bins (ตรวจจาก code -1 ที่ได้ใน pass เดียวกัน)
+    """
+    specs = [col for col, _ in FIXED_BINS] + ["Balance"]
+    codes = np.empty((len(X), len(specs)), dtype=np.int8, order="F")
+    balance_bins = np.unique(balance_quantiles)
+    
+    for j, col in enumerate(specs):
+        values = X[col].to_numpy()
+        if col == "Balance":
+            codes[:, j] = bin_codes(values, balance_bins, include_lowest=True)
+        else:
+            codes[:, j] = fixed_bin_codes(col, values)
+        
+        invalid = codes[:, j] < 0
+        if invalid.any():
+            invalid_values = pd.unique(values[invalid])
+            error_msg = f"Invalid {col} values found (outside bins): {invalid_values}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+    
+    return codes
+
+
+# (column, edges, include_lowest) สำหรับ _numeric_bin_codes_one - edges None = Balance (เรียนรู้ตอน fit)
+_ONE_ROW_SPECS = [(col, FIXED_BIN_EDGES[col], False) for col, _ in FIXED_BINS] + [("Balance", None, True)]
+
+
+def _balance_edges_one(binner):
+    """
+    Balance bin edges (list ของ float) สำหรับ transform_one()
+    
+    ใช้ balance_edges_ ที่เก็บไว้ตอน fit - binner ที่ pickle ไว้ก่อนมี attribute นี้
+    จะคำนวณจาก balance_quantiles_ แทน
+    """
+    edges = getattr(binner, "balance_edges_", None)
+    if edges is not None:
+        return edges
+    if getattr(binner, "balance_quantiles_", None) is None:
+        error_msg = "Balance quantiles not learned. Please call fit() first."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    return [float(v) for v in np.unique(binner.balance_quantiles_)]
+
+
+def _code_dtype(n_codes):
+    """integer dtype ที่เล็กที่สุดที่เก็บ codes 0..n_codes-1 และ -1 (ค่าที่ไม่รู้จัก) ได้"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_codes - 1 <= np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _is_missing(value):
+    """ค่าว่างของ scalar 1 ค่า (None / NaN) - เหมือน pd.isna แต่ไม่ผ่าน pandas"""
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _numeric_bin_codes_one(record, balance_edges):
+    """
+    Bin Age / CreditScore / Tenure / Balance ของลูกค้า 1 ราย (dict ของ Python scalars)
+    
+    ผลลัพธ์เหมือน _numeric_bin_codes() แถวเดียว แต่ใช้ bisect กับ scalar โดยตรง
+    ไม่สร้าง DataFrame / NumPy array
+    
+    Returns:
+        list: bin index ตามลำดับ [Age, CreditScore, Tenure, Balance]
+    
+    Raises:
+        ValueError: ถ้าคอลัมน์ที่จำเป็นหายไป หรือมีค่านอกช่วง bins
+    """
+    codes = []
+    for col, edges, include_lowest in _ONE_ROW_SPECS:
+        if col not in record:
+            error_msg = f"Missing required columns for binning: {[col]}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        value = record[col]
+        code = bin_code_one(value, balance_edges if edges is None else edges, include_lowest)
+        if code < 0:
+            error_msg = f"Invalid {col} values found (outside bins): [{value}]"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        codes.append(code)
+    return codes
+
+
+def _update_balance_sketch(binner, X):
+    """
+    เพิ่ม Balance ของ chunk เข้า KLL sketch ของ binner แล้วอัปเดต balance_quantiles_
+    (ใช้ร่วมกันใน partial_fit ของทุก binner)
+    """
+    if "Balance" not in X.columns:
+        logger.warning("Balance column not found in chunk - skipped for quantile sketch")
+        return
+    if getattr(binner, "balance_sketch_", None) is None:
+        binner.balance_sketch_ = KLLSketch(k=getattr(binner, "sketch_k", DEFAULT_K), seed=0)
+    binner.balance_sketch_.update(X["Balance"].to_numpy())
+    _set_balance_quantiles_from_sketch(binner)
+
+
+def _merge_balance_sketch(binner, other):
+    """รวม KLL sketch ของ binner อื่น (เช่น จาก worker อื่น) แล้วอัปเดต balance_quantiles_"""
+    other_sketch = getattr(other, "balance_sketch_", None)
+    if other_sketch is None:
+        error_msg = "Cannot merge a binner that was not fitted with partial_fit()"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    if getattr(binner, "balance_sketch_", None) is None:
+        binner.balance_sketch_ = KLLSketch(k=other_sketch.k, seed=0)
+    binner.balance_sketch_.merge(other_sketch)
+    _set_balance_quantiles_from_sketch(binner)
+
+
+def _set_balance_quantiles_from_sketch(binner):
+    """balance_quantiles_ = [min, Q1, Q2, Q3, inf] เหมือน fit() แต่ Q1-Q3 ประมาณจาก sketch"""
+    sketch = binner.balance_sketch_
+    if sketch.n == 0:
+        return
+    quantiles = sketch.quantiles([0.25, 0.5, 0.75])
+    binner.balance_quantiles_ = [sketch.min_] + [float(q) for q in quantiles] + [np.inf]
+    binner.balance_edges_ = [float(v) for v in np.unique(binner.balance_quantiles_)]
+    logger.debug(f"Balance quantiles from sketch (n={sketch.n}): {binner.balance_quantiles_}")
+
+
+def _assemble_output(X, new_cols, drop_cols=(), copy=True):
+    """
+    รวมคอลัมน์ที่สร้างใหม่ (new_cols) กับคอลัมน์เดิมของ X
+    
+    - คอลัมน์ใน new_cols ที่มีชื่อซ้ำกับ X จะแทนที่คอลัมน์เดิม (ตำแหน่งเดิม)
+    - คอลัมน์ใหม่จะต่อท้าย และคอลัมน์ใน drop_cols จะถูกตัดออก
+    
+    Args:
+        copy: True = X.copy() แล้ว assign (พฤติกรรมเดิม)
+              False = ไม่ copy X - คอลัมน์เดิมที่ไม่ถูกแทนที่ถูกอ้างอิงตรงๆ
+    """
+    if copy:
+        X = X.copy()
+        for col, values in new_cols.items():
+            X[col] = values
+        return X.drop(columns=list(drop_cols)) if drop_cols else X
+    
+    columns = [col for col in X.columns if col not in drop_cols]
+    columns += [col for col in new_cols if col not in X.columns]
+    data = {col: new_cols[col] if col in new_cols else X[col] for col in columns}
+    return pd.DataFrame(data, index=X.index, columns=columns, copy=False)
+
+
 class FixedBinnerForLR(BaseEstimator, TransformerMixin):
     """
     Transformer สำหรับทำ binning ในคอลัมน์ CreditScore, Age, Tenure, Balance
@@ -18,24 +183,38 @@ class FixedBinnerForLR(BaseEstimator, TransformerMixin):
     
     Output: Categorical features พร้อมสำหรับ OneHotEncoder
     
+    Args:
+        engine: "pandas" (pd.cut) หรือ "numpy" (lookup table / searchsorted แล้วสร้าง
+            Categorical จาก codes โดยตรง - ผลลัพธ์เหมือนกัน)
+        copy: ถ้า False จะไม่ copy input - output ใช้คอลัมน์เดิมของ X ร่วมกัน
+            และจองหน่วยความจำใหม่เฉพาะคอลัมน์ *_bin (ห้ามแก้ไข output แบบ in-place)
+        sketch_k: ขนาด KLL sketch ที่ใช้ใน partial_fit() (ยิ่งมากยิ่งแม่น)
+    
     Usage:
         binner = FixedBinnerForLR()
         binner.fit(X_train)  # เรียนรู้ quantiles จาก training data
         X_train_binned = binner.transform(X_train)
         X_test_binned = binner.transform(X_test)  # ใช้ quantiles เดียวกัน
+        
+        # ข้อมูลใหญ่เกิน RAM: เรียนรู้ quantiles แบบ streaming ทีละ chunk
+        for chunk in chunks:
+            binner.partial_fit(chunk)
     
     Raises:
         ValueError: ถ้าคอลัมน์ที่จำเป็นหายไป หรือมีค่านอกช่วง bins
     """
 
-    def __init__(self):
+    def __init__(self, engine="pandas", copy=True, sketch_k=DEFAULT_K):
         # คุณสามารถแก้ช่วง bin ได้เองตามต้องการ
+        self.engine = engine
+        self.copy = copy
+        self.sketch_k = sketch_k
         self.required_cols = ["Age", "CreditScore", "Tenure", "Balance"]
         logger.debug("FixedBinnerForLR initialized")
 
     def fit(self, X, y=None):
         logger.debug("FixedBinner.fit() called - learning Balance quantiles from training data")
-        X = X.copy()
+        # fit อ่านแค่คอลัมน์ Balance จึงไม่ต้อง copy X
         
         # เรียนรู้ quantile cutpoints จาก Balance ใน training data
         if "Balance" in X.columns:
@@ -48,16 +227,49 @@ class FixedBinnerForLR(BaseEstimator, TransformerMixin):
             
             # สร้าง bins: [min, Q1, Q2, Q3, inf]
             self.balance_quantiles_ = [min_val] + list(quantiles) + [max_val]
+            # edges ที่ไม่ซ้ำแบบ list ของ float สำหรับ transform_one()
+            self.balance_edges_ = [float(v) for v in np.unique(self.balance_quantiles_)]
             logger.debug(f"Balance quantiles learned: {self.balance_quantiles_}")
         else:
             logger.warning("Balance column not found in training data - quantiles not learned")
             self.balance_quantiles_ = None
+            self.balance_edges_ = None
+        # fit() เริ่มใหม่ทั้งหมด - sketch ของ partial_fit() ก่อนหน้าไม่ถูกใช้ต่อ
+        self.balance_sketch_ = None
             
         return self
 
+    def partial_fit(self, X, y=None):
+        """
+        เรียนรู้ Balance quantiles แบบ streaming ทีละ chunk (ไม่ต้องโหลดทั้งคอลัมน์เข้า RAM)
+        
+        quantiles ประมาณจาก KLL sketch (rank error ~ O(1/sketch_k)) และอัปเดตทุกครั้งที่เรียก
+        - min ของ Balance เป็นค่า exact
+        """
+        logger.debug(f"FixedBinnerForLR.partial_fit() called with shape {X.shape}")
+        _update_balance_sketch(self, X)
+        return self
+
+    def merge(self, other):
+        """รวมผล partial_fit() ของ binner อื่น (เช่น ที่ fit ใน worker อื่นด้วยข้อมูลคนละส่วน)"""
+        _merge_balance_sketch(self, other)
+        return self
+
     def transform(self, X):
         logger.debug(f"FixedBinner.transform() called with shape {X.shape}")
-        X = X.copy()
+        # binner ที่ pickle ไว้ก่อนมี engine จะใช้ pandas engine
+        engine = getattr(self, "engine", "pandas")
+        if engine == "numpy":
+            return self._transform_numpy(X)
+        if engine != "pandas":
+            error_msg = f"Unknown binning engine: {engine}. Use 'pandas' or 'numpy'."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # สถิติ distribution (value_counts) คำนวณเฉพาะตอนเปิด DEBUG จริงๆ
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # คอลัมน์ใหม่ที่สร้างขึ้น (X เดิมไม่ถูกแก้ไข)
+        out = {}
 
         # ตรวจสอบคอลัมน์ที่จำเป็น
         missing_cols = [col for col in self.required_cols if col not in X.columns]
@@ -70,48 +282,51 @@ class FixedBinnerForLR(BaseEstimator, TransformerMixin):
 
         # === Age (ปี) ===
         logger.debug("Binning Age column...")
-        X["Age_bin"] = pd.cut(
+        out["Age_bin"] = pd.cut(
             X["Age"],
-            bins=[0, 20, 30, 40, 50, 60, 200],
-            labels=["<20", "20-30", "31-40", "41-50", "51-60", ">60"],
+            bins=AGE_BINS,
+            labels=AGE_LABELS,
             right=True,
         )
-        if X["Age_bin"].isna().any():
-            invalid_ages = X.loc[X["Age_bin"].isna(), "Age"].unique()
+        if out["Age_bin"].isna().any():
+            invalid_ages = X.loc[out["Age_bin"].isna(), "Age"].unique()
             error_msg = f"Invalid Age values found (outside bins): {invalid_ages}"
             logger.error(error_msg)
             raise ValueError(error_msg)
-        logger.debug(f"Age binning successful. Distribution: {X['Age_bin'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Age binning successful. Distribution: {out['Age_bin'].value_counts().to_dict()}")
 
         # === CreditScore (Risk Grade) ===
         logger.debug("Binning CreditScore column...")
-        X["CreditScore_bin"] = pd.cut(
+        out["CreditScore_bin"] = pd.cut(
             X["CreditScore"],
-            bins=[0, 615, 645, 665, 680, 698, 724, 752, 900],
-            labels=["HH", "GG", "FF", "EE", "DD", "CC", "BB", "AA"],
+            bins=CREDIT_SCORE_BINS,
+            labels=CREDIT_SCORE_LABELS,
             right=True,
         )
-        if X["CreditScore_bin"].isna().any():
-            invalid_scores = X.loc[X["CreditScore_bin"].isna(), "CreditScore"].unique()
+        if out["CreditScore_bin"].isna().any():
+            invalid_scores = X.loc[out["CreditScore_bin"].isna(), "CreditScore"].unique()
             error_msg = f"Invalid CreditScore values found (outside bins): {invalid_scores}"
             logger.error(error_msg)
             raise ValueError(error_msg)
-        logger.debug(f"CreditScore binning successful. Distribution: {X['CreditScore_bin'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"CreditScore binning successful. Distribution: {out['CreditScore_bin'].value_counts().to_dict()}")
 
         # === Tenure (Customer Segment) ===
         logger.debug("Binning Tenure column...")
-        X["Tenure_bin"] = pd.cut(
+        out["Tenure_bin"] = pd.cut(
             X["Tenure"],
-            bins=[-1, 2, 5, 10, 20],
-            labels=["New/At-Risk", "Emerging Loyalty", "Established/Loyal", "Long-Term"],
+            bins=TENURE_BINS,
+            labels=TENURE_LABELS,
             right=True,
         )
-        if X["Tenure_bin"].isna().any():
-            invalid_tenure = X.loc[X["Tenure_bin"].isna(), "Tenure"].unique()
+        if out["Tenure_bin"].isna().any():
+            invalid_tenure = X.loc[out["Tenure_bin"].isna(), "Tenure"].unique()
             error_msg = f"Invalid Tenure values found (outside bins): {invalid_tenure}"
             logger.error(error_msg)
             raise ValueError(error_msg)
-        logger.debug(f"Tenure binning successful. Distribution: {X['Tenure_bin'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Tenure binning successful. Distribution: {out['Tenure_bin'].value_counts().to_dict()}")
 
         # === Balance (Quantile-based) ===
         logger.debug("Binning Balance column using learned quantiles...")
@@ -128,39 +343,88 @@ class FixedBinnerForLR(BaseEstimator, TransformerMixin):
         n_labels = n_bins - 1
         
         # สร้าง labels ตามจำนวน bins ที่เหลือ
-        if n_labels == 4:
-            labels = ["Q1-Low", "Q2-Medium-Low", "Q3-Medium-High", "Q4-High"]
-        elif n_labels == 3:
-            labels = ["Low", "Medium", "High"]
-        elif n_labels == 2:
-            labels = ["Low", "High"]
-        else:
-            labels = [f"Q{i+1}" for i in range(n_labels)]
+        labels = balance_labels(n_labels)
         
         logger.debug(f"Using {n_bins} unique bins with {n_labels} labels")
         
         # ใช้ pd.cut() กับ bins ที่เรียนรู้มาจาก training data
-        X["Balance_bin"] = pd.cut(
+        out["Balance_bin"] = pd.cut(
             X["Balance"],
             bins=unique_bins,
             labels=labels,
             include_lowest=True
         )
         
-        if X["Balance_bin"].isna().any():
-            invalid_balance = X.loc[X["Balance_bin"].isna(), "Balance"].unique()
+        if out["Balance_bin"].isna().any():
+            invalid_balance = X.loc[out["Balance_bin"].isna(), "Balance"].unique()
             error_msg = f"Invalid Balance values found (outside bins): {invalid_balance}"
             logger.error(error_msg)
             raise ValueError(error_msg)
-        logger.debug(f"Balance binning successful. Distribution: {X['Balance_bin'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Balance binning successful. Distribution: {out['Balance_bin'].value_counts().to_dict()}")
 
         # ลบคอลัมน์ numeric ดั้งเดิม
         logger.debug(f"Dropping original numeric columns: {self.required_cols}")
-        X = X.drop(columns=self.required_cols)
+        X = _assemble_output(X, out, drop_cols=self.required_cols, copy=getattr(self, "copy", True))
         
         logger.debug(f"FixedBinnerForLR.transform() completed. Output shape: {X.shape}")
         return X
 
+    def transform_one(self, record):
+        """
+        Binning ลูกค้า 1 ราย โดยไม่ผ่าน pandas (สำหรับ real-time scoring)
+        
+        Args:
+            record: dict ของค่า feature ดิบ เช่น {"Age": 42, "Balance": 0.0, ...}
+        
+        Returns:
+            dict: เหมือน transform() 1 แถว - คอลัมน์อื่นคงเดิม, คอลัมน์ตัวเลขถูกแทนด้วย *_bin labels
+        """
+        balance_edges = _balance_edges_one(self)
+        codes = _numeric_bin_codes_one(record, balance_edges)
+        n_balance_labels = len(balance_edges) - 1
+        labels = [AGE_LABELS, CREDIT_SCORE_LABELS, TENURE_LABELS, balance_labels(n_balance_labels)]
+        
+        out = {col: value for col, value in record.items() if col not in self.required_cols}
+        for col, code, col_labels in zip(self.required_cols, codes, labels):
+            out[f"{col}_bin"] = col_labels[code]
+        return out
+
+    def _transform_numpy(self, X):
+        """
+        NumPy engine: หา bin codes ด้วย lookup table / searchsorted แล้วสร้าง
+        ordered Categorical จาก codes โดยตรง (ผลลัพธ์เหมือน pd.cut ที่มี labels)
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        missing_cols = [col for col in self.required_cols if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        if not hasattr(self, 'balance_quantiles_') or self.balance_quantiles_ is None:
+            error_msg = "Balance quantiles not learned. Please call fit() first."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        codes = _numeric_bin_codes(X, self.balance_quantiles_)
+        n_balance_labels = len(np.unique(self.balance_quantiles_)) - 1
+        labels = [AGE_LABELS, CREDIT_SCORE_LABELS, TENURE_LABELS, balance_labels(n_balance_labels)]
+        bin_cols = ["Age_bin", "CreditScore_bin", "Tenure_bin", "Balance_bin"]
+
+        out = {
+            col: pd.Categorical.from_codes(codes[:, j], categories=labels[j], ordered=True)
+            for j, col in enumerate(bin_cols)
+        }
+        X = _assemble_output(X, out, drop_cols=self.required_cols, copy=getattr(self, "copy", True))
+        if debug:
+            for col in bin_cols:
+                logger.debug(f"{col} binning successful. Distribution: {X[col].value_counts().to_dict()}")
+
+        logger.debug(f"FixedBinnerForLR.transform() completed (numpy engine). Output shape: {X.shape}")
+        return X
+
 
 class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
     """
@@ -173,6 +437,14 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
     Output: Numeric features พร้อมสำหรับ XGBoost โดยตรง
     ข้อดี: SHAP plots อ่านง่ายกว่า เพราะแต่ละ feature เป็น 1 column
     
+    Args:
+        engine: "pandas" (pd.cut + Series.map) หรือ "numpy" (np.searchsorted +
+            integer codes เขียนลง int8 matrix เดียว - ผลลัพธ์เหมือนกันแต่เร็วกว่า;
+            ถ้า categorical มีเกิน 127 ค่า matrix จะเป็น int16 / int32 แทน)
+        copy: ถ้า False จะไม่ copy input - output ใช้คอลัมน์ที่ไม่ถูก encode ร่วมกับ X
+            และจองหน่วยความจำใหม่เฉพาะคอลัมน์ที่ถูก bin/encode (ห้ามแก้ไข output แบบ in-place)
+        sketch_k: ขนาด KLL sketch ที่ใช้ใน partial_fit() (ยิ่งมากยิ่งแม่น)
+    
     Usage:
         binner = FixedBinnerForXGBoost()
         binner.fit(X_train)  # เรียนรู้ quantiles และ label mappings
@@ -183,14 +455,17 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
         ValueError: ถ้าคอลัมน์ที่จำเป็นหายไป หรือมีค่านอกช่วง bins
     """
 
-    def __init__(self):
+    def __init__(self, engine="pandas", copy=True, sketch_k=DEFAULT_K):
+        self.engine = engine
+        self.copy = copy
+        self.sketch_k = sketch_k
         self.required_cols = ["Age", "CreditScore", "Tenure", "Balance"]
         self.categorical_cols = ["Geography", "Gender"]
-        logger.debug("FixedBinnerForXGBoost initialized")
+        logger.debug(f"FixedBinnerForXGBoost initialized (engine={engine})")
 
     def fit(self, X, y=None):
         logger.debug("FixedBinnerForXGBoost.fit() called - learning Balance quantiles and label mappings")
-        X = X.copy()
+        # fit อ่านแค่ Balance และ categorical columns จึงไม่ต้อง copy X
         
         # เรียนรู้ quantile cutpoints จาก Balance ใน training data
         if "Balance" in X.columns:
@@ -199,10 +474,12 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
             max_val = np.inf
             
             self.balance_quantiles_ = [min_val] + list(quantiles) + [max_val]
+            self.balance_edges_ = [float(v) for v in np.unique(self.balance_quantiles_)]
             logger.debug(f"Balance quantiles learned: {self.balance_quantiles_}")
         else:
             logger.warning("Balance column not found in training data - quantiles not learned")
             self.balance_quantiles_ = None
+            self.balance_edges_ = None
         
         # เรียนรู้ label mappings สำหรับ categorical features
         self.label_mappings_ = {}
@@ -213,12 +490,59 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
                 logger.debug(f"{col} label mapping: {self.label_mappings_[col]}")
             else:
                 logger.warning(f"{col} column not found in training data")
+        
+        # ลำดับคอลัมน์ของ output (เหมือน input) - transform_one() ใช้เรียง feature vector
+        self.columns_ = list(X.columns)
+        self.balance_sketch_ = None
                 
         return self
 
+    def partial_fit(self, X, y=None):
+        """
+        เรียนรู้ Balance quantiles (KLL sketch) และ label mappings แบบ streaming ทีละ chunk
+        
+        label mappings = ค่าที่พบทั้งหมดจนถึงตอนนี้เรียงลำดับ (เหมือน fit() กับข้อมูลทั้งหมด)
+        """
+        logger.debug(f"FixedBinnerForXGBoost.partial_fit() called with shape {X.shape}")
+        _update_balance_sketch(self, X)
+        
+        observed = {col: X[col].dropna().unique() for col in self.categorical_cols if col in X.columns}
+        self._merge_label_mappings(observed)
+        if getattr(self, "columns_", None) is None:
+            self.columns_ = list(X.columns)
+        return self
+
+    def merge(self, other):
+        """รวมผล partial_fit() ของ binner อื่น (เช่น ที่ fit ใน worker อื่นด้วยข้อมูลคนละส่วน)"""
+        _merge_balance_sketch(self, other)
+        self._merge_label_mappings(other.label_mappings_)
+        if getattr(self, "columns_", None) is None:
+            self.columns_ = other.columns_
+        return self
+
+    def _merge_label_mappings(self, observed):
+        """รวมค่าที่พบใหม่เข้า label_mappings_ แล้วกำหนด index ใหม่ตามลำดับที่เรียงแล้ว"""
+        if getattr(self, "label_mappings_", None) is None:
+            self.label_mappings_ = {}
+        for col, values in observed.items():
+            unique_values = sorted(set(self.label_mappings_.get(col, {})) | set(values))
+            self.label_mappings_[col] = {val: idx for idx, val in enumerate(unique_values)}
+
     def transform(self, X):
         logger.debug(f"FixedBinnerForXGBoost.transform() called with shape {X.shape}")
-        X = X.copy()
+        # binner ที่ pickle ไว้ก่อนมี engine จะใช้ pandas engine
+        engine = getattr(self, "engine", "pandas")
+        if engine == "numpy":
+            return self._transform_numpy(X)
+        if engine != "pandas":
+            error_msg = f"Unknown binning engine: {engine}. Use 'pandas' or 'numpy'."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # สถิติ distribution (value_counts) คำนวณเฉพาะตอนเปิด DEBUG จริงๆ
+        debug = logger.isEnabledFor(logging.DEBUG)
+        # คอลัมน์ที่ถูก encode แล้ว (X เดิมไม่ถูกแก้ไข)
+        out = {}
 
         # ตรวจสอบคอลัมน์ที่จำเป็น
         missing_cols = [col for col in self.required_cols if col not in X.columns]
@@ -231,39 +555,42 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
 
         # === Age (ปี) - แปลงเป็น numeric ===
         logger.debug("Binning Age column...")
-        age_bins = [0, 20, 30, 40, 50, 60, 200]
-        age_labels = [0, 1, 2, 3, 4, 5]  # numeric labels
-        X["Age"] = pd.cut(
+        age_bins = AGE_BINS
+        age_labels = list(range(len(AGE_LABELS)))  # numeric labels
+        out["Age"] = pd.cut(
             X["Age"],
             bins=age_bins,
             labels=age_labels,
             right=True,
         ).astype(int)
-        logger.debug(f"Age binning successful. Distribution: {X['Age'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Age binning successful. Distribution: {out['Age'].value_counts().to_dict()}")
 
         # === CreditScore (Risk Grade) - แปลงเป็น numeric ===
         logger.debug("Binning CreditScore column...")
-        score_bins = [0, 615, 645, 665, 680, 698, 724, 752, 900]
-        score_labels = [0, 1, 2, 3, 4, 5, 6, 7]  # numeric labels (0=worst, 7=best)
-        X["CreditScore"] = pd.cut(
+        score_bins = CREDIT_SCORE_BINS
+        score_labels = list(range(len(CREDIT_SCORE_LABELS)))  # numeric labels (0=worst, 7=best)
+        out["CreditScore"] = pd.cut(
             X["CreditScore"],
             bins=score_bins,
             labels=score_labels,
             right=True,
         ).astype(int)
-        logger.debug(f"CreditScore binning successful. Distribution: {X['CreditScore'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"CreditScore binning successful. Distribution: {out['CreditScore'].value_counts().to_dict()}")
 
         # === Tenure (Customer Segment) - แปลงเป็น numeric ===
         logger.debug("Binning Tenure column...")
-        tenure_bins = [-1, 2, 5, 10, 20]
-        tenure_labels = [0, 1, 2, 3]  # numeric labels
-        X["Tenure"] = pd.cut(
+        tenure_bins = TENURE_BINS
+        tenure_labels = list(range(len(TENURE_LABELS)))  # numeric labels
+        out["Tenure"] = pd.cut(
             X["Tenure"],
             bins=tenure_bins,
             labels=tenure_labels,
             right=True,
         ).astype(int)
-        logger.debug(f"Tenure binning successful. Distribution: {X['Tenure'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Tenure binning successful. Distribution: {out['Tenure'].value_counts().to_dict()}")
 
         # === Balance (Quantile-based) - แปลงเป็น numeric ===
         logger.debug("Binning Balance column using learned quantiles...")
@@ -282,14 +609,15 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
         
         logger.debug(f"Using {n_bins} unique bins with {n_labels} labels")
         
-        X["Balance"] = pd.cut(
+        out["Balance"] = pd.cut(
             X["Balance"],
             bins=unique_bins,
             labels=numeric_labels,
             include_lowest=True
         ).astype(int)
         
-        logger.debug(f"Balance binning successful. Distribution: {X['Balance'].value_counts().to_dict()}")
+        if debug:
+            logger.debug(f"Balance binning successful. Distribution: {out['Balance'].value_counts().to_dict()}")
 
         # === Label Encoding สำหรับ categorical features ===
         logger.debug("Applying label encoding to categorical features...")
@@ -297,23 +625,500 @@ class FixedBinnerForXGBoost(BaseEstimator, TransformerMixin):
             if col in X.columns:
                 if col in self.label_mappings_:
                     # ใช้ mapping ที่เรียนรู้มา
-                    X[col] = X[col].map(self.label_mappings_[col])
+                    mapped = X[col].map(self.label_mappings_[col])
                     
                     # ตรวจสอบว่ามีค่าที่ไม่รู้จักหรือไม่
-                    if X[col].isna().any():
-                        unknown_values = X.loc[X[col].isna(), col].unique()
+                    if mapped.isna().any():
+                        unknown_values = X.loc[mapped.isna(), col].unique()
                         logger.warning(f"Unknown values in {col}: {unknown_values}. Filling with -1.")
-                        X[col] = X[col].fillna(-1).astype(int)
+                        out[col] = mapped.fillna(-1).astype(int)
                     else:
-                        X[col] = X[col].astype(int)
+                        out[col] = mapped.astype(int)
                     
-                    logger.debug(f"{col} label encoding successful. Distribution: {X[col].value_counts().to_dict()}")
+                    if debug:
+                        logger.debug(f"{col} label encoding successful. Distribution: {out[col].value_counts().to_dict()}")
                 else:
                     logger.warning(f"No label mapping found for {col}. Skipping.")
         
+        X = _assemble_output(X, out, copy=getattr(self, "copy", True))
+        
         logger.debug(f"FixedBinnerForXGBoost.transform() completed. Output shape: {X.shape}")
         return X
 
+    def transform_one(self, record):
+        """
+        Encode ลูกค้า 1 ราย เป็น feature vector โดยไม่ผ่าน pandas (สำหรับ real-time scoring)
+        
+        Args:
+            record: dict ของค่า feature ดิบ เช่น {"Age": 42, "Geography": "France", ...}
+        
+        Returns:
+            np.ndarray (float64, 1D): ค่าตามลำดับคอลัมน์ของ transform() (columns_)
+            categorical ที่ไม่รู้จักจะเป็น -1 พร้อม warning (เหมือน transform())
+        
+        Raises:
+            ValueError: ถ้า record ไม่มีคอลัมน์ที่จำเป็น หรือมีค่านอกช่วง bins
+        """
+        columns = getattr(self, "columns_", None)
+        if columns is None:
+            error_msg = "Column order not learned (binner fitted by an older version). Please call fit() again."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        encoded = dict(zip(self.required_cols, _numeric_bin_codes_one(record, _balance_edges_one(self))))
+        for col, mapping in self.label_mappings_.items():
+            if col not in record:
+                error_msg = f"Missing required columns for binning: {[col]}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            encoded[col] = mapping.get(record[col], -1)
+            if encoded[col] < 0:
+                logger.warning(f"Unknown values in {col}: {[record[col]]}. Filling with -1.")
+        
+        try:
+            return np.array([encoded[col] if col in encoded else record[col] for col in columns], dtype=np.float64)
+        except KeyError as e:
+            error_msg = f"Missing column for transform_one: {e.args[0]}"
+            logger.error(error_msg)
+            raise ValueError(error_msg) from e
+
+    def _transform_numpy(self, X, numeric_codes=None, categorical_codes=None):
+        """
+        NumPy engine: bin คอลัมน์ตัวเลขด้วย lookup table (integer) / np.searchsorted
+        และ encode categorical ด้วย integer codes โดยเขียนผลลัพธ์ทั้งหมดลง int8 matrix เดียว
+        (ไม่สร้าง Categorical ชั่วคราวจาก pd.cut ทีละคอลัมน์)
+        
+        Args:
+            numeric_codes: bin codes ที่คำนวณไว้แล้ว (ผลของ _numeric_bin_codes) - ใช้โดย SharedBinner
+            categorical_codes: {col: codes ตาม label_mappings_} ที่คำนวณไว้แล้ว (optional)
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+
+        missing_cols = [col for col in self.required_cols if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        if not hasattr(self, 'balance_quantiles_') or self.balance_quantiles_ is None:
+            error_msg = "Balance quantiles not learned. Please call fit() first."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        numeric_cols = [col for col, _ in FIXED_BINS] + ["Balance"]
+        categorical_cols = [
+            col for col in self.categorical_cols
+            if col in X.columns and col in self.label_mappings_
+        ]
+        for col in self.categorical_cols:
+            if col in X.columns and col not in self.label_mappings_:
+                logger.warning(f"No label mapping found for {col}. Skipping.")
+
+        out_cols = numeric_cols + categorical_cols
+        # int8 พอสำหรับ bin codes - categorical ที่มีเกิน 127 ค่าใช้ dtype ที่กว้างขึ้น (ไม่ให้ code ล้น)
+        n_codes = max([len(self.label_mappings_[col]) for col in categorical_cols], default=0)
+        codes = np.empty((len(X), len(out_cols)), dtype=_code_dtype(n_codes), order="F")
+        if numeric_codes is None:
+            numeric_codes = _numeric_bin_codes(X, self.balance_quantiles_)
+        codes[:, :len(numeric_cols)] = numeric_codes
+
+        for j, col in enumerate(categorical_cols, start=len(numeric_cols)):
+            if categorical_codes is not None and col in categorical_codes:
+                codes[:, j] = categorical_codes[col]
+            else:
+                mapping = self.label_mappings_[col]
+                # mapping เป็น {value: idx} เรียงตาม idx อยู่แล้ว -> ตำแหน่งใน index = idx, ค่าที่ไม่รู้จัก = -1
+                codes[:, j] = pd.Index(list(mapping)).get_indexer(X[col])
+            if (codes[:, j] < 0).any():
+                unknown_values = pd.unique(X[col].to_numpy()[codes[:, j] < 0])
+                logger.warning(f"Unknown values in {col}: {unknown_values}. Filling with -1.")
+
+        # codes เป็น Fortran order -> codes[:, j] เป็น view ที่ต่อเนื่องกัน ไม่ต้อง copy
+        out = {col: codes[:, j] for j, col in enumerate(out_cols)}
+        X = _assemble_output(X, out, copy=getattr(self, "copy", True))
+        if debug:
+            for col in out_cols:
+                logger.debug(f"{col} encoding successful. Distribution: {X[col].value_counts().to_dict()}")
+
+        logger.debug(f"FixedBinnerForXGBoost.transform() completed (numpy engine). Output shape: {X.shape}")
+        return X
+
+
+class FusedBinnerEncoderForLR(FixedBinnerForLR):
+    """
+    Binning + OneHot Encoding ในขั้นตอนเดียวสำหรับ Logistic Regression
+    
+    ให้ผลลัพธ์เหมือน FixedBinnerForLR + ColumnTransformer(OneHotEncoder(handle_unknown="ignore"))
+    แต่คำนวณ bin index เป็นตัวเลขแล้วเขียน CSR matrix (indices/indptr) โดยตรง
+    ไม่ต้องสร้าง string labels และไม่ต้อง encode ซ้ำอีกรอบ
+    
+    - categories ของแต่ละ feature = ค่าที่พบใน training data เรียงแบบ string (เหมือน OneHotEncoder)
+      ค่าว่าง (NaN / None) ใน training data เป็น category สุดท้าย "nan" เหมือน OneHotEncoder
+    - ค่าที่ไม่เคยเห็นตอน fit (categorical) -> ทุก column ของ feature นั้นเป็น 0
+    - ค่านอกช่วง bins -> ValueError (เหมือน FixedBinnerForLR)
+    - ชื่อ features ตรงกับ get_feature_names_out() ของ pipeline เดิม (เช่น "cat__Age_bin_20-30")
+    
+    Args:
+        engine: รองรับเฉพาะ "numpy" (bin codes จาก lookup table / searchsorted)
+        copy: ไม่มีผลกับ output (CSR matrix ใหม่เสมอ และไม่แก้ไข X) - มีไว้ให้ params ตรงกับ FixedBinnerForLR
+        sketch_k: ขนาด KLL sketch ที่ใช้ใน partial_fit() (ยิ่งมากยิ่งแม่น)
+    
+    Usage:
+        encoder = FusedBinnerEncoderForLR()
+        encoder.fit(X_train)
+        X_train_sparse = encoder.transform(X_train)  # scipy.sparse CSR
+        feature_names = encoder.get_feature_names_out()
+    
+    Raises:
+        ValueError: ถ้าคอลัมน์ที่จำเป็นหายไป หรือมีค่านอกช่วง bins
+    """
+
+    # prefix ของชื่อ feature เหมือน ColumnTransformer transformer ชื่อ "cat"
+    feature_prefix = "cat__"
+
+    def __init__(self, engine="numpy", copy=False, sketch_k=DEFAULT_K):
+        super().__init__(engine=engine, copy=copy, sketch_k=sketch_k)
+        self.categorical_cols = ["Geography", "Gender"]
+        self.bin_cols = ["Age_bin", "CreditScore_bin", "Tenure_bin", "Balance_bin"]
+
+    def _bin_labels(self):
+        n_balance_labels = len(np.unique(self.balance_quantiles_)) - 1
+        return [AGE_LABELS, CREDIT_SCORE_LABELS, TENURE_LABELS, balance_labels(n_balance_labels)]
+
+    def _category_codes(self, X, col, categories):
+        """integer codes ของ categorical column ตาม categories ที่กำหนด (-1 = ไม่รู้จัก / ค่าว่างที่ไม่เคยเห็นตอน fit)"""
+        codes = pd.Index(categories).get_indexer(X[col])
+        # ค่าว่างทุกแบบ (NaN / None) ได้ category NaN ซึ่งอยู่ท้ายสุดเสมอ
+        if len(categories) and pd.isna(categories[-1]):
+            codes[X[col].isna().to_numpy()] = len(categories) - 1
+        return codes
+
+    def _observed_categories(self, X, col):
+        """ค่าที่พบในคอลัมน์ - ค่าว่าง (NaN / None) แทนด้วย None"""
+        values = set(X[col].dropna().unique())
+        if X[col].isna().any():
+            values.add(None)
+        return values
+
+    def _check_fit_columns(self, X):
+        engine = getattr(self, "engine", "numpy")
+        if engine != "numpy":
+            error_msg = f"Unsupported binning engine for FusedBinnerEncoderForLR: {engine}. Use 'numpy'."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        missing_cols = [col for col in self.categorical_cols if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for encoding: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+    def fit(self, X, y=None):
+        logger.debug("FusedBinnerEncoderForLR.fit() called")
+        super().fit(X, y)
+        if self.balance_quantiles_ is None:
+            error_msg = "Balance column is required to fit FusedBinnerEncoderForLR"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self._check_fit_columns(X)
+        self._fit_encoding(X, _numeric_bin_codes(X, self.balance_quantiles_))
+        return self
+
+    def _fit_encoding(self, X, bin_codes_matrix):
+        """
+        เรียนรู้ categories จาก X และ bin codes ที่คำนวณแล้ว (ใช้ร่วมกับ SharedBinner)
+        
+        Args:
+            bin_codes_matrix: ผลของ _numeric_bin_codes(X, self.balance_quantiles_)
+        """
+        # categories = ค่าที่พบจริงใน training data
+        observed_values = [self._observed_categories(X, col) for col in self.categorical_cols]
+        observed_codes = [set(np.unique(bin_codes_matrix[:, j]).tolist()) for j in range(bin_codes_matrix.shape[1])]
+        self.observed_values_ = self.observed_codes_ = None
+        self._build_encoding(observed_values, observed_codes)
+
+    def partial_fit(self, X, y=None):
+        """
+        Streaming fit ทีละ chunk: Balance quantiles จาก KLL sketch, categories สะสมจากทุก chunk
+        
+        Balance bins ทุก bin ถือว่าพบใน training data (edges มาจาก quantiles ของข้อมูลเอง
+        จึงไม่มี bin ว่าง) - bins ของ Age / CreditScore / Tenure ใช้เฉพาะที่พบจริง
+        """
+        logger.debug(f"FusedBinnerEncoderForLR.partial_fit() called with shape {X.shape}")
+        self._check_fit_columns(X)
+        super().partial_fit(X, y)
+        if getattr(self, "balance_quantiles_", None) is None:
+            error_msg = "Balance column is required to fit FusedBinnerEncoderForLR"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        if getattr(self, "observed_values_", None) is None:
+            self.observed_values_ = [set() for _ in self.categorical_cols]
+            self.observed_codes_ = [set() for _ in FIXED_BINS]
+        for values, col in zip(self.observed_values_, self.categorical_cols):
+            values.update(self._observed_categories(X, col))
+        # ใช้แค่ fixed bins (Balance edges ยังเปลี่ยนได้ระหว่าง stream)
+        codes = _numeric_bin_codes(X, self.balance_quantiles_)
+        for j, seen in enumerate(self.observed_codes_):
+            seen.update(np.unique(codes[:, j]).tolist())
+        
+        self._build_encoding(self.observed_values_, self._streaming_observed_codes())
+        return self
+
+    def merge(self, other):
+        """รวมผล partial_fit() ของ encoder อื่น (เช่น ที่ fit ใน worker อื่นด้วยข้อมูลคนละส่วน)"""
+        _merge_balance_sketch(self, other)
+        if getattr(self, "observed_values_", None) is None:
+            self.observed_values_ = [set() for _ in self.categorical_cols]
+            self.observed_codes_ = [set() for _ in FIXED_BINS]
+        for mine, theirs in zip(self.observed_values_ + self.observed_codes_,
+                                other.observed_values_ + other.observed_codes_):
+            mine.update(theirs)
+        self._build_encoding(self.observed_values_, self._streaming_observed_codes())
+        return self
+
+    def _streaming_observed_codes(self):
+        n_balance_labels = len(np.unique(self.balance_quantiles_)) - 1
+        return self.observed_codes_ + [set(range(n_balance_labels))]
+
+    def _build_encoding(self, observed_values, observed_codes):
+        """
+        สร้าง categories_, code_maps_ และ offsets จากค่า / bin codes ที่พบใน training data
+        
+        Args:
+            observed_values: list ของ set ค่าที่พบ ต่อ categorical column
+            observed_codes: list ของ set bin codes ที่พบ ต่อ bin column
+        """
+        # categorical: เรียงค่าแบบเดียวกับ OneHotEncoder (ค่าว่างเป็น NaN อยู่ท้ายสุด)
+        self.categories_ = [
+            np.array(sorted(v for v in values if v is not None) + ([np.nan] if None in values else []), dtype=object)
+            for values in observed_values
+        ]
+        
+        # bin columns: bin ที่พบจริง เรียงตาม string label
+        # code_maps_[j][bin_code] = ตำแหน่งใน categories ของ feature นั้น (-1 = ไม่เคยเห็นตอน fit)
+        self.code_maps_ = []
+        for labels, seen in zip(self._bin_labels(), observed_codes):
+            seen_labels = sorted(labels[code] for code in seen)
+            self.categories_.append(np.array(seen_labels, dtype=object))
+            code_map = np.full(len(labels), -1, dtype=np.int32)
+            for position, label in enumerate(seen_labels):
+                code_map[labels.index(label)] = position
+            self.code_maps_.append(code_map)
+        
+        # {category: ตำแหน่ง} ของ categorical columns สำหรับ transform_one() - key None = ค่าว่าง
+        self.category_positions_ = [
+            {None if pd.isna(category) else category: position for position, category in enumerate(categories)}
+            for categories in self.categories_[:len(self.categorical_cols)]
+        ]
+        
+        # offset ของแต่ละ feature ใน output matrix
+        sizes = [len(categories) for categories in self.categories_]
+        self.feature_offsets_ = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+        self.n_features_out_ = int(sum(sizes))
+        
+        input_cols = self.categorical_cols + self.bin_cols
+        self.feature_names_out_ = np.array([
+            f"{self.feature_prefix}{col}_{category}"
+            for col, categories in zip(input_cols, self.categories_)
+            for category in categories
+        ], dtype=object)
+        logger.debug(f"FusedBinnerEncoderForLR learned {self.n_features_out_} one-hot features")
+
+    def transform(self, X):
+        logger.debug(f"FusedBinnerEncoderForLR.transform() called with shape {X.shape}")
+        if not hasattr(self, "categories_"):
+            error_msg = "FusedBinnerEncoderForLR is not fitted. Please call fit() first."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        missing_cols = [col for col in self.required_cols + self.categorical_cols if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        return self._transform_codes(X, _numeric_bin_codes(X, self.balance_quantiles_))
+
+    def _transform_codes(self, X, bin_codes_matrix, categorical_codes=None):
+        """
+        สร้าง CSR matrix จาก bin codes ที่คำนวณแล้ว (ใช้ร่วมกับ SharedBinner)
+        
+        Args:
+            bin_codes_matrix: ผลของ _numeric_bin_codes(X, self.balance_quantiles_)
+            categorical_codes: {col: codes ตาม categories_} ที่คำนวณไว้แล้ว (optional)
+        """
+        n_rows = len(X)
+        n_cat = len(self.categorical_cols)
+        
+        # column index ใน output ของแต่ละ (row, feature) - -1 = ไม่มีค่า 1 ใน feature นั้น
+        col_idx = np.empty((n_rows, n_cat + len(self.bin_cols)), dtype=np.int32)
+        for j, col in enumerate(self.categorical_cols):
+            if categorical_codes is not None and col in categorical_codes:
+                local = categorical_codes[col]
+            else:
+                local = self._category_codes(X, col, self.categories_[j])
+            col_idx[:, j] = np.where(local >= 0, local + self.feature_offsets_[j], -1)
+        
+        for j in range(len(self.bin_cols)):
+            local = self.code_maps_[j][bin_codes_matrix[:, j]]
+            offset = self.feature_offsets_[n_cat + j]
+            col_idx[:, n_cat + j] = np.where(local >= 0, local + offset, -1)
+        
+        # feature เรียงตาม offset จากน้อยไปมาก -> column indices ในแต่ละแถวเรียงอยู่แล้ว (canonical CSR)
+        valid = col_idx >= 0
+        if valid.all():
+            indices = col_idx.ravel()
+            indptr = np.arange(0, indices.size + 1, col_idx.shape[1], dtype=np.int32)
+        else:
+            indices = col_idx[valid]
+            indptr = np.zeros(n_rows + 1, dtype=np.int32)
+            np.cumsum(valid.sum(axis=1), out=indptr[1:])
+        data = np.ones(indices.size, dtype=np.float64)
+        
+        result = sparse.csr_matrix((data, indices, indptr), shape=(n_rows, self.n_features_out_))
+        logger.debug(f"FusedBinnerEncoderForLR.transform() completed. Output shape: {result.shape}")
+        return result
+
+    def transform_one(self, record):
+        """
+        Encode ลูกค้า 1 ราย โดยไม่ผ่าน pandas / scipy (สำหรับ real-time scoring)
+        
+        Args:
+            record: dict ของค่า feature ดิบ
+        
+        Returns:
+            np.ndarray (int32): column indices ของ features ที่มีค่า 1 (เรียงจากน้อยไปมาก)
+            เท่ากับ transform(X).indices ของแถวนั้น - LR score = intercept + coef[indices].sum()
+        """
+        if not hasattr(self, "categories_"):
+            error_msg = "FusedBinnerEncoderForLR is not fitted. Please call fit() first."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        indices = []
+        for j, col in enumerate(self.categorical_cols):
+            if col not in record:
+                error_msg = f"Missing required columns for binning: {[col]}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            value = record[col]
+            position = self.category_positions_[j].get(None if _is_missing(value) else value)
+            if position is not None:
+                indices.append(self.feature_offsets_[j] + position)
+        
+        n_cat = len(self.categorical_cols)
+        codes = _numeric_bin_codes_one(record, _balance_edges_one(self))
+        for j, code in enumerate(codes):
+            position = self.code_maps_[j][code]
+            if position >= 0:
+                indices.append(self.feature_offsets_[n_cat + j] + position)
+        return np.array(indices, dtype=np.int32)
+
+    def get_feature_names_out(self, input_features=None):
+        return self.feature_names_out_.copy()
+
+
+class SharedBinner(BaseEstimator):
+    """
+    Binning ครั้งเดียวแล้วออกผลลัพธ์ทั้ง 2 แบบ: one-hot CSR สำหรับ LR และ label-encoded
+    DataFrame สำหรับ XGBoost
+    
+    Age / CreditScore / Tenure / Balance ถูก bin ครั้งเดียวต่อ dataset (แทนที่จะ bin ซ้ำใน
+    preprocessor ของแต่ละ model) และ Geography / Gender ถูก encode ครั้งเดียวถ้า categories
+    ของทั้ง 2 model ตรงกัน (ค่าที่พบใน training data เรียงลำดับเหมือนกัน)
+    
+    transformers ที่ส่งเข้ามาจะถูก fit in-place - หลัง fit สามารถ pickle / ใช้ pipeline
+    เดิมของแต่ละ model ได้ตามปกติ (ผลลัพธ์เหมือน transform แยกกันทุกประการ)
+    
+    fit() เรียนรู้ Balance quantiles ครั้งเดียว (ใช้ร่วมกันทั้ง 2 binners) และ fit_transform()
+    bin training data เพียงครั้งเดียว - bin codes ที่ใช้เรียนรู้ categories ถูกใช้ต่อเป็นผลลัพธ์
+    
+    Args:
+        lr_encoder: FusedBinnerEncoderForLR
+        xgb_binner: FixedBinnerForXGBoost
+    
+    Usage:
+        shared = SharedBinner(FusedBinnerEncoderForLR(), FixedBinnerForXGBoost())
+        X_train_lr, X_train_xgb = shared.fit_transform(X_train)
+        X_val_lr, X_val_xgb = shared.transform(X_val)
+    
+    Raises:
+        ValueError: ถ้าคอลัมน์ที่จำเป็นหายไป หรือมีค่านอกช่วง bins
+    """
+
+    def __init__(self, lr_encoder, xgb_binner):
+        self.lr_encoder = lr_encoder
+        self.xgb_binner = xgb_binner
+
+    def fit(self, X, y=None):
+        logger.debug("SharedBinner.fit() called")
+        self._fit(X, y)
+        return self
+
+    def _fit(self, X, y=None):
+        """fit ทั้ง 2 binners โดย bin X ครั้งเดียว - คืน bin codes ของ X"""
+        # XGBoost binner: Balance quantiles + label mappings
+        self.xgb_binner.fit(X, y)
+        if self.xgb_binner.balance_quantiles_ is None:
+            error_msg = "Balance column is required to fit FusedBinnerEncoderForLR"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        # LR encoder ใช้ quantiles ชุดเดียวกัน (training data เดียวกัน) - ไม่ต้องคำนวณซ้ำ
+        lr_encoder = self.lr_encoder
+        lr_encoder._check_fit_columns(X)
+        lr_encoder.balance_quantiles_ = list(self.xgb_binner.balance_quantiles_)
+        lr_encoder.balance_edges_ = list(self.xgb_binner.balance_edges_)
+        lr_encoder.balance_sketch_ = None
+        numeric_codes = _numeric_bin_codes(X, lr_encoder.balance_quantiles_)
+        lr_encoder._fit_encoding(X, numeric_codes)
+        
+        # categorical ที่ categories ตรงกัน encode ครั้งเดียวได้
+        self.shared_categorical_cols_ = [
+            col for j, col in enumerate(self.lr_encoder.categorical_cols)
+            if col in self.xgb_binner.label_mappings_
+            and list(self.xgb_binner.label_mappings_[col]) == list(self.lr_encoder.categories_[j])
+        ]
+        logger.debug(f"SharedBinner shares categorical encodings for: {self.shared_categorical_cols_}")
+        return numeric_codes
+
+    def transform(self, X):
+        """
+        Returns:
+            tuple: (X_lr, X_xgb) - X_lr เป็น scipy.sparse CSR, X_xgb เป็น DataFrame
+        """
+        logger.debug(f"SharedBinner.transform() called with shape {X.shape}")
+        if not hasattr(self, "shared_categorical_cols_"):
+            error_msg = "SharedBinner is not fitted. Please call fit() first."
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        required_cols = self.lr_encoder.required_cols + self.lr_encoder.categorical_cols
+        missing_cols = [col for col in required_cols if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        
+        return self._transform_codes(X, _numeric_bin_codes(X, self.lr_encoder.balance_quantiles_))
+
+    def _transform_codes(self, X, numeric_codes):
+        """สร้างผลลัพธ์ทั้ง 2 แบบจาก bin codes ที่คำนวณแล้ว"""
+        categorical_codes = {
+            col: pd.Index(list(self.xgb_binner.label_mappings_[col])).get_indexer(X[col])
+            for col in self.shared_categorical_cols_
+        }
+        
+        X_lr = self.lr_encoder._transform_codes(X, numeric_codes, categorical_codes)
+        X_xgb = self.xgb_binner._transform_numpy(X, numeric_codes, categorical_codes)
+        logger.debug(f"SharedBinner.transform() completed. Output shapes: {X_lr.shape}, {X_xgb.shape}")
+        return X_lr, X_xgb
+
+    def fit_transform(self, X, y=None):
+        """fit() แล้ว transform(X) โดยใช้ bin codes ชุดเดียวกับที่ fit คำนวณไว้ (bin X ครั้งเดียว)"""
+        logger.debug(f"SharedBinner.fit_transform() called with shape {X.shape}")
+        return self._transform_codes(X, self._fit(X, y))
+
 
 if __name__ == "__main__":
     # ทดสอบ transformer ทั้ง 2 แบบ
@@ -0,0 +1,145 @@
+"""
+Load Test สำหรับ Online Scoring Service (serve.py)
+ยิง POST /score พร้อมกันจาก N threads (keep-alive connection ละ 1 thread) ด้วยลูกค้าจาก test set
+แล้วสรุป throughput / latency ฝั่ง client และดึง /metrics (batch-size histogram) ของ server
+
+ต้องเปิด service ก่อน:
+    python serve.py
+
+Usage:
+    python load_test.py
+    python load_test.py --concurrency 64 --duration 20 --url http://127.0.0.1:8000
+"""
+
+import argparse
+import http.client
+import json
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+from config import RUN_NUMBER, SERVE_HOST, SERVE_PORT
+from data_prep import get_prepared_data
+from logger_config import setup_logger
+
+logger = setup_logger("load_test")
+
+
+def make_request_bodies(X):
+    """JSON body ของ POST /score สำหรับแต่ละแถวของ X (encode ล่วงหน้าเพื่อไม่ให้ client เป็นคอขวด)"""
+    records = X.astype(object).to_dict(orient="records")
+    return [json.dumps(record, default=lambda value: value.item()).encode("utf-8") for record in records]
+
+
+def _client_worker(host, port, bodies, offset, deadline, latencies, errors):
+    """ยิง request ต่อเนื่องบน connection เดียวจนถึง deadline"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    i = offset
+    while time.perf_counter() < deadline:
+        body = bodies[i % len(bodies)]
+        i += 1
+        t0 = time.perf_counter()
+        try:
+            conn.request("POST", "/score", body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def fetch_json(host, port, path):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request("GET", path)
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+def run_load_test(url, bodies, concurrency, duration_s):
+    """
+    Returns:
+        dict: requests, errors, throughput (req/s) และ latency percentiles ฝั่ง client (ms)
+    """
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    fetch_json(host, port, "/health")
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration_s
+    threads = [
+        threading.Thread(target=_client_worker,
+                         args=(host, port, bodies, k * len(bodies) // concurrency, deadline, latencies, errors))
+        for k in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.asarray(latencies) * 1000
+    summary = {
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_s": len(latencies) / elapsed,
+    }
+    if len(latencies_ms):
+        for q in (50, 90, 95, 99):
+            summary[f"latency_p{q}_ms"] = float(np.percentile(latencies_ms, q))
+        summary["latency_max_ms"] = float(latencies_ms.max())
+    return summary, fetch_json(host, port, "/metrics")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test for the micro-batching scoring service")
+    parser.add_argument("--url", default=f"http://{SERVE_HOST}:{SERVE_PORT}")
+    parser.add_argument("--concurrency", type=int, default=32, help="number of concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logger.info("=" * 70)
+    logger.info(f"LOAD TEST: {args.url} | concurrency={args.concurrency} | duration={args.duration}s")
+    logger.info("=" * 70)
+
+    X_train, X_val, X_test, y_train, y_val, y_test, _, _ = get_prepared_data()
+    bodies = make_request_bodies(X_test)
+
+    summary, server_metrics = run_load_test(args.url, bodies, args.concurrency, args.duration)
+
+    logger.info(f"Requests: {summary['requests']:,} | errors: {summary['errors']:,} "
+                f"| {summary['requests_per_s']:,.0f} req/s")
+    if summary["requests"]:
+        logger.info(f"Client latency (ms): p50 {summary['latency_p50_ms']:.2f} | p90 {summary['latency_p90_ms']:.2f} "
+                    f"| p99 {summary['latency_p99_ms']:.2f} | max {summary['latency_max_ms']:.2f}")
+    logger.info(f"Server request latency (ms): {server_metrics['request_latency_ms']}")
+    logger.info(f"Server queue wait (ms): {server_metrics['queue_wait_ms']}")
+    logger.info(f"Server batch predict (ms): {server_metrics['batch_predict_ms']}")
+    logger.info(f"Mean batch size: {server_metrics['mean_batch_size']}")
+    logger.info(f"Batch-size histogram: {server_metrics['batch_size_histogram']}")
+
+    output_dir = Path("experiments") / f"run_{RUN_NUMBER}_serve_load_test"
+    output_dir.mkdir(parents=True, exist_ok=True)
+    results_path = output_dir / f"load_test_c{args.concurrency}.json"
+    with open(results_path, "w") as f:
+        json.dump({"client": summary, "server": server_metrics}, f, indent=2)
+    logger.info(f"Saved load test results to {results_path}")
@@ -0,0 +1,435 @@
+"""
+LR Tables
+ตารางที่คำนวณล่วงหน้าจาก Logistic Regression สำหรับ scoring แบบไม่ต้องใช้ sklearn
+
+LR pipeline เห็นเฉพาะ Geography, Gender และ 4 binned columns (Age / CreditScore / Tenure /
+Balance) - input space จึงมีจำนวน combinations จำกัด (~3 x 2 x 6 x 8 x 4 x 4 ≈ 4.6k)
+เราจึงคำนวณ P(churn) ของทุก combination ไว้ใน array ที่ index ด้วย codes ของแต่ละ feature
+แล้วตอบด้วยการ lookup ครั้งเดียว (O(1) ต่อลูกค้า)
+
+LR บน one-hot bins เป็น additive: แต่ละ (feature, code) มี logit contribution คงที่ = coef ของ
+column นั้น -> contribution table (n_features x n_codes) ให้ทั้ง score และ reason codes
+(bins ที่ดัน churn ขึ้นมากที่สุด) ด้วยการ gather + sum ต่อแถว โดยไม่ต้องใช้ SHAP
+
+coef ของ one-hot ไม่ได้อ้างอิงจุดศูนย์ร่วมกัน (เครื่องหมายของ coef ตัวเดียวไม่ได้บอกว่าดัน churn ขึ้น)
+reason codes จึงวัดเทียบ baseline ของแต่ละ feature = bin ที่เสี่ยงน้อยที่สุดของ feature นั้น
+(แบบ "points below best attribute" ของ scorecard) และนับเฉพาะ feature ที่สูงกว่า baseline
+
+- categorical มีช่องพิเศษท้ายสุดสำหรับค่าที่ไม่เคยเห็นตอน fit (contribution = 0 เหมือน one-hot)
+- bin ที่ไม่เคยเห็นตอน fit (code_maps = -1) มี contribution = 0 เช่นกัน
+
+Usage:
+    table = load_lr_score_table()
+    proba = table.predict_proba(X_test)             # DataFrame ของ features ดิบ
+    proba_one = table.predict_proba_one(record)     # dict ของลูกค้า 1 ราย
+
+    contributions = load_lr_contribution_table()
+    explanation = contributions.explain(X_test, top_k=3)
+    reasons = contributions.reason_names(explanation)  # [["Age=41-50", ...], ...]
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from binning_core import AGE_LABELS, CREDIT_SCORE_LABELS, TENURE_LABELS, balance_labels
+from config import MODELS_DIR, RUN_NUMBER, PREDICTION_THRESHOLD
+from logger_config import setup_logger
+from model_artifacts import load_model_artifacts
+
+logger = setup_logger("lr_tables")
+
+LR_SCORE_TABLE_FILE = "lr_score_table.npz"
+LR_CONTRIBUTION_TABLE_FILE = "lr_contributions.npz"
+
+# label ของ bin codes (index = code) สำหรับชื่อ reason codes
+_BIN_LABELS = {"Age": AGE_LABELS, "CreditScore": CREDIT_SCORE_LABELS, "Tenure": TENURE_LABELS}
+UNKNOWN_CATEGORY_LABEL = "(unknown)"
+
+
+def _base_col(col):
+    """ชื่อคอลัมน์ดิบของ bin column (เช่น Age_bin -> Age)"""
+    return col[:-len("_bin")] if col.endswith("_bin") else col
+
+
+def _sigmoid(logit):
+    return 1.0 / (1.0 + np.exp(-logit))
+
+
+def lr_feature_axes(artifacts):
+    """
+    ชื่อ input features ของ LR และจำนวน codes ของแต่ละ feature (ลำดับเดียวกับ lr_input_codes)
+
+    Returns:
+        list: [(feature name, n_codes)] - categorical นับรวมช่องค่าที่ไม่รู้จัก
+    """
+    spec = artifacts._model_spec("lr")
+    axes = [(col, len(categories) + 1) for col, categories in zip(spec["categorical_cols"], spec["categories"])]
+    for col, code_map in zip(spec["bin_cols"], spec["code_maps"]):
+        axes.append((col, len(code_map)))
+    return axes
+
+
+def lr_contribution_vectors(artifacts):
+    """
+    Logit contribution ของทุก code ของแต่ละ input feature (coef ของ one-hot column นั้น)
+
+    Returns:
+        list of np.ndarray (float64): vector ที่ j มีขนาดเท่ากับจำนวน codes ของ feature j
+    """
+    spec = artifacts._model_spec("lr")
+    coef = artifacts.lr_coef
+    offsets = spec["feature_offsets"]
+    n_cat = len(spec["categorical_cols"])
+
+    vectors = []
+    for j, categories in enumerate(spec["categories"]):
+        contributions = np.zeros(len(categories) + 1)
+        contributions[:len(categories)] = coef[offsets[j]:offsets[j] + len(categories)]
+        vectors.append(contributions)
+    for j, code_map in enumerate(spec["code_maps"]):
+        code_map = np.asarray(code_map, dtype=np.intp)
+        seen = code_map >= 0
+        contributions = np.zeros(len(code_map))
+        contributions[seen] = coef[offsets[n_cat + j] + code_map[seen]]
+        vectors.append(contributions)
+    return vectors
+
+
+def lr_contribution_baselines(artifacts):
+    """
+    Baseline ของแต่ละ input feature สำหรับ reason codes = contribution ต่ำสุดของ codes ที่เห็นตอน fit
+    (categories / bins ที่มี one-hot column) - bin ที่เสี่ยงน้อยที่สุดของ feature นั้น
+
+    Returns:
+        np.ndarray (float64): shape (n_features,)
+    """
+    spec = artifacts._model_spec("lr")
+    vectors = lr_contribution_vectors(artifacts)
+    n_cat = len(spec["categorical_cols"])
+    baselines = np.empty(len(vectors))
+    for j, categories in enumerate(spec["categories"]):
+        baselines[j] = vectors[j][:len(categories)].min()
+    for j, code_map in enumerate(spec["code_maps"]):
+        seen = np.asarray(code_map) >= 0
+        baselines[n_cat + j] = vectors[n_cat + j][seen].min() if seen.any() else 0.0
+    return baselines
+
+
+def lr_code_labels(artifacts):
+    """
+    Label ของทุก code ของแต่ละ input feature (เช่น Geography: France, Age: 41-50)
+
+    Returns:
+        list of list of str: ลำดับเดียวกับ lr_contribution_vectors()
+    """
+    spec = artifacts._model_spec("lr")
+    labels = [
+        ["nan" if category is None else category for category in categories] + [UNKNOWN_CATEGORY_LABEL]
+        for categories in spec["categories"]
+    ]
+    for col, code_map in zip(spec["bin_cols"], spec["code_maps"]):
+        col_labels = _BIN_LABELS.get(_base_col(col)) or balance_labels(len(code_map))
+        labels.append(list(col_labels))
+    return labels
+
+
+def build_lr_score_table(artifacts):
+    """
+    คำนวณ P(churn) ของทุก combination ของ input codes
+
+    Returns:
+        tuple: (table, feature_names) - table shape = จำนวน codes ของแต่ละ feature
+    """
+    vectors = lr_contribution_vectors(artifacts)
+    # ผลรวมแบบ outer (broadcast) ของ contribution vectors -> logit ของทุก combination
+    logit = np.full([len(vector) for vector in vectors], artifacts.lr_intercept)
+    for j, vector in enumerate(vectors):
+        shape = [1] * len(vectors)
+        shape[j] = len(vector)
+        logit += vector.reshape(shape)
+    feature_names = [name for name, _ in lr_feature_axes(artifacts)]
+    return _sigmoid(logit), feature_names
+
+
+def save_lr_score_table(models_dir, artifacts=None):
+    """
+    Export score table ของ LR ลง models_dir (ต้องมี native artifacts ของ run นั้นแล้ว)
+
+    Returns:
+        Path ของไฟล์ที่บันทึก
+    """
+    models_dir = Path(models_dir)
+    if artifacts is None:
+        artifacts = load_model_artifacts(models_dir)
+
+    table, feature_names = build_lr_score_table(artifacts)
+    path = models_dir / LR_SCORE_TABLE_FILE
+    np.savez_compressed(path, proba=table, feature_names=np.asarray(feature_names, dtype=str))
+    logger.info(f"Saved LR score table {table.shape} ({table.size:,} combinations) to {path}")
+    return path
+
+
+def build_lr_contribution_table(artifacts):
+    """
+    รวม contribution vectors เป็น table 2 มิติ (features ที่มี codes น้อยกว่าถูก pad ด้วย 0)
+
+    Returns:
+        tuple: (contributions (n_features, max_codes), code_labels (n_features, max_codes), feature_names)
+    """
+    vectors = lr_contribution_vectors(artifacts)
+    labels = lr_code_labels(artifacts)
+    max_codes = max(len(vector) for vector in vectors)
+
+    contributions = np.zeros((len(vectors), max_codes))
+    code_labels = np.full((len(vectors), max_codes), "", dtype=object)
+    for j, (vector, feature_labels) in enumerate(zip(vectors, labels)):
+        contributions[j, :len(vector)] = vector
+        code_labels[j, :len(feature_labels)] = feature_labels
+    feature_names = [name for name, _ in lr_feature_axes(artifacts)]
+    return contributions, code_labels.astype(str), feature_names
+
+
+def save_lr_contribution_table(models_dir, artifacts=None):
+    """
+    Export contribution table ของ LR ลง models_dir (ต้องมี native artifacts ของ run นั้นแล้ว)
+
+    Returns:
+        Path ของไฟล์ที่บันทึก
+    """
+    models_dir = Path(models_dir)
+    if artifacts is None:
+        artifacts = load_model_artifacts(models_dir)
+
+    contributions, code_labels, feature_names = build_lr_contribution_table(artifacts)
+    path = models_dir / LR_CONTRIBUTION_TABLE_FILE
+    np.savez_compressed(
+        path,
+        contributions=contributions,
+        intercept=np.float64(artifacts.lr_intercept),
+        code_labels=code_labels,
+        feature_names=np.asarray(feature_names, dtype=str),
+    )
+    logger.info(f"Saved LR contribution table {contributions.shape} to {path}")
+    return path
+
+
+class LRScoreTable:
+    """
+    Scorer ของ LR ด้วยการ lookup จาก score table ที่ export ไว้
+
+    Args:
+        artifacts: ModelArtifacts ของ run เดียวกัน (ใช้ bin edges / categories แปลง input เป็น codes)
+        proba: score table จาก build_lr_score_table()
+        threshold: threshold สำหรับ predict()
+    """
+
+    def __init__(self, artifacts, proba, threshold=PREDICTION_THRESHOLD):
+        expected_shape = tuple(n_codes for _, n_codes in lr_feature_axes(artifacts))
+        if proba.shape != expected_shape:
+            error_msg = (f"LR score table shape {proba.shape} does not match the preprocessor "
+                         f"{expected_shape} - re-export the table for this run")
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self.artifacts = artifacts
+        self.proba = proba
+        self.threshold = threshold
+        # table แบบ 1D + strides สำหรับแปลง codes เป็น flat index
+        self._flat = np.ascontiguousarray(proba).ravel()
+        self._strides = [stride // proba.itemsize for stride in np.ascontiguousarray(proba).strides]
+
+    def predict_proba(self, X):
+        """P(churn) ของทุกแถวใน X (1D array) - gather จาก table ครั้งเดียว"""
+        codes = self.artifacts.lr_input_codes(X)
+        return self._flat[codes @ np.asarray(self._strides, dtype=np.int32)]
+
+    def predict(self, X):
+        """ทำนาย 0/1 ตาม threshold"""
+        return (self.predict_proba(X) >= self.threshold).astype(int)
+
+    def predict_proba_one(self, record):
+        """P(churn) ของลูกค้า 1 ราย (dict) - table lookup ครั้งเดียว ไม่ผ่าน pandas / NumPy ops"""
+        codes = self.artifacts.lr_input_codes_one(record)
+        return float(self._flat[sum(code * stride for code, stride in zip(codes, self._strides))])
+
+    def predict_one(self, record):
+        """ทำนาย 0/1 ของลูกค้า 1 ราย ตาม threshold"""
+        return int(self.predict_proba_one(record) >= self.threshold)
+
+
+class LRContributionTable:
+    """
+    Scorer + reason codes ของ LR จาก contribution table:
+    logit = intercept + ผลรวม contributions[j, code_j] ของทุก input feature j
+
+    Args:
+        artifacts: ModelArtifacts ของ run เดียวกัน (ใช้แปลง input เป็น codes)
+        contributions: (n_features, max_codes) จาก build_lr_contribution_table()
+        intercept: intercept ของ LR
+        code_labels: (n_features, max_codes) label ของแต่ละ code
+        feature_names: ชื่อ input features
+        threshold: threshold สำหรับ predict()
+    """
+
+    def __init__(self, artifacts, contributions, intercept, code_labels, feature_names,
+                 threshold=PREDICTION_THRESHOLD):
+        expected_names = [name for name, _ in lr_feature_axes(artifacts)]
+        if list(feature_names) != expected_names:
+            error_msg = (f"LR contribution table features {list(feature_names)} do not match the "
+                         f"preprocessor {expected_names} - re-export the table for this run")
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self.artifacts = artifacts
+        self.contributions = contributions
+        self.intercept = float(intercept)
+        self.code_labels = code_labels
+        self.feature_names = list(feature_names)
+        self.threshold = threshold
+        self.baselines = lr_contribution_baselines(artifacts)
+        # table แบบ 1D: contribution ของ (j, code) อยู่ที่ j * max_codes + code
+        self._flat = np.ascontiguousarray(contributions).ravel()
+        self._row_offsets = np.arange(len(self.feature_names), dtype=np.int32) * contributions.shape[1]
+
+    def gather(self, X):
+        """
+        Contribution ของแต่ละ input feature ของทุกแถว
+
+        Returns:
+            tuple: (contributions (n_rows, n_features) float64, codes (n_rows, n_features) int32)
+        """
+        codes = self.artifacts.lr_input_codes(X)
+        return self._flat[codes + self._row_offsets], codes
+
+    def predict_proba(self, X):
+        """P(churn) ของทุกแถวใน X (1D array)"""
+        contributions, _ = self.gather(X)
+        return _sigmoid(self.intercept + contributions.sum(axis=1))
+
+    def predict(self, X):
+        """ทำนาย 0/1 ตาม threshold"""
+        return (self.predict_proba(X) >= self.threshold).astype(int)
+
+    def explain(self, X, top_k=3):
+        """
+        P(churn) + top-k bins ที่ดัน logit ขึ้นมากที่สุด (reason codes) ของทุกแถว
+
+        reason ของ feature = contribution - baseline ของ feature นั้น (lr_contribution_baselines)
+        นับเฉพาะค่าที่ > 0 - แถวที่มี reasons น้อยกว่า top_k จะถูกเติมด้วย feature / code = -1
+
+        Args:
+            X: DataFrame ของ features ดิบ
+            top_k: จำนวน reason codes ต่อแถว (ไม่เกินจำนวน input features)
+
+        Returns:
+            dict:
+                proba: (n_rows,) P(churn)
+                reason_features: (n_rows, top_k) index ของ feature (ใน feature_names), -1 = ไม่มี
+                reason_codes: (n_rows, top_k) code ของ feature นั้น, -1 = ไม่มี
+                reason_contributions: (n_rows, top_k) logit ที่สูงกว่า baseline เรียงจากมากไปน้อย (0 = ไม่มี)
+        """
+        n_features = len(self.feature_names)
+        if not 1 <= top_k <= n_features:
+            error_msg = f"top_k must be between 1 and {n_features}, got {top_k}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        contributions, codes = self.gather(X)
+        proba = _sigmoid(self.intercept + contributions.sum(axis=1))
+        contributions = contributions - self.baselines
+
+        # argpartition เลือก k ตัวที่มากที่สุด (O(n_features)) แล้วค่อยเรียงเฉพาะ k ตัวนั้น
+        if top_k < n_features:
+            top = np.argpartition(-contributions, top_k - 1, axis=1)[:, :top_k]
+        else:
+            top = np.broadcast_to(np.arange(n_features), contributions.shape)
+        top_contributions = np.take_along_axis(contributions, top, axis=1)
+        order = np.argsort(-top_contributions, axis=1, kind="stable")
+        reason_features = np.take_along_axis(top, order, axis=1)
+        reason_contributions = np.take_along_axis(top_contributions, order, axis=1)
+        reason_codes = np.take_along_axis(codes, reason_features, axis=1)
+
+        # feature ที่อยู่ที่ baseline (หรือต่ำกว่า) ไม่ได้ดัน churn ขึ้น -> ไม่ใช่ reason
+        no_reason = reason_contributions <= 0
+        reason_features[no_reason] = -1
+        reason_codes[no_reason] = -1
+        reason_contributions[no_reason] = 0.0
+        return {
+            "proba": proba,
+            "reason_features": reason_features,
+            "reason_codes": reason_codes,
+            "reason_contributions": reason_contributions,
+        }
+
+    def reason_names(self, explanation):
+        """
+        แปลงผลของ explain() เป็นชื่อ reason codes เช่น "Age=41-50"
+
+        Returns:
+            list of list of str (ควรใช้กับจำนวนแถวที่จะแสดงผลเท่านั้น - สร้าง Python strings ต่อแถว)
+        """
+        features = explanation["reason_features"]
+        labels = self.code_labels[features, explanation["reason_codes"]]
+        names = np.asarray([_base_col(name) for name in self.feature_names])[features]
+        # reason ที่ไม่มี (-1) ถูกตัดออก - แต่ละแถวอาจมีน้อยกว่า top_k ชื่อ
+        return [[f"{name}={label}" for name, label, feature in zip(row_names, row_labels, row_features) if feature >= 0]
+                for row_names, row_labels, row_features in zip(names, labels, features)]
+
+
+def load_lr_score_table(models_dir=None, threshold=PREDICTION_THRESHOLD):
+    """
+    โหลด LR score table จาก models/run_{RUN_NUMBER}/
+
+    Returns:
+        LRScoreTable
+    """
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    models_dir = Path(models_dir)
+
+    path = models_dir / LR_SCORE_TABLE_FILE
+    if not path.exists():
+        error_msg = (f"LR score table not found: {path}. "
+                     f"Run 'python lr_tables.py' to export it from the native artifacts of this run.")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    artifacts = load_model_artifacts(models_dir)
+    with np.load(path) as data:
+        proba = data["proba"]
+    return LRScoreTable(artifacts, proba, threshold=threshold)
+
+
+def load_lr_contribution_table(models_dir=None, threshold=PREDICTION_THRESHOLD):
+    """
+    โหลด LR contribution table จาก models/run_{RUN_NUMBER}/
+
+    Returns:
+        LRContributionTable
+    """
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    models_dir = Path(models_dir)
+
+    path = models_dir / LR_CONTRIBUTION_TABLE_FILE
+    if not path.exists():
+        error_msg = (f"LR contribution table not found: {path}. "
+                     f"Run 'python lr_tables.py' to export it from the native artifacts of this run.")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    artifacts = load_model_artifacts(models_dir)
+    with np.load(path) as data:
+        return LRContributionTable(
+            artifacts,
+            data["contributions"],
+            data["intercept"],
+            data["code_labels"],
+            data["feature_names"].tolist(),
+            threshold=threshold,
+        )
+
+
+if __name__ == "__main__":
+    models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    save_lr_score_table(models_dir)
+    save_lr_contribution_table(models_dir)
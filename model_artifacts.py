@@ -0,0 +1,604 @@
+"""
+Model Artifacts
+บันทึก / โหลด models ของ run ในรูปแบบ native ที่ไฟล์เล็กและโหลดเร็วกว่า pickle
+
+- xgboost.ubj: XGBoost booster ใน format binary ของ XGBoost เอง (UBJSON)
+- logistic_regression.npz: coefficients, intercept และ feature names ของ LR (arrays ล้วน)
+- preprocessor.json: bin edges, label mappings และ one-hot layout ของ preprocessors ทั้ง 2 model
+
+load_model_artifacts() ใช้แค่ NumPy / pandas (ไม่ import sklearn) - transform และ LR scoring
+คำนวณจาก arrays โดยตรง ส่วน XGBoost ใช้ trees ที่ compile แล้ว (xgboost_trees.npz ดู xgb_compiler.py)
+ถ้ามี ไม่งั้น booster ถูกโหลดเมื่อใช้ครั้งแรกเท่านั้น (หมายเหตุ: package xgboost import sklearn เองตอน import)
+
+รองรับ preprocessors แบบ FusedBinnerEncoderForLR และ FixedBinnerForXGBoost
+(pipeline ที่มี step เดียว) - ถ้าเป็นแบบอื่น (เช่น USE_FUSED_LR_ENCODER = False)
+preprocessor.json จะไม่มีส่วนของ model นั้น และ transform ของ model นั้นจะใช้ preprocessor_*.pkl แทน
+run ที่ train ก่อนมี native artifacts (มีแต่ .pkl) ก็โหลดได้ - load_model_artifacts() fallback ไปอ่าน .pkl
+
+Usage:
+    artifacts = load_model_artifacts()
+    xgb_proba = artifacts.predict_proba_xgb(X_test)
+    lr_proba = artifacts.predict_proba_lr(X_test)
+
+    # แปลง run เก่าที่มีแต่ .pkl
+    python model_artifacts.py
+"""
+
+import json
+import math
+import pickle
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from binning_core import FIXED_BINS, bin_code_one, bin_codes, build_int_lookup, lookup_int_codes
+from config import MODELS_DIR, RUN_NUMBER
+from logger_config import setup_logger
+from xgb_compiler import XGB_COMPILED_TREES_FILE, compile_booster, load_compiled_trees, save_compiled_trees
+
+logger = setup_logger("model_artifacts")
+
+XGB_ARTIFACT_FILE = "xgboost.ubj"
+LR_ARTIFACT_FILE = "logistic_regression.npz"
+PREPROCESSOR_ARTIFACT_FILE = "preprocessor.json"
+
+# version ของ format preprocessor.json (เพิ่มเมื่อเปลี่ยน schema)
+PREPROCESSOR_FORMAT_VERSION = 1
+
+# คอลัมน์ที่ถูก bin ตามลำดับเดียวกับ binners: Age, CreditScore, Tenure (fixed) + Balance (quantiles)
+_BINNED_COLS = [col for col, _ in FIXED_BINS] + ["Balance"]
+
+
+def _pipeline_step(preprocessor):
+    """transformer ตัวเดียวใน Pipeline (หรือ preprocessor เองถ้าไม่ใช่ Pipeline)"""
+    steps = getattr(preprocessor, "steps", None)
+    if steps is None:
+        return preprocessor
+    return steps[0][1] if len(steps) == 1 else None
+
+
+def _lr_feature_names(preprocessor_lr):
+    """ชื่อ features ของ LR จาก step สุดท้ายของ pipeline (binner ใน pipeline 2 steps ไม่มี get_feature_names_out)"""
+    steps = getattr(preprocessor_lr, "steps", None)
+    encoder = steps[-1][1] if steps else preprocessor_lr
+    return encoder.get_feature_names_out()
+
+
+def _balance_edges(binner):
+    edges = getattr(binner, "balance_edges_", None)
+    if edges is None:
+        edges = np.unique(binner.balance_quantiles_)
+    return [float(edge) for edge in edges]
+
+
+def _xgb_preprocessor_spec(preprocessor_xgb):
+    binner = _pipeline_step(preprocessor_xgb)
+    if binner is None or not hasattr(binner, "label_mappings_") or getattr(binner, "columns_", None) is None:
+        return None
+    return {
+        "columns": list(binner.columns_),
+        "balance_edges": _balance_edges(binner),
+        # label mapping เก็บเป็น list เรียงตาม code (ค่าที่ index i มี code i)
+        "label_mappings": {
+            col: [str(value) for value in mapping] for col, mapping in binner.label_mappings_.items()
+        },
+    }
+
+
+def _lr_preprocessor_spec(preprocessor_lr):
+    encoder = _pipeline_step(preprocessor_lr)
+    if encoder is None or not hasattr(encoder, "code_maps_"):
+        return None
+    n_cat = len(encoder.categorical_cols)
+    return {
+        "balance_edges": _balance_edges(encoder),
+        "categorical_cols": list(encoder.categorical_cols),
+        # category ของค่าว่าง (NaN) เก็บเป็น null
+        "categories": [
+            [None if pd.isna(value) else str(value) for value in categories] for categories in encoder.categories_[:n_cat]
+        ],
+        "bin_cols": list(encoder.bin_cols),
+        # code_maps[j][bin code] = ตำแหน่งใน one-hot ของ bin column j (-1 = ไม่เคยเห็นตอน fit)
+        "code_maps": [code_map.tolist() for code_map in encoder.code_maps_],
+        "feature_offsets": encoder.feature_offsets_.tolist(),
+        "n_features_out": int(encoder.n_features_out_),
+        "feature_names": [str(name) for name in encoder.feature_names_out_],
+    }
+
+
+def build_preprocessor_spec(preprocessor_lr, preprocessor_xgb):
+    """
+    แปลง preprocessors ที่ fit แล้วเป็น dict ที่บันทึกเป็น JSON ได้
+
+    Returns:
+        dict: {"format_version", "fixed_bins", "lr", "xgb"} - "lr" / "xgb" เป็น None
+            ถ้า preprocessor ของ model นั้นไม่รองรับ
+    """
+    spec = {
+        "format_version": PREPROCESSOR_FORMAT_VERSION,
+        "fixed_bins": {col: [float(edge) for edge in edges] for col, edges in FIXED_BINS},
+        "lr": _lr_preprocessor_spec(preprocessor_lr) if preprocessor_lr is not None else None,
+        "xgb": _xgb_preprocessor_spec(preprocessor_xgb) if preprocessor_xgb is not None else None,
+    }
+    for name in ("lr", "xgb"):
+        if spec[name] is None:
+            logger.warning(f"{name.upper()} preprocessor has no native format - this model will transform with preprocessor_{name}.pkl")
+    return spec
+
+
+def save_model_artifacts(models_dir, lr_model, xgb_model, preprocessor_lr, preprocessor_xgb):
+    """
+    บันทึก xgboost.ubj, logistic_regression.npz และ preprocessor.json ลง models_dir
+
+    Returns:
+        dict: {ชื่อไฟล์: ขนาด (bytes)}
+    """
+    models_dir = Path(models_dir)
+
+    xgb_path = models_dir / XGB_ARTIFACT_FILE
+    # booster attributes (เช่น best_iteration จาก early stopping) ถูกบันทึกไปด้วย
+    xgb_model.get_booster().save_model(str(xgb_path))
+
+    lr_path = models_dir / LR_ARTIFACT_FILE
+    feature_names = _lr_feature_names(preprocessor_lr)
+    np.savez_compressed(
+        lr_path,
+        coef=np.asarray(lr_model.coef_[0], dtype=np.float64),
+        intercept=np.float64(lr_model.intercept_[0]),
+        classes=np.asarray(lr_model.classes_),
+        feature_names=np.asarray(feature_names, dtype=str),
+    )
+
+    preprocessor_path = models_dir / PREPROCESSOR_ARTIFACT_FILE
+    with open(preprocessor_path, "w") as f:
+        json.dump(build_preprocessor_spec(preprocessor_lr, preprocessor_xgb), f, indent=2)
+
+    sizes = {path.name: path.stat().st_size for path in (xgb_path, lr_path, preprocessor_path)}
+    logger.info(f"Saved native model artifacts to {models_dir}: {sizes}")
+    return sizes
+
+
+class ModelArtifacts:
+    """
+    Models + preprocessors ของ run ที่โหลดจาก native artifacts
+
+    transform / predict รับ DataFrame ของ features ดิบ (คอลัมน์เดียวกับ X ตอน train)
+    และให้ผลเหมือน preprocessor.transform() + model.predict_proba() จากไฟล์ .pkl
+
+    model ที่ไม่มีส่วนใน preprocessor_spec จะ transform ด้วย preprocessor_{lr,xgb}.pkl
+    (ส่งมาใน preprocessors หรือโหลดจาก models_dir ครั้งแรกที่ใช้)
+
+    Attributes:
+        preprocessor_spec: dict จาก preprocessor.json
+        lr_coef, lr_intercept, lr_feature_names: LR model
+        xgb_feature_names: ลำดับ features ของ XGBoost
+    """
+
+    def __init__(self, models_dir, preprocessor_spec, lr_coef, lr_intercept, lr_feature_names,
+                 compiled_trees=None, booster=None, preprocessors=None):
+        self.models_dir = Path(models_dir)
+        self.preprocessor_spec = preprocessor_spec
+        self.lr_coef = lr_coef
+        self.lr_intercept = lr_intercept
+        self.lr_feature_names = lr_feature_names
+        self._booster = booster
+        self._preprocessors = dict(preprocessors or {})  # {"lr" / "xgb": preprocessor จาก .pkl}
+        # CompiledTrees (xgboost_trees.npz) - ถ้ามี predict_proba_xgb ไม่ต้อง import xgboost เลย
+        self.compiled_trees = compiled_trees
+        self._category_positions = None  # {category: index} ของ LR (สร้างเมื่อใช้ lr_input_codes_one)
+        self._label_positions = None  # {category: code} ของ XGBoost (สร้างเมื่อใช้ transform_xgb_one)
+
+        # lookup tables ของ fixed bins สำหรับค่า integer (สร้างครั้งเดียวตอนโหลด)
+        self._fixed_bins = {
+            col: (edges, build_int_lookup(edges)) for col, edges in preprocessor_spec["fixed_bins"].items()
+        }
+
+    @property
+    def xgb_feature_names(self):
+        """ลำดับ features ของ XGBoost"""
+        xgb_spec = self.preprocessor_spec.get("xgb")
+        if xgb_spec is not None:
+            return list(xgb_spec["columns"])
+        return list(self.booster.feature_names or [])
+
+    @property
+    def booster(self):
+        """xgb.Booster (โหลดจาก xgboost.ubj ครั้งแรกที่เรียก)"""
+        if self._booster is None:
+            import xgboost as xgb
+            self._booster = xgb.Booster(model_file=str(self.models_dir / XGB_ARTIFACT_FILE))
+        return self._booster
+
+    def _pickled_preprocessor(self, name):
+        """preprocessor_{name}.pkl สำหรับ model ที่ไม่มีส่วนใน preprocessor.json (โหลดครั้งแรกที่เรียก)"""
+        if name not in self._preprocessors:
+            path = self.models_dir / f"preprocessor_{name}.pkl"
+            if not path.exists():
+                error_msg = f"{name.upper()} preprocessor is not available in {PREPROCESSOR_ARTIFACT_FILE} or {path}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            logger.warning(f"{name.upper()} preprocessor has no native format - loading {path}")
+            with open(path, "rb") as f:
+                self._preprocessors[name] = pickle.load(f)
+        return self._preprocessors[name]
+
+    def _model_spec(self, name):
+        spec = self.preprocessor_spec.get(name)
+        if spec is None:
+            error_msg = (f"{name.upper()} preprocessor is not available in {PREPROCESSOR_ARTIFACT_FILE} "
+                         f"- load the .pkl preprocessor instead")
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        return spec
+
+    def _numeric_bin_codes(self, X, balance_edges, strict=True):
+        """
+        bin codes (n_rows, 4) ของ Age / CreditScore / Tenure / Balance เหมือน binners
+
+        strict=False: ค่านอกช่วง bins / NaN ได้ code -1 แทนการ raise ValueError
+        """
+        missing_cols = [col for col in _BINNED_COLS if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        codes = np.empty((len(X), len(_BINNED_COLS)), dtype=np.int8, order="F")
+        for j, col in enumerate(_BINNED_COLS):
+            values = X[col].to_numpy()
+            if col == "Balance":
+                codes[:, j] = bin_codes(values, balance_edges, include_lowest=True)
+            elif values.dtype.kind in "iu":
+                codes[:, j] = lookup_int_codes(values, self._fixed_bins[col][1])
+            else:
+                codes[:, j] = bin_codes(values, self._fixed_bins[col][0])
+
+            invalid = codes[:, j] < 0
+            if strict and invalid.any():
+                error_msg = f"Invalid {col} values found (outside bins): {pd.unique(values[invalid])}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+        return codes
+
+    def _balance_edges(self, name):
+        """Balance edges ของ preprocessor "lr" / "xgb" (จาก preprocessor.json หรือ binner ใน .pkl)"""
+        spec = self.preprocessor_spec.get(name)
+        if spec is not None:
+            return spec["balance_edges"]
+        steps = getattr(self._pickled_preprocessor(name), "steps", None)
+        return _balance_edges(steps[0][1] if steps else self._pickled_preprocessor(name))
+
+    def valid_rows(self, X, name):
+        """
+        mask ของแถวที่ preprocessor "lr" / "xgb" transform ได้ (คำนวณ bin codes ครั้งเดียวทั้ง batch)
+
+        แถวที่ Age / CreditScore / Tenure / Balance เป็น NaN หรืออยู่นอก bins ได้ False - แถวเหล่านี้
+        ทำให้ transform ทั้ง batch raise ValueError จึงใช้ mask นี้แยกออกก่อน predict
+
+        Returns:
+            np.ndarray (bool): shape (n_rows,)
+        """
+        codes = self._numeric_bin_codes(X, self._balance_edges(name), strict=False)
+        return (codes >= 0).all(axis=1)
+
+    def transform_xgb(self, X):
+        """
+        Encode X สำหรับ XGBoost (เหมือน FixedBinnerForXGBoost.transform)
+
+        Returns:
+            np.ndarray (float32): shape (n_rows, n_features) ตามลำดับ xgb_feature_names
+            categorical ที่ไม่รู้จักเป็น -1
+        """
+        if self.preprocessor_spec.get("xgb") is None:
+            return np.asarray(self._pickled_preprocessor("xgb").transform(X), dtype=np.float32)
+        spec = self._model_spec("xgb")
+        codes = self._numeric_bin_codes(X, spec["balance_edges"])
+        encoded = {col: codes[:, j] for j, col in enumerate(_BINNED_COLS)}
+        for col, categories in spec["label_mappings"].items():
+            if col in X.columns:
+                encoded[col] = pd.Index(categories).get_indexer(X[col].astype(str))
+
+        out = np.empty((len(X), len(spec["columns"])), dtype=np.float32)
+        for j, col in enumerate(spec["columns"]):
+            if col in encoded:
+                out[:, j] = encoded[col]
+            elif col in X.columns:
+                out[:, j] = X[col].to_numpy(dtype=np.float32)
+            else:
+                error_msg = f"Missing column for XGBoost transform: {col}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+        return out
+
+    def transform_xgb_one(self, record):
+        """
+        transform_xgb() ของลูกค้า 1 ราย (dict ของ Python scalars) - ใช้ bisect ไม่ผ่าน pandas
+
+        Returns:
+            np.ndarray (float32): shape (1, n_features) - categorical ที่ไม่รู้จักเป็น -1 พร้อม warning
+
+        Raises:
+            ValueError: ถ้า record ไม่มีคอลัมน์ที่จำเป็น หรือมีค่านอกช่วง bins
+        """
+        if self.preprocessor_spec.get("xgb") is None:
+            return self.transform_xgb(pd.DataFrame([record]))
+        spec = self._model_spec("xgb")
+        if self._label_positions is None:
+            self._label_positions = {
+                col: {value: i for i, value in enumerate(categories)}
+                for col, categories in spec["label_mappings"].items()
+            }
+
+        row = []
+        for col in spec["columns"]:
+            if col not in record:
+                error_msg = f"Missing column for XGBoost transform: {col}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            value = record[col]
+            if col in self._label_positions:
+                code = self._label_positions[col].get(str(value), -1)
+                if code < 0:
+                    logger.warning(f"Unknown values in {col}: {[value]}. Filling with -1.")
+                row.append(code)
+            elif col in _BINNED_COLS:
+                if col == "Balance":
+                    code = bin_code_one(value, spec["balance_edges"], include_lowest=True)
+                else:
+                    code = bin_code_one(value, self._fixed_bins[col][0])
+                if code < 0:
+                    error_msg = f"Invalid {col} values found (outside bins): [{value}]"
+                    logger.error(error_msg)
+                    raise ValueError(error_msg)
+                row.append(code)
+            else:
+                row.append(value)
+        return np.array([row], dtype=np.float32)
+
+    def lr_input_codes(self, X):
+        """
+        Code ของแต่ละ input feature ของ LR (categorical ก่อน แล้วตามด้วย bin columns)
+
+        Returns:
+            np.ndarray (int32): shape (n_rows, n_categorical + n_bins)
+            - categorical: index ใน categories ตอน fit, ค่าที่ไม่รู้จัก = len(categories)
+            - bin columns: bin code ตาม edges (Age / CreditScore / Tenure / Balance)
+        """
+        spec = self._model_spec("lr")
+        missing_cols = [col for col in spec["categorical_cols"] if col not in X.columns]
+        if missing_cols:
+            error_msg = f"Missing required columns for binning: {missing_cols}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        n_cat = len(spec["categorical_cols"])
+        codes = np.empty((len(X), n_cat + len(spec["bin_cols"])), dtype=np.int32)
+        for j, (col, categories) in enumerate(zip(spec["categorical_cols"], spec["categories"])):
+            local = pd.Index(categories).get_indexer(X[col].astype(str))
+            # ค่าว่าง (NaN / None) -> category null ที่อยู่ท้ายสุด (ถ้ามีตอน fit)
+            local[X[col].isna().to_numpy()] = len(categories) - 1 if categories and categories[-1] is None else -1
+            codes[:, j] = np.where(local >= 0, local, len(categories))
+        codes[:, n_cat:] = self._numeric_bin_codes(X, spec["balance_edges"])
+        return codes
+
+    def lr_input_codes_one(self, record):
+        """
+        lr_input_codes() ของลูกค้า 1 ราย (dict ของ Python scalars) - ใช้ bisect ไม่ผ่าน pandas
+
+        Returns:
+            list: codes ตามลำดับเดียวกับ lr_input_codes()
+        """
+        spec = self._model_spec("lr")
+        if self._category_positions is None:
+            self._category_positions = [
+                {value: i for i, value in enumerate(categories)} for categories in spec["categories"]
+            ]
+
+        codes = []
+        for col, positions in zip(spec["categorical_cols"], self._category_positions):
+            if col not in record:
+                error_msg = f"Missing required columns for binning: {[col]}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            value = record[col]
+            missing = value is None or (isinstance(value, float) and math.isnan(value))
+            codes.append(positions.get(None if missing else str(value), len(positions)))
+
+        for col in _BINNED_COLS:
+            if col not in record:
+                error_msg = f"Missing required columns for binning: {[col]}"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            value = record[col]
+            if col == "Balance":
+                code = bin_code_one(value, spec["balance_edges"], include_lowest=True)
+            else:
+                code = bin_code_one(value, self._fixed_bins[col][0])
+            if code < 0:
+                error_msg = f"Invalid {col} values found (outside bins): [{value}]"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+            codes.append(code)
+        return codes
+
+    def lr_active_columns(self, X):
+        """
+        One-hot layout ของ LR แบบ index (เหมือน FusedBinnerEncoderForLR.transform แต่ไม่สร้าง sparse matrix)
+
+        Returns:
+            np.ndarray (int32): shape (n_rows, n_categorical + n_bins) - column ที่มีค่า 1
+            ของแต่ละ feature, -1 = ค่าที่ไม่เคยเห็นตอน fit (ทุก column ของ feature นั้นเป็น 0)
+        """
+        spec = self._model_spec("lr")
+        codes = self.lr_input_codes(X)
+        n_cat = len(spec["categorical_cols"])
+        offsets = spec["feature_offsets"]
+        col_idx = np.empty_like(codes)
+        for j, categories in enumerate(spec["categories"]):
+            local = codes[:, j]
+            col_idx[:, j] = np.where(local < len(categories), local + offsets[j], -1)
+        for j, code_map in enumerate(spec["code_maps"]):
+            local = np.asarray(code_map, dtype=np.int32)[codes[:, n_cat + j]]
+            col_idx[:, n_cat + j] = np.where(local >= 0, local + offsets[n_cat + j], -1)
+        return col_idx
+
+    def decision_function_lr(self, X):
+        """LR logit = intercept + ผลรวม coef ของ columns ที่มีค่า 1"""
+        if self.preprocessor_spec.get("lr") is None:
+            X_encoded = self._pickled_preprocessor("lr").transform(X)
+            return self.lr_intercept + np.asarray(X_encoded @ self.lr_coef).ravel()
+        col_idx = self.lr_active_columns(X)
+        # column -1 (ไม่รู้จัก) -> ใช้ตำแหน่งพิเศษท้าย array ที่มี coef = 0
+        coef = np.append(self.lr_coef, 0.0)
+        return self.lr_intercept + coef[col_idx].sum(axis=1)
+
+    def predict_proba_lr(self, X):
+        """P(churn) จาก Logistic Regression (1D array)"""
+        return 1.0 / (1.0 + np.exp(-self.decision_function_lr(X)))
+
+    def predict_lr(self, X):
+        """ทำนาย 0/1 ที่ probability 0.5 (logit >= 0) - ใช้ >= เหมือน threshold ของ score.py / serve.py"""
+        return (self.decision_function_lr(X) >= 0).astype(int)
+
+    def predict_proba_lr_one(self, record):
+        """P(churn) จาก Logistic Regression ของลูกค้า 1 ราย (float) - ไม่ผ่าน pandas"""
+        if self.preprocessor_spec.get("lr") is None:
+            return float(self.predict_proba_lr(pd.DataFrame([record]))[0])
+        spec = self._model_spec("lr")
+        codes = self.lr_input_codes_one(record)
+        n_cat = len(spec["categorical_cols"])
+        offsets = spec["feature_offsets"]
+        logit = self.lr_intercept
+        for j, categories in enumerate(spec["categories"]):
+            if codes[j] < len(categories):
+                logit += self.lr_coef[offsets[j] + codes[j]]
+        for j, code_map in enumerate(spec["code_maps"]):
+            position = code_map[codes[n_cat + j]]
+            if position >= 0:
+                logit += self.lr_coef[offsets[n_cat + j] + position]
+        return 1.0 / (1.0 + math.exp(-logit))
+
+    def _xgb_iteration_range(self):
+        best_iteration = self.booster.attr("best_iteration")
+        return (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+
+    def predict_proba_xgb(self, X):
+        """P(churn) จาก XGBoost (1D array) - ใช้ trees ถึง best_iteration เหมือน XGBClassifier"""
+        if self.compiled_trees is not None:
+            return self.compiled_trees.predict_proba(self.transform_xgb(X))
+        return self.booster.inplace_predict(
+            self.transform_xgb(X),
+            iteration_range=self._xgb_iteration_range(),
+            validate_features=False,
+        )
+
+    def predict_xgb(self, X):
+        """ทำนาย 0/1 ที่ probability >= 0.5 - ใช้ >= เหมือน threshold ของ score.py / serve.py"""
+        return (self.predict_proba_xgb(X) >= 0.5).astype(int)
+
+    def predict_proba_xgb_one(self, record):
+        """P(churn) จาก XGBoost ของลูกค้า 1 ราย (float) - transform ไม่ผ่าน pandas"""
+        row = self.transform_xgb_one(record)
+        if self.compiled_trees is not None:
+            return float(self.compiled_trees.predict_proba(row)[0])
+        return float(self.booster.inplace_predict(
+            row, iteration_range=self._xgb_iteration_range(), validate_features=False)[0])
+
+
+_PICKLE_FILES = {
+    "lr_model": "logistic_regression.pkl",
+    "xgb_model": "xgboost.pkl",
+    "preprocessor_lr": "preprocessor_lr.pkl",
+    "preprocessor_xgb": "preprocessor_xgb.pkl",
+}
+
+
+def _load_pickles(models_dir):
+    missing = [name for name in _PICKLE_FILES.values() if not (models_dir / name).exists()]
+    if missing:
+        error_msg = f"Model files not found in {models_dir}: {missing}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    objects = {}
+    for key, filename in _PICKLE_FILES.items():
+        with open(models_dir / filename, "rb") as f:
+            objects[key] = pickle.load(f)
+    return objects
+
+
+def _load_pickle_artifacts(models_dir):
+    """ModelArtifacts จาก .pkl ของ run ที่ไม่มี native artifacts (spec สร้างใน memory ไม่เขียนไฟล์)"""
+    objects = _load_pickles(models_dir)
+    lr_model = objects["lr_model"]
+    return ModelArtifacts(
+        models_dir,
+        build_preprocessor_spec(objects["preprocessor_lr"], objects["preprocessor_xgb"]),
+        np.asarray(lr_model.coef_[0], dtype=np.float64),
+        float(lr_model.intercept_[0]),
+        [str(name) for name in _lr_feature_names(objects["preprocessor_lr"])],
+        booster=objects["xgb_model"].get_booster(),
+        preprocessors={"lr": objects["preprocessor_lr"], "xgb": objects["preprocessor_xgb"]},
+    )
+
+
+def load_model_artifacts(models_dir=None):
+    """
+    โหลด native artifacts จาก models/run_{RUN_NUMBER}/
+
+    run ที่ train ก่อนมี native artifacts (มีแต่ .pkl) จะ fallback ไปโหลดจาก .pkl
+    (ช้ากว่าและต้องมี sklearn - รัน python model_artifacts.py เพื่อแปลงครั้งเดียว)
+
+    Returns:
+        ModelArtifacts
+
+    Raises:
+        ValueError: ถ้าไม่พบทั้ง native artifacts และไฟล์ .pkl
+    """
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    models_dir = Path(models_dir)
+
+    missing = [name for name in (XGB_ARTIFACT_FILE, LR_ARTIFACT_FILE, PREPROCESSOR_ARTIFACT_FILE)
+               if not (models_dir / name).exists()]
+    if missing:
+        logger.warning(f"Native artifacts not found in {models_dir}: {missing} - loading .pkl files instead. "
+                       f"Run 'python model_artifacts.py' to convert this run.")
+        return _load_pickle_artifacts(models_dir)
+
+    logger.info(f"Loading native model artifacts from {models_dir}...")
+    with open(models_dir / PREPROCESSOR_ARTIFACT_FILE) as f:
+        preprocessor_spec = json.load(f)
+    if preprocessor_spec.get("format_version") != PREPROCESSOR_FORMAT_VERSION:
+        error_msg = (f"Unsupported {PREPROCESSOR_ARTIFACT_FILE} format version: "
+                     f"{preprocessor_spec.get('format_version')}")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    with np.load(models_dir / LR_ARTIFACT_FILE) as lr_data:
+        lr_coef = lr_data["coef"]
+        lr_intercept = float(lr_data["intercept"])
+        lr_feature_names = lr_data["feature_names"].tolist()
+
+    compiled_trees = None
+    if (models_dir / XGB_COMPILED_TREES_FILE).exists():
+        compiled_trees = load_compiled_trees(models_dir)
+
+    return ModelArtifacts(models_dir, preprocessor_spec, lr_coef, lr_intercept, lr_feature_names,
+                          compiled_trees=compiled_trees)
+
+
+def convert_pickle_artifacts(models_dir=None):
+    """แปลง .pkl ของ run ที่ train ไว้แล้วเป็น native artifacts (ไฟล์ .pkl เดิมไม่ถูกลบ)"""
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    models_dir = Path(models_dir)
+
+    objects = _load_pickles(models_dir)
+    sizes = save_model_artifacts(models_dir, **objects)
+    save_compiled_trees(models_dir, compile_booster(objects["xgb_model"].get_booster()))
+    return sizes
+
+
+if __name__ == "__main__":
+    convert_pickle_artifacts()
@@ -0,0 +1,130 @@
+"""
+Parallel Transform
+แบ่ง input เป็น row blocks แล้ว transform ด้วย process pool สำหรับ batch scoring ขนาดใหญ่
+
+- preprocessor ที่ fit แล้วถูกส่งไปแต่ละ worker ครั้งเดียว (ตอนสร้าง pool) ไม่ใช่ทุก block
+- ผลลัพธ์ถูกต่อกันตามลำดับแถวเดิม (DataFrame / scipy.sparse / numpy array)
+- input เล็กกว่า 2 blocks หรือ n_jobs=1 จะ transform ใน process ปัจจุบัน (ไม่เสีย overhead)
+
+หมายเหตุ: บน platform ที่ใช้ spawn (Windows / macOS) ต้องเรียกจากภายใต้
+if __name__ == "__main__": เหมือน multiprocessing ทั่วไป
+"""
+
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from config import TRANSFORM_N_JOBS, TRANSFORM_BLOCK_SIZE
+from logger_config import setup_logger
+
+logger = setup_logger("parallel_transform")
+
+# preprocessor ของ worker process (ตั้งค่าครั้งเดียวใน _init_worker)
+_worker_preprocessor = None
+
+
+def _init_worker(preprocessor_bytes):
+    global _worker_preprocessor
+    _worker_preprocessor = pickle.loads(preprocessor_bytes)
+
+
+def _transform_block(block):
+    return _worker_preprocessor.transform(block)
+
+
+def resolve_n_jobs(n_jobs):
+    """แปลง n_jobs แบบ joblib (-1 = ทุก cores, -2 = ทุก cores ยกเว้น 1) เป็นจำนวน processes"""
+    n_cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, n_cpus + 1 + n_jobs)
+    return int(n_jobs)
+
+
+def concat_blocks(blocks):
+    """ต่อผลลัพธ์ของแต่ละ block ตามลำดับ (รองรับ DataFrame, scipy.sparse และ numpy array)"""
+    first = blocks[0]
+    if isinstance(first, pd.DataFrame):
+        return pd.concat(blocks)
+    if sparse.issparse(first):
+        return sparse.vstack(blocks, format=first.format)
+    return np.concatenate(blocks)
+
+
+class ParallelTransformer:
+    """
+    Wrapper ที่ transform DataFrame ขนาดใหญ่แบบขนานด้วย process pool
+
+    Pool ถูกสร้างครั้งแรกที่ต้องใช้และใช้ซ้ำได้หลาย batch - เรียก close() หรือใช้ with
+    เพื่อปิด workers เมื่อเลิกใช้
+
+    Args:
+        preprocessor: preprocessor (Pipeline / transformer) ที่ fit แล้ว
+        n_jobs: จำนวน processes (-1 = ทุก cores)
+        block_size: จำนวนแถวต่อ block ที่ส่งให้ worker
+
+    Usage:
+        with ParallelTransformer(preprocessor_xgb, n_jobs=-1) as parallel:
+            X_big_xgb = parallel.transform(X_big)
+    """
+
+    def __init__(self, preprocessor, n_jobs=TRANSFORM_N_JOBS, block_size=TRANSFORM_BLOCK_SIZE):
+        if block_size is None or block_size <= 0:
+            error_msg = f"block_size must be a positive integer, got {block_size}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self.preprocessor = preprocessor
+        self.n_jobs = resolve_n_jobs(n_jobs)
+        self.block_size = int(block_size)
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            logger.info(f"Starting transform pool with {self.n_jobs} workers")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_jobs,
+                initializer=_init_worker,
+                initargs=(pickle.dumps(self.preprocessor, protocol=pickle.HIGHEST_PROTOCOL),),
+            )
+        return self._executor
+
+    def transform(self, X):
+        """
+        Transform X ทีละ block แบบขนาน
+
+        Returns:
+            ผลลัพธ์แบบเดียวกับ preprocessor.transform(X) (แถวเรียงตามลำดับเดิม)
+        """
+        n_rows = len(X)
+        if self.n_jobs == 1 or n_rows < 2 * self.block_size:
+            logger.debug(f"Transforming {n_rows} rows in-process")
+            return self.preprocessor.transform(X)
+
+        blocks = [X.iloc[start:start + self.block_size] for start in range(0, n_rows, self.block_size)]
+        logger.debug(f"Transforming {n_rows} rows in {len(blocks)} blocks across {self.n_jobs} workers")
+        # executor.map คืนผลตามลำดับ blocks ที่ส่งเข้าไป
+        results = list(self._get_executor().map(_transform_block, blocks))
+        return concat_blocks(results)
+
+    def close(self):
+        """ปิด worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def parallel_transform(preprocessor, X, n_jobs=TRANSFORM_N_JOBS, block_size=TRANSFORM_BLOCK_SIZE):
+    """Transform X แบบขนานครั้งเดียว (สร้างและปิด pool ในฟังก์ชัน)"""
+    with ParallelTransformer(preprocessor, n_jobs=n_jobs, block_size=block_size) as parallel:
+        return parallel.transform(X)
@@ -0,0 +1,197 @@
+"""
+Run Profiler
+วัด wall time, CPU time และ peak RSS ของแต่ละ stage ใน training pipeline แล้วบันทึกเป็น JSON
+(models/run_{RUN_NUMBER}/run_profile.json) ไว้เทียบ performance ระหว่าง runs
+
+- CPU time นับทุก threads ของ process ปัจจุบัน (ไม่รวม worker processes ของ joblib / loky)
+- Peak RSS ต่อ stage: บน Linux จะ reset ค่า peak (VmHWM) ตอนเริ่มแต่ละ stage จึงได้ peak
+  ของ stage นั้นจริงๆ - platform อื่นจะเป็น peak ของ process ตั้งแต่เริ่มจนจบ stage นั้น
+  (ดู 'peak_rss_scope' ใน report)
+
+Usage:
+    profiler = StageProfiler().activate()
+    with profile_stage("load_data"):
+        df = load_raw_data()
+    profiler.save(models_dir / "run_profile.json")
+"""
+
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+from logger_config import setup_logger
+
+logger = setup_logger("run_profiler")
+
+# profiler ที่ profile_stage() บันทึกลง (ตั้งด้วย StageProfiler.activate())
+_active_profiler = None
+
+_MB = 1024 * 1024
+
+
+def _read_proc_status(field):
+    """ค่าจาก /proc/self/status เป็น bytes (Linux เท่านั้น - platform อื่นคืน None)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def current_peak_rss():
+    """
+    Peak RSS (bytes) ของ process ปัจจุบัน
+
+    Returns:
+        int หรือ None ถ้า platform ไม่รองรับ (Windows ต้องมี psutil)
+    """
+    peak = _read_proc_status("VmHWM")
+    if peak is not None:
+        return peak
+    try:
+        import resource
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS รายงานเป็น bytes, Linux / BSD เป็น KB
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+    except (ImportError, AttributeError):
+        return None
+
+
+def _reset_peak_rss():
+    """reset peak RSS ของ process ให้เท่ากับ RSS ปัจจุบัน (Linux เท่านั้น) - คืน True ถ้าสำเร็จ"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _max_or_none(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _to_mb(n_bytes):
+    return round(n_bytes / _MB, 1) if n_bytes is not None else None
+
+
+class StageProfiler:
+    """
+    บันทึก wall time / CPU time / peak RSS ของแต่ละ stage
+
+    stages ซ้อนกันได้ (เช่น 'xgb.cv' ภายใน stage ที่ใหญ่กว่า) - peak ของ stage นอก
+    รวม peak ของ stages ที่อยู่ข้างในด้วย และ records เรียงตามลำดับที่เริ่ม stage
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._open_peaks = []  # peak ที่เห็นแล้วของแต่ละ stage ที่ยังไม่จบ (ชั้นในสุดอยู่ท้าย)
+        self._run_peak = current_peak_rss()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self.peak_rss_scope = "stage" if _reset_peak_rss() else "process"
+
+    @contextmanager
+    def stage(self, name):
+        """วัด stage ชื่อ name (ใช้กับ with)"""
+        # เก็บ peak ก่อน reset ไม่ให้ stages ที่ยังเปิดอยู่และ peak รวมของ run หายไป
+        peak_before = current_peak_rss()
+        self._run_peak = _max_or_none(self._run_peak, peak_before)
+        if self._open_peaks:
+            self._open_peaks[-1] = _max_or_none(self._open_peaks[-1], peak_before)
+        if self.peak_rss_scope == "stage":
+            _reset_peak_rss()
+
+        record = {"name": name, "process": "main", "depth": len(self._open_peaks)}
+        self.stages.append(record)
+        self._open_peaks.append(None)
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            peak = _max_or_none(current_peak_rss(), self._open_peaks.pop())
+            if self._open_peaks:
+                self._open_peaks[-1] = _max_or_none(self._open_peaks[-1], peak)
+            self._run_peak = _max_or_none(self._run_peak, peak)
+            record.update(
+                wall_s=round(wall, 4),
+                cpu_s=round(cpu, 4),
+                cpu_util=round(cpu / wall, 2) if wall > 0 else None,
+                peak_rss_mb=_to_mb(peak),
+            )
+
+    def activate(self):
+        """ให้ profile_stage() บันทึกลง profiler นี้ (แทน profiler ที่ active อยู่เดิม)"""
+        global _active_profiler
+        _active_profiler = self
+        return self
+
+    def add_records(self, records, process):
+        """เพิ่ม stages ที่วัดใน process อื่น (เช่น LR ที่ train ใน process แยก)"""
+        for record in records:
+            self.stages.append({**record, "process": process})
+
+    def report(self, run_number=None):
+        """
+        Returns:
+            dict: report ทั้งหมด (แปลงเป็น JSON ได้)
+        """
+        wall = time.perf_counter() - self._start_wall
+        return {
+            "run_number": run_number,
+            "created_at": pd.Timestamp.now().isoformat(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "peak_rss_scope": self.peak_rss_scope,
+            "total": {
+                "wall_s": round(wall, 4),
+                "cpu_s": round(time.process_time() - self._start_cpu, 4),
+                "peak_rss_mb": _to_mb(_max_or_none(self._run_peak, current_peak_rss())),
+            },
+            "stages": self.stages,
+        }
+
+    def save(self, path, run_number=None):
+        """บันทึก report เป็น JSON และ log สรุปแต่ละ stage"""
+        report = self.report(run_number)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        logger.info("Stage profile (wall s / cpu s / peak RSS MB):")
+        for record in report["stages"]:
+            indent = "  " * (record["depth"] + 1)
+            worker = f" [{record['process']}]" if record["process"] != "main" else ""
+            logger.info(f"{indent}{record['name']}{worker}: {record['wall_s']:.3f} / "
+                        f"{record['cpu_s']:.3f} / {record['peak_rss_mb']}")
+        total = report["total"]
+        logger.info(f"  TOTAL: {total['wall_s']:.3f} / {total['cpu_s']:.3f} / {total['peak_rss_mb']}")
+        logger.info(f"Saved run profile to {path}")
+        return report
+
+
+def profile_stage(name):
+    """
+    วัด stage ด้วย profiler ที่ active อยู่ - ถ้าไม่มี profiler (เช่นเรียกฟังก์ชันจาก script อื่น)
+    จะไม่ทำอะไร
+    """
+    if _active_profiler is None:
+        return nullcontext()
+    return _active_profiler.stage(name)
@@ -0,0 +1,330 @@
+"""
+Batch Scoring
+Score ไฟล์ลูกค้าทั้งหมด (CSV / Parquet) แบบ out-of-core ด้วย models ของ models/run_{RUN_NUMBER}
+
+อ่าน input ทีละ chunk -> preprocess + predict ด้วย native artifacts (model_artifacts.py)
+-> เขียน probability และ label (ตาม PREDICTION_THRESHOLD) ต่อท้าย output ทันที
+memory จึงขึ้นกับ SCORE_CHUNK_SIZE ไม่ใช่ขนาดไฟล์
+
+n_jobs > 1 (TRANSFORM_N_JOBS / --n-jobs): แต่ละ chunk ถูกแบ่งเป็น blocks เท่าๆ กันแล้ว
+preprocess + predict ใน process pool (ParallelTransformer) - ผลลัพธ์เรียงตามลำดับแถวเดิม
+
+แถวที่ score ไม่ได้ (เช่น ค่า numeric เป็นข้อความ / NaN หรืออยู่นอก bins) ไม่ทำให้ทั้ง job ล้ม:
+แต่ละ chunk สร้าง mask ของแถวที่ใช้ได้จาก bin codes ครั้งเดียวแล้ว predict เฉพาะแถวเหล่านั้น
+แถวที่เสียได้ churn_probability / churn_prediction เป็นค่าว่าง (null) และถูกนับเป็น rows_rejected ใน summary
+
+output ถูกเขียนลงไฟล์ชั่วคราวก่อนแล้วค่อยย้ายไปที่ path จริงเมื่อ score ครบทุกแถว
+(ถ้าล้มกลางทาง ไฟล์ output เดิมจะไม่ถูกแทนที่ด้วยผลครึ่งๆ กลางๆ)
+
+Output columns: SCORE_ID_COLS ที่มีใน input + churn_probability + churn_prediction
+
+Usage:
+    python score.py customers.csv scores.csv
+    python score.py customers.parquet scores.parquet --model lr --threshold 0.5
+    python score.py customers.csv scores.csv --n-jobs -1 --chunk-size 1000000
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    CATEGORICAL_COLS,
+    MODELS_DIR,
+    NUMERIC_COLS,
+    PREDICTION_THRESHOLD,
+    RUN_NUMBER,
+    SCORE_CHUNK_SIZE,
+    SCORE_ID_COLS,
+    SCORE_MODEL,
+    TRANSFORM_N_JOBS,
+)
+from data_prep import iter_parquet_chunks, iter_raw_data_chunks
+from logger_config import setup_logger
+from model_artifacts import load_model_artifacts
+from parallel_transform import ParallelTransformer, resolve_n_jobs
+
+logger = setup_logger("score")
+
+FEATURE_COLS = CATEGORICAL_COLS + NUMERIC_COLS
+PROBA_COL = "churn_probability"
+PRED_COL = "churn_prediction"
+
+_PARQUET_SUFFIXES = {".parquet", ".pq"}
+
+
+def _is_parquet(path):
+    return Path(path).suffix.lower() in _PARQUET_SUFFIXES
+
+
+def iter_input_chunks(input_path, chunk_size=SCORE_CHUNK_SIZE, id_cols=SCORE_ID_COLS):
+    """chunks ของ input (CSV หรือ Parquet ตามนามสกุลไฟล์) ที่มี features + ID columns ที่มีในไฟล์"""
+    if _is_parquet(input_path):
+        return iter_parquet_chunks(input_path, chunk_size=chunk_size, required_cols=FEATURE_COLS,
+                                   optional_cols=id_cols)
+    return iter_raw_data_chunks(chunk_size=chunk_size, data_path=input_path, required_cols=FEATURE_COLS,
+                                optional_cols=id_cols)
+
+
+class _CsvChunkWriter:
+    """เขียน DataFrame ต่อท้ายไฟล์ CSV ทีละ chunk (header เฉพาะ chunk แรก)"""
+
+    def __init__(self, path):
+        self._file = open(path, "w", newline="")
+        self._header = True
+
+    def write(self, df):
+        df.to_csv(self._file, header=self._header, index=False)
+        self._header = False
+
+    def close(self):
+        self._file.close()
+
+
+class _ParquetChunkWriter:
+    """เขียนแต่ละ chunk เป็น row group ของไฟล์ Parquet (ต้องมี pyarrow)"""
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            error_msg = "Writing Parquet files requires pyarrow (pip install pyarrow)"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self._pa = pa
+        self._pq = pq
+        self._path = path
+        self._writer = None
+
+    def write(self, df):
+        table = self._pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self._path, table.schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def _open_writer(path):
+    return _ParquetChunkWriter(path) if _is_parquet(path) else _CsvChunkWriter(path)
+
+
+def _predict_proba(artifacts, X, model):
+    if model == "xgb":
+        return artifacts.predict_proba_xgb(X)
+    if model == "lr":
+        return artifacts.predict_proba_lr(X)
+    error_msg = f"Unknown model: {model}. Use 'xgb' or 'lr'."
+    logger.error(error_msg)
+    raise ValueError(error_msg)
+
+
+def _coerce_numeric(X):
+    """
+    แปลงคอลัมน์ NUMERIC_COLS ที่ถูกอ่านเป็นข้อความ (มีค่าที่ไม่ใช่ตัวเลขปน เช่น Age="abc") เป็นตัวเลข
+
+    Returns:
+        tuple: (X ที่ทุก NUMERIC_COLS เป็นตัวเลข, bool array ของแถวที่มีค่าแปลงไม่ได้)
+    """
+    unparseable = np.zeros(len(X), dtype=bool)
+    for col in NUMERIC_COLS:
+        if pd.api.types.is_numeric_dtype(X[col].dtype):
+            continue
+        values = pd.to_numeric(X[col], errors="coerce")
+        unparseable |= (values.isna() & X[col].notna()).to_numpy()
+        X = X.assign(**{col: values})
+    return X, unparseable
+
+
+def _predict_proba_bisect(artifacts, X, model):
+    """
+    P(churn) ของทุกแถวใน X (แถวที่ error ได้ NaN) ด้วยการแบ่งครึ่งซ้ำจนเหลือทีละแถว
+    ใช้เป็น fallback เมื่อ predict แถวที่ผ่าน valid_rows() แล้วยัง error (ไม่ควรเกิดในกรณีปกติ)
+    """
+    try:
+        return np.asarray(_predict_proba(artifacts, X, model), dtype=np.float64)
+    except (ValueError, KeyError, TypeError):
+        if len(X) == 1:
+            return np.full(1, np.nan)
+    mid = len(X) // 2
+    return np.concatenate([_predict_proba_bisect(artifacts, X.iloc[:mid], model),
+                           _predict_proba_bisect(artifacts, X.iloc[mid:], model)])
+
+
+def _predict_proba_rows(artifacts, X, model):
+    """
+    P(churn) ของทุกแถวใน X โดยแถวที่ preprocess ไม่ผ่านได้ NaN
+
+    แถวที่มีค่าตัวเลขแปลงไม่ได้ / bin ไม่ได้ (NaN หรือนอก bins) ถูกแยกออกด้วย mask ที่คำนวณ
+    จาก bin codes ครั้งเดียวต่อ chunk แล้ว predict แถวที่เหลือในครั้งเดียว
+
+    Returns:
+        tuple: (proba float64 array, valid bool array)
+    """
+    X, unparseable = _coerce_numeric(X)
+    valid = artifacts.valid_rows(X, model) & ~unparseable
+    proba = np.full(len(X), np.nan)
+    if valid.any():
+        X_valid = X if valid.all() else X[valid]
+        try:
+            proba[valid] = _predict_proba(artifacts, X_valid, model)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Scoring {len(X_valid):,} rows failed ({e}) - retrying in halves to isolate bad rows")
+            proba[valid] = _predict_proba_bisect(artifacts, X_valid, model)
+    # LR ให้ NaN กับแถวที่มีค่าตัวเลขอื่นๆ เป็น NaN
+    valid &= ~np.isnan(proba)
+    return proba, valid
+
+
+class _ChunkScorer:
+    """
+    "transformer" ที่แปลง features ดิบเป็น P(churn) (NaN = แถวที่ score ไม่ได้)
+    ใช้กับ ParallelTransformer เพื่อ preprocess + predict ใน worker processes
+    """
+
+    def __init__(self, artifacts, model):
+        self.artifacts = artifacts
+        self.model = model
+
+    def transform(self, X):
+        proba, _ = _predict_proba_rows(self.artifacts, X, self.model)
+        return proba
+
+
+def score_file(input_path, output_path, model=SCORE_MODEL, threshold=PREDICTION_THRESHOLD,
+               chunk_size=SCORE_CHUNK_SIZE, models_dir=None, id_cols=SCORE_ID_COLS, n_jobs=TRANSFORM_N_JOBS):
+    """
+    Score ทุกแถวของ input_path แล้วเขียนผลลง output_path ทีละ chunk
+
+    Args:
+        input_path: ไฟล์ CSV หรือ Parquet (.parquet / .pq) ที่มีคอลัมน์ features ดิบ
+        output_path: ไฟล์ผลลัพธ์ (CSV หรือ Parquet ตามนามสกุล)
+        model: 'xgb' หรือ 'lr'
+        threshold: churn_prediction = 1 ถ้า churn_probability >= threshold
+        chunk_size: จำนวนแถวต่อ chunk
+        models_dir: โฟลเดอร์ของ run (default = models/run_{RUN_NUMBER})
+        id_cols: คอลัมน์ที่คัดลอกไปยัง output ถ้ามีใน input
+        n_jobs: จำนวน processes ที่ score แต่ละ chunk (1 = ใน process นี้, -1 = ทุก cores)
+
+    Returns:
+        dict: สรุป (rows, rows ที่ score ไม่ได้, churn predictions, เวลาแต่ละขั้น, rows/s)
+    """
+    if model not in ("xgb", "lr"):
+        error_msg = f"Unknown model: {model}. Use 'xgb' or 'lr'."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    input_path, output_path = Path(input_path), Path(output_path)
+    if output_path.resolve() == input_path.resolve():
+        error_msg = f"Output path must differ from input path: {output_path}"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    artifacts = load_model_artifacts(models_dir)
+    n_workers = resolve_n_jobs(n_jobs)
+    logger.info(f"Scoring {input_path} with {model.upper()} (Run #{RUN_NUMBER}, threshold={threshold}, "
+                f"{n_workers} process{'es' if n_workers > 1 else ''})")
+    # chunk เต็มถูกแบ่งให้ทุก worker เท่าๆ กัน (chunk สุดท้ายที่เล็กกว่า 2 blocks score ใน process นี้)
+    scorer = ParallelTransformer(_ChunkScorer(artifacts, model), n_jobs=n_workers,
+                                 block_size=max(1, -(-chunk_size // n_workers)))
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    writer = _open_writer(tmp_path)
+
+    n_rows = 0
+    n_rejected = 0
+    n_churn = 0
+    timings = {"read_s": 0.0, "score_s": 0.0, "write_s": 0.0}
+    start = time.perf_counter()
+    try:
+        chunks = iter(iter_input_chunks(input_path, chunk_size=chunk_size, id_cols=id_cols))
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            t1 = time.perf_counter()
+            timings["read_s"] += t1 - t0
+            if chunk is None:
+                break
+
+            proba = scorer.transform(chunk[FEATURE_COLS])
+            valid = ~np.isnan(proba)
+            pred = (proba >= threshold).astype(np.int8)
+            out = chunk[[col for col in id_cols if col in chunk.columns]].reset_index(drop=True)
+            out[PROBA_COL] = proba
+            out[PRED_COL] = pd.array(pred, dtype="Int8")
+            if not valid.all():
+                out.loc[~valid, PRED_COL] = pd.NA
+                n_bad = int((~valid).sum())
+                n_rejected += n_bad
+                logger.warning(f"{n_bad:,} rows in chunk could not be scored (rows {n_rows:,}-{n_rows + len(chunk) - 1:,}) "
+                               f"- writing null {PROBA_COL} / {PRED_COL}")
+            t2 = time.perf_counter()
+            timings["score_s"] += t2 - t1
+
+            writer.write(out)
+            timings["write_s"] += time.perf_counter() - t2
+
+            n_rows += len(chunk)
+            n_churn += int(pred[valid].sum())
+            elapsed = time.perf_counter() - start
+            logger.info(f"Scored {n_rows:,} rows ({n_rows / elapsed:,.0f} rows/s)")
+    except BaseException:
+        writer.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        scorer.close()
+    writer.close()
+    tmp_path.replace(output_path)
+
+    elapsed = time.perf_counter() - start
+    n_scored = n_rows - n_rejected
+    summary = {
+        "rows": n_rows,
+        "rows_rejected": n_rejected,
+        "churn_predictions": n_churn,
+        "churn_rate": n_churn / n_scored if n_scored else 0.0,
+        "elapsed_s": elapsed,
+        "rows_per_s": n_rows / elapsed if elapsed > 0 else 0.0,
+        **timings,
+    }
+    logger.info("=" * 70)
+    logger.info(f"Scored {n_rows:,} rows in {elapsed:.2f}s ({summary['rows_per_s']:,.0f} rows/s)")
+    logger.info(f"  read {timings['read_s']:.2f}s | score {timings['score_s']:.2f}s | write {timings['write_s']:.2f}s")
+    if n_rejected:
+        logger.warning(f"  Rejected: {n_rejected:,} rows could not be scored (null {PROBA_COL} / {PRED_COL})")
+    logger.info(f"  Predicted churn: {n_churn:,} ({summary['churn_rate']:.2%} of scored rows)")
+    logger.info(f"  Output: {output_path}")
+    logger.info("=" * 70)
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a customer file (CSV / Parquet) in chunks")
+    parser.add_argument("input", help="input file (.csv, .parquet, .pq)")
+    parser.add_argument("output", help="output file (.csv, .parquet, .pq)")
+    parser.add_argument("--model", choices=["xgb", "lr"], default=SCORE_MODEL,
+                        help=f"model to score with (default: {SCORE_MODEL})")
+    parser.add_argument("--threshold", type=float, default=PREDICTION_THRESHOLD,
+                        help=f"churn threshold (default: PREDICTION_THRESHOLD = {PREDICTION_THRESHOLD})")
+    parser.add_argument("--chunk-size", type=int, default=SCORE_CHUNK_SIZE,
+                        help=f"rows per chunk (default: {SCORE_CHUNK_SIZE})")
+    parser.add_argument("--n-jobs", type=int, default=TRANSFORM_N_JOBS,
+                        help=f"processes that score each chunk, -1 = all cores (default: {TRANSFORM_N_JOBS})")
+    parser.add_argument("--models-dir", default=None,
+                        help=f"run directory (default: {MODELS_DIR}/run_{RUN_NUMBER})")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    score_file(args.input, args.output, model=args.model, threshold=args.threshold,
+               chunk_size=args.chunk_size, models_dir=args.models_dir, n_jobs=args.n_jobs)
@@ -0,0 +1,67 @@
+"""
+Scoring Module
+ทำนายลูกค้าทีละราย (real-time) ด้วย models ของ run
+
+ModelBundle เป็น wrapper บาง ๆ รอบ model_artifacts.ModelArtifacts - ใช้ preprocessor spec,
+LR coefficients และ compiled trees ชุดเดียวกับ score.py / serve.py (inference path เดียว)
+ผ่าน transform_xgb_one / lr_input_codes_one ที่ไม่สร้าง DataFrame
+
+Usage:
+    bundle = load_model_bundle()
+    proba = bundle.predict_proba_one({"CreditScore": 619, "Geography": "France", ...})
+    label = bundle.predict_one(record)  # 0/1 ตาม PREDICTION_THRESHOLD
+"""
+
+from config import PREDICTION_THRESHOLD
+from logger_config import setup_logger
+from model_artifacts import load_model_artifacts
+
+logger = setup_logger("scoring")
+
+
+class ModelBundle:
+    """
+    Single-customer scoring บน ModelArtifacts
+
+    Args:
+        artifacts: ModelArtifacts จาก load_model_artifacts()
+        threshold: threshold สำหรับ predict_one()
+    """
+
+    def __init__(self, artifacts, threshold=PREDICTION_THRESHOLD):
+        self.artifacts = artifacts
+        self.threshold = threshold
+
+    def predict_proba_one(self, record, model="xgb"):
+        """
+        ความน่าจะเป็นที่ลูกค้า 1 ราย จะ churn
+
+        Args:
+            record: dict ของค่า feature ดิบ (คอลัมน์เดียวกับ X ตอน train)
+            model: "xgb" หรือ "lr"
+
+        Returns:
+            float: P(churn)
+        """
+        if model == "xgb":
+            return self.artifacts.predict_proba_xgb_one(record)
+        if model == "lr":
+            return self.artifacts.predict_proba_lr_one(record)
+
+        error_msg = f"Unknown model: {model}. Use 'xgb' or 'lr'."
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    def predict_one(self, record, model="xgb"):
+        """ทำนาย churn (0/1) ของลูกค้า 1 ราย ตาม self.threshold"""
+        return int(self.predict_proba_one(record, model=model) >= self.threshold)
+
+
+def load_model_bundle(models_dir=None, threshold=PREDICTION_THRESHOLD):
+    """
+    โหลด artifacts จาก models/run_{RUN_NUMBER}/ (หรือ models_dir)
+
+    Returns:
+        ModelBundle
+    """
+    return ModelBundle(load_model_artifacts(models_dir), threshold=threshold)
@@ -0,0 +1,364 @@
+"""
+Online Scoring Service
+HTTP service (standard library ล้วน ไม่ต้องมี service ภายนอก) สำหรับ score ลูกค้าทีละราย
+ด้วย XGBoost ของ models/run_{RUN_NUMBER}
+
+Requests ที่เข้ามาพร้อมกันถูกรวมเป็น micro-batch (ไม่เกิน SERVE_MAX_BATCH_SIZE แถว / รอไม่เกิน
+SERVE_MAX_WAIT_MS หลัง request แรก) แล้ว transform + predict แบบ vectorized ครั้งเดียวด้วย
+native artifacts (preprocessor_xgb + booster ที่ compile เป็น NumPy) ก่อนแยกผลคืนแต่ละ request
+
+Endpoints:
+    POST /score    body = JSON ของลูกค้า 1 ราย (คอลัมน์เดียวกับ X ตอน train)
+                   -> {"churn_probability": 0.12, "churn_prediction": 0}
+    GET  /metrics  latency percentiles, batch-size histogram, จำนวน requests / errors
+    GET  /health   {"status": "ok"}
+
+Usage:
+    python serve.py                      # host / port / batching ตาม config.py
+    python serve.py --port 8080 --max-batch-size 128 --max-wait-ms 5
+    python load_test.py --concurrency 32 --duration 10
+"""
+
+import argparse
+import json
+import queue
+import signal
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    MODELS_DIR,
+    PREDICTION_THRESHOLD,
+    RUN_NUMBER,
+    SERVE_HOST,
+    SERVE_LATENCY_WINDOW,
+    SERVE_MAX_BATCH_SIZE,
+    SERVE_MAX_WAIT_MS,
+    SERVE_PORT,
+    SERVE_REQUEST_TIMEOUT_S,
+)
+from logger_config import setup_logger
+from model_artifacts import load_model_artifacts
+
+logger = setup_logger("serve")
+
+
+def _percentiles_ms(values):
+    """สรุป latencies (วินาที) เป็น ms"""
+    if not values:
+        return {}
+    values_ms = np.asarray(values) * 1000
+    p50, p90, p95, p99 = np.percentile(values_ms, [50, 90, 95, 99])
+    return {
+        "p50": round(float(p50), 3),
+        "p90": round(float(p90), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values_ms.max()), 3),
+        "mean": round(float(values_ms.mean()), 3),
+    }
+
+
+def _size_bucket(size):
+    """bucket ของ batch size แบบ power of 2: 1, 2-3, 4-7, 8-15, ..."""
+    low = 1 << (size.bit_length() - 1)
+    high = 2 * low - 1
+    return str(low) if low == high else f"{low}-{high}"
+
+
+class ServiceMetrics:
+    """
+    Metrics ของ service (thread-safe)
+
+    latencies เก็บเฉพาะ window ล่าสุด (SERVE_LATENCY_WINDOW) ส่วน counters / histogram นับสะสม
+    """
+
+    def __init__(self, window=SERVE_LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._request_latencies = deque(maxlen=window)
+        self._queue_waits = deque(maxlen=window)
+        self._batch_latencies = deque(maxlen=window)
+        self._batch_sizes = {}
+        self.n_requests = 0
+        self.n_errors = 0
+        self.n_batches = 0
+        self.n_rows = 0
+
+    def record_batch(self, size, predict_s, queue_waits):
+        with self._lock:
+            self.n_batches += 1
+            self.n_rows += size
+            bucket = _size_bucket(size)
+            self._batch_sizes[bucket] = self._batch_sizes.get(bucket, 0) + 1
+            self._batch_latencies.append(predict_s)
+            self._queue_waits.extend(queue_waits)
+
+    def record_request(self, latency_s, error=False):
+        with self._lock:
+            self.n_requests += 1
+            self.n_errors += int(error)
+            self._request_latencies.append(latency_s)
+
+    def snapshot(self):
+        """dict สำหรับ GET /metrics"""
+        with self._lock:
+            histogram = dict(sorted(self._batch_sizes.items(), key=lambda item: int(item[0].split("-")[0])))
+            return {
+                "uptime_s": round(time.time() - self._started, 1),
+                "requests": self.n_requests,
+                "errors": self.n_errors,
+                "batches": self.n_batches,
+                "mean_batch_size": round(self.n_rows / self.n_batches, 2) if self.n_batches else None,
+                "batch_size_histogram": histogram,
+                "request_latency_ms": _percentiles_ms(list(self._request_latencies)),
+                "queue_wait_ms": _percentiles_ms(list(self._queue_waits)),
+                "batch_predict_ms": _percentiles_ms(list(self._batch_latencies)),
+                "latency_window": self._request_latencies.maxlen,
+            }
+
+
+class _PendingRequest:
+    """request ที่รอใน queue - worker ใส่ผลแล้ว set event"""
+
+    __slots__ = ("record", "enqueued_at", "done", "result", "error")
+
+    def __init__(self, record):
+        self.record = record
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    รวม requests ทีละรายที่เข้ามาพร้อมกันเป็น batch แล้ว predict ใน worker thread เดียว
+
+    batch ถูกปิดเมื่อครบ max_batch_size หรือเมื่อรอครบ max_wait_ms หลัง request แรกของ batch
+
+    Args:
+        artifacts: ModelArtifacts (XGBoost preprocessor + model)
+        max_batch_size: จำนวน requests สูงสุดต่อ batch
+        max_wait_ms: เวลารอ request เพิ่มหลัง request แรก (0 = predict ทันทีที่ queue ว่าง)
+        threshold: churn_prediction = 1 ถ้า churn_probability >= threshold
+        metrics: ServiceMetrics
+    """
+
+    def __init__(self, artifacts, max_batch_size=SERVE_MAX_BATCH_SIZE, max_wait_ms=SERVE_MAX_WAIT_MS,
+                 threshold=PREDICTION_THRESHOLD, metrics=None):
+        if max_batch_size < 1 or max_wait_ms < 0:
+            error_msg = (f"max_batch_size must be >= 1 and max_wait_ms >= 0, "
+                         f"got {max_batch_size} / {max_wait_ms}")
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        self.artifacts = artifacts
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max_wait_ms / 1000
+        self.threshold = threshold
+        self.metrics = metrics if metrics is not None else ServiceMetrics()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def stop(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def submit(self, record, timeout=SERVE_REQUEST_TIMEOUT_S):
+        """
+        Score ลูกค้า 1 ราย (block จนกว่า batch ที่ request นี้อยู่จะ predict เสร็จ)
+
+        Returns:
+            dict: {"churn_probability", "churn_prediction"}
+
+        Raises:
+            ValueError: ถ้า record ไม่ถูกต้อง (คอลัมน์หาย / ค่านอกช่วง bins)
+            TimeoutError: ถ้ารอผลเกิน timeout
+        """
+        pending = _PendingRequest(record)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError(f"Scoring did not finish within {timeout}s")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect_batch(self, first):
+        """ดึง requests ต่อจาก first จนครบ max_batch_size หรือหมดเวลารอ - คืน (batch, stop)"""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            # requests ที่รออยู่ใน queue แล้วถูกดึงทันทีแม้เลย deadline ส่วนที่ยังไม่มาจะรอถึง deadline
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stop = self._collect_batch(first)
+            self._predict_batch(batch)
+
+    def _predict(self, records):
+        proba = self.artifacts.predict_proba_xgb(pd.DataFrame.from_records(records))
+        return [
+            {"churn_probability": float(p), "churn_prediction": int(p >= self.threshold)}
+            for p in proba
+        ]
+
+    def _predict_batch(self, batch):
+        start = time.perf_counter()
+        queue_waits = [start - pending.enqueued_at for pending in batch]
+        try:
+            results = self._predict([pending.record for pending in batch])
+            for pending, result in zip(batch, results):
+                pending.result = result
+        except (ValueError, KeyError, TypeError):
+            # record ที่ไม่ถูกต้อง 1 รายทำให้ทั้ง batch ล้ม -> score ทีละรายเพื่อคืน error เฉพาะรายนั้น
+            for pending in batch:
+                try:
+                    pending.result = self._predict([pending.record])[0]
+                except (ValueError, KeyError, TypeError) as e:
+                    pending.error = ValueError(str(e))
+        except Exception as e:
+            logger.exception("Batch prediction failed")
+            for pending in batch:
+                pending.error = e
+        self.metrics.record_batch(len(batch), time.perf_counter() - start, queue_waits)
+        for pending in batch:
+            pending.done.set()
+
+
+class ScoringRequestHandler(BaseHTTPRequestHandler):
+    """HTTP handler - server ต้องมี attribute batcher (MicroBatcher)"""
+
+    # keep-alive: load test / clients ใช้ connection เดิมซ้ำได้
+    protocol_version = "HTTP/1.1"
+    # headers กับ body ถูกเขียนแยกกัน - ปิด Nagle เพื่อไม่ให้ body ค้างรอ delayed ACK (~40ms ต่อ request)
+    disable_nagle_algorithm = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok", "run_number": RUN_NUMBER})
+        elif self.path == "/metrics":
+            self._send_json(200, self.server.batcher.metrics.snapshot())
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/score":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+
+        start = time.perf_counter()
+        metrics = self.server.batcher.metrics
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            record = json.loads(self.rfile.read(length))
+            if not isinstance(record, dict):
+                raise ValueError("Request body must be a JSON object of one customer's features")
+            result = self.server.batcher.submit(record)
+        except (ValueError, json.JSONDecodeError) as e:
+            metrics.record_request(time.perf_counter() - start, error=True)
+            self._send_json(400, {"error": str(e)})
+            return
+        except TimeoutError as e:
+            metrics.record_request(time.perf_counter() - start, error=True)
+            self._send_json(503, {"error": str(e)})
+            return
+        except Exception as e:
+            metrics.record_request(time.perf_counter() - start, error=True)
+            self._send_json(500, {"error": str(e)})
+            return
+
+        metrics.record_request(time.perf_counter() - start)
+        self._send_json(200, result)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class ScoringHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer ที่รองรับ connections พร้อมกันจำนวนมาก (backlog default = 5 ทำให้ connection ถูก reset)"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def create_server(host=SERVE_HOST, port=SERVE_PORT, models_dir=None, max_batch_size=SERVE_MAX_BATCH_SIZE,
+                  max_wait_ms=SERVE_MAX_WAIT_MS, threshold=PREDICTION_THRESHOLD):
+    """
+    สร้าง HTTP server + MicroBatcher (worker เริ่มทำงานแล้ว) - เรียก serve_forever() เพื่อรับ requests
+
+    Returns:
+        ScoringHTTPServer: มี attribute batcher
+    """
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    artifacts = load_model_artifacts(models_dir)
+    if artifacts.compiled_trees is None:
+        logger.warning("Compiled trees not found - predicting with the xgboost Booster instead")
+
+    batcher = MicroBatcher(artifacts, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                           threshold=threshold)
+    server = ScoringHTTPServer((host, port), ScoringRequestHandler)
+    server.batcher = batcher.start()
+    logger.info(f"Scoring service for Run #{RUN_NUMBER} on http://{host}:{server.server_address[1]} "
+                f"(max_batch_size={max_batch_size}, max_wait_ms={max_wait_ms}, threshold={threshold})")
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-batching HTTP scoring service (XGBoost)")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=SERVE_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVE_MAX_WAIT_MS)
+    parser.add_argument("--threshold", type=float, default=PREDICTION_THRESHOLD)
+    parser.add_argument("--models-dir", default=None,
+                        help=f"run directory (default: {MODELS_DIR}/run_{RUN_NUMBER})")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = create_server(host=args.host, port=args.port, models_dir=args.models_dir,
+                           max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms,
+                           threshold=args.threshold)
+    # SIGTERM (เช่น kill / process manager) ปิด service แบบเดียวกับ Ctrl+C - shutdown() ต้องเรียกจาก thread อื่น
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down...")
+    finally:
+        server.server_close()
+        server.batcher.stop()
+        logger.info(f"Final metrics: {json.dumps(server.batcher.metrics.snapshot())}")
@@ -5,13 +5,13 @@ SHAP Analysis Script
 
 import numpy as np
 import pandas as pd
-import pickle
 import matplotlib.pyplot as plt
 import shap
 from pathlib import Path
 
 from logger_config import setup_logger
 from config import MODELS_DIR, PLOTS_DIR, RUN_NUMBER
+from model_artifacts import load_model_artifacts
 
 logger = setup_logger("shap_analysis")
 
@@ -26,20 +26,15 @@ def create_directories():
 
 
 def load_model():
-    """โหลด XGBoost model และ preprocessor"""
+    """โหลด XGBoost model และ preprocessor (native artifacts หรือ .pkl สำหรับ run เก่า)"""
     run_dir = f"run_{RUN_NUMBER}"
     models_dir = Path(MODELS_DIR) / run_dir
     
     logger.info(f"Loading XGBoost model from Run #{RUN_NUMBER}...")
-    with open(models_dir / "xgboost.pkl", 'rb') as f:
-        xgb_model = pickle.load(f)
-    
-    # โหลด XGBoost preprocessor (Label Encoding)
-    with open(models_dir / "preprocessor_xgb.pkl", 'rb') as f:
-        preprocessor = pickle.load(f)
+    artifacts = load_model_artifacts(models_dir)
     
     logger.info("XGBoost model and preprocessor loaded successfully")
-    return xgb_model, preprocessor
+    return artifacts
 
 
 def plot_shap_summary(shap_values, X_test_transformed, feature_names, save_path):
@@ -140,39 +135,26 @@ if __name__ == "__main__":
     plots_dir = create_directories()
     
     # โหลด model
-    xgb_model, preprocessor = load_model()
+    artifacts = load_model()
     
     # โหลดข้อมูล test
     from data_prep import get_prepared_data
     logger.info("Loading test data...")
     X_train, X_val, X_test, y_train, y_val, y_test, _, _ = get_prepared_data()
     
-    # Transform
-    X_test_transformed = preprocessor.transform(X_test)
-    
-    # แปลงเป็น numpy array (SHAP ต้องการ)
-    if hasattr(X_test_transformed, 'toarray'):
-        # Sparse matrix
-        X_test_dense = X_test_transformed.toarray()
-    elif hasattr(X_test_transformed, 'values'):
-        # DataFrame
-        X_test_dense = X_test_transformed.values
-    else:
-        # Already numpy array
-        X_test_dense = np.array(X_test_transformed)
+    # Transform (ได้ numpy array ที่ SHAP ต้องการโดยตรง)
+    X_test_dense = artifacts.transform_xgb(X_test)
     
     logger.info(f"Test data shape: {X_test_dense.shape}")
     logger.info(f"Test data type: {type(X_test_dense)}")
     
-    # ดึง feature names (XGBoost preprocessor ไม่มี encoder, ใช้ชื่อจาก binner)
-    # สำหรับ XGBoost features คือ: CreditScore, Age, Tenure, Balance, Geography, Gender, + binned features
-    feature_names = ['CreditScore', 'Age', 'Tenure', 'Balance', 'Geography', 'Gender', 
-                     'NumOfProducts', 'HasCrCard', 'IsActiveMember', 'EstimatedSalary']
+    # feature names ตามลำดับ columns ของ XGBoost preprocessor
+    feature_names = artifacts.xgb_feature_names
     logger.info(f"Number of features: {len(feature_names)}")
     
     # สร้าง SHAP explainer
     logger.info("Creating SHAP explainer (this may take a while)...")
-    explainer = shap.TreeExplainer(xgb_model)
+    explainer = shap.TreeExplainer(artifacts.booster)
     
     # คำนวณ SHAP values
     logger.info("Calculating SHAP values...")
@@ -193,7 +175,7 @@ if __name__ == "__main__":
                        plots_dir / "shap_waterfall_sample0.png", sample_idx=0)
     
     # 4. Waterfall Plot (sample ที่ทำนายว่า Churn)
-    y_pred = xgb_model.predict(X_test_dense)
+    y_pred = artifacts.predict_xgb(X_test)
     churn_indices = np.where(y_pred == 1)[0]
     if len(churn_indices) > 0:
         churn_idx = churn_indices[0]
@@ -1,23 +1,919 @@
 """
 Test script สำหรับทดสอบ data preparation pipeline
 รันไฟล์นี้เพื่อดู DEBUG logs และตรวจสอบว่าระบบทำงานถูกต้อง
+
+Behavior tests (pytest) ใช้ข้อมูลสังเคราะห์ที่มี schema เดียวกับ Churn_Modelling.csv
+จึงไม่ต้องมีไฟล์ข้อมูลจริง:
+    python -m pytest -q test_pipeline.py
 """
 
-from data_prep import get_prepared_data
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from config import TARGET_COL
+
+
+def make_churn_frame(n_rows=2000, seed=0):
+    """DataFrame สังเคราะห์ที่มีคอลัมน์และช่วงค่าเหมือน Churn_Modelling.csv"""
+    rng = np.random.default_rng(seed)
+    age = rng.integers(18, 90, n_rows)
+    balance = np.where(rng.random(n_rows) < 0.35, 0.0, rng.normal(110_000, 30_000, n_rows).clip(1, 250_000).round(2))
+    is_active = rng.integers(0, 2, n_rows)
+    logit = -2.0 + 0.06 * (age - 40) - 0.8 * is_active + 0.4 * (balance > 0)
+    return pd.DataFrame({
+        "RowNumber": np.arange(1, n_rows + 1),
+        "CustomerId": 15_600_000 + np.arange(n_rows),
+        "Surname": rng.choice(["Smith", "Rossi", "Brown", "Chen"], n_rows),
+        "CreditScore": rng.integers(350, 851, n_rows),
+        "Geography": rng.choice(["France", "Germany", "Spain"], n_rows),
+        "Gender": rng.choice(["Female", "Male"], n_rows),
+        "Age": age,
+        "Tenure": rng.integers(0, 11, n_rows),
+        "Balance": balance,
+        "NumOfProducts": rng.integers(1, 5, n_rows),
+        "HasCrCard": rng.integers(0, 2, n_rows),
+        "IsActiveMember": is_active,
+        "EstimatedSalary": rng.uniform(10, 200_000, n_rows).round(2),
+        TARGET_COL: (rng.random(n_rows) < 1 / (1 + np.exp(-logit))).astype(int),
+    })
+
+
+@pytest.fixture(scope="module")
+def churn_frame():
+    return make_churn_frame()
+
+
+@pytest.fixture(scope="module")
+def features(churn_frame):
+    from config import DROP_COLS
+    return churn_frame.drop(columns=DROP_COLS + [TARGET_COL]), churn_frame[TARGET_COL]
+
+
+def fit_models(X, y, fused_lr_encoder, monkeypatch):
+    """fit preprocessors + LR / XGBoost เล็ก ๆ ด้วย config ของ encoder ที่กำหนด"""
+    import xgboost as xgb
+    from sklearn.linear_model import LogisticRegression
+
+    import data_prep
+    monkeypatch.setattr(data_prep, "USE_FUSED_LR_ENCODER", fused_lr_encoder)
+    preprocessor_lr = data_prep.build_preprocess_pipeline_lr().fit(X)
+    preprocessor_xgb = data_prep.build_preprocess_pipeline_xgb().fit(X)
+    lr_model = LogisticRegression(max_iter=1000).fit(preprocessor_lr.transform(X), y)
+    xgb_model = xgb.XGBClassifier(n_estimators=20, max_depth=3, n_jobs=1).fit(preprocessor_xgb.transform(X), y)
+    return lr_model, xgb_model, preprocessor_lr, preprocessor_xgb
+
+
+@pytest.fixture(scope="module")
+def saved_run(features, tmp_path_factory):
+    """run ที่ train ด้วย config ปกติ (fused LR encoder) และบันทึกผ่าน save_models แล้ว"""
+    from train_models import save_models
+
+    X, y = features
+    models_dir = tmp_path_factory.mktemp("run")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        lr_model, xgb_model, preprocessor_lr, preprocessor_xgb = fit_models(X, y, True, monkeypatch)
+    save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_dir)
+    return models_dir, lr_model, xgb_model, preprocessor_lr, preprocessor_xgb
+
+
+def test_data_cache_invalidates_when_source_changes(churn_frame, tmp_path, monkeypatch):
+    """load_raw_data อ่านจาก cache จนกว่าเนื้อหาไฟล์ CSV จะเปลี่ยน (touch อย่างเดียวไม่ invalidate)"""
+    import os
+
+    import data_prep
+    from data_cache import load_cached_frame
+
+    csv_path = tmp_path / "churn.csv"
+    churn_frame.to_csv(csv_path, index=False)
+    monkeypatch.setattr(data_prep, "DATA_PATH", str(csv_path))
+    monkeypatch.setattr(data_prep, "USE_DATA_CACHE", True)
+    monkeypatch.setattr(data_prep, "DATA_CACHE_DIR", str(tmp_path / "cache"))
+
+    def cached():
+        return load_cached_frame(csv_path, tmp_path / "cache", data_prep._get_cache_schema_key())
+
+    assert cached() is None
+    df = data_prep.load_raw_data()
+    pd.testing.assert_frame_equal(cached(), df)
+
+    # mtime เปลี่ยนแต่เนื้อหาเดิม -> hash ตรง ยังใช้ cache ได้
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    pd.testing.assert_frame_equal(cached(), df)
+
+    # เนื้อหาเปลี่ยนโดยขนาดไฟล์เท่าเดิม -> hash ไม่ตรง ต้อง parse CSV ใหม่
+    text = csv_path.read_text()
+    first_surname = str(churn_frame["Surname"].iloc[0])
+    csv_path.write_text(text.replace(f",{first_surname},", f",{first_surname[::-1]},", 1))
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10**9))  # กัน filesystem ที่ mtime หยาบ
+    assert csv_path.stat().st_size == stat.st_size
+    assert cached() is None
+    reloaded = data_prep.load_raw_data()
+    assert reloaded["Surname"].iloc[0] == first_surname[::-1]
+    pd.testing.assert_frame_equal(cached(), reloaded)
+
+    # เพิ่มแถว -> ขนาดไฟล์เปลี่ยน
+    with open(csv_path, "a") as f:
+        f.write(text.splitlines()[-1] + "\n")
+    assert cached() is None
+    assert len(data_prep.load_raw_data()) == len(churn_frame) + 1
+
+
+def test_load_raw_data_uses_compact_dtypes(churn_frame, tmp_path, monkeypatch, caplog):
+    """ข้อมูลดิบถูกโหลดตาม RAW_DTYPES และคอลัมน์ที่ค่าเกินช่วง dtype คง dtype เดิม (ไม่ overflow เงียบๆ)"""
+    import data_prep
+    from config import RAW_DTYPES
+
+    csv_path = tmp_path / "churn.csv"
+    churn_frame.to_csv(csv_path, index=False)
+    monkeypatch.setattr(data_prep, "DATA_PATH", str(csv_path))
+    monkeypatch.setattr(data_prep, "USE_DATA_CACHE", False)
+
+    df = data_prep.load_raw_data()
+    assert {col: str(df[col].dtype) for col in RAW_DTYPES} == RAW_DTYPES
+    assert df["Balance"].dtype == np.float64  # USE_FLOAT32_MONEY = False
+    pd.testing.assert_frame_equal(df.astype(churn_frame.dtypes.to_dict()), churn_frame)
+
+    # Tenure = 300 เกินช่วง int8 (ถ้า cast ตรงๆ จะกลายเป็น 44) -> คง int64 และ warning
+    churn_frame.assign(Tenure=churn_frame["Tenure"].where(churn_frame.index != 7, 300)).to_csv(csv_path, index=False)
+    with caplog.at_level("WARNING"):
+        df = data_prep.load_raw_data()
+    assert df["Tenure"].dtype == np.int64 and df.loc[7, "Tenure"] == 300
+    assert df["Age"].dtype == np.int16
+    assert "Tenure has values outside int8 range" in caplog.text
+
+    # ค่าที่ไม่ใช่ integer -> คง dtype เดิม
+    frame = pd.DataFrame({"Age": [30.0, 41.5], "Tenure": [1, 2]})
+    with caplog.at_level("WARNING"):
+        downcast = data_prep._downcast_int_columns(frame.copy(), {"Age": "int16", "Tenure": "int8"})
+    assert downcast["Age"].dtype == np.float64 and downcast["Tenure"].dtype == np.int8
+    assert "Column Age is float64, not integer" in caplog.text
+
+
+@pytest.mark.parametrize("level, expect_stats", [("INFO", False), ("DEBUG", True)])
+def test_debug_statistics_only_computed_when_debug_enabled(churn_frame, tmp_path, monkeypatch, caplog, level,
+                                                          expect_stats):
+    """value_counts / memory_usage ที่สแกนทั้งคอลัมน์เพื่อ log DEBUG ไม่ถูกเรียกเลยเมื่อ logger อยู่ที่ INFO"""
+    import data_prep
+    import feature_binning
+
+    csv_path = tmp_path / "churn.csv"
+    churn_frame.to_csv(csv_path, index=False)
+    monkeypatch.setattr(data_prep, "DATA_PATH", str(csv_path))
+    monkeypatch.setattr(data_prep, "USE_DATA_CACHE", False)
+    for name in ("data_prep", "feature_binning"):
+        caplog.set_level(level, logger=name)
+
+    stat_calls = []
+    for cls, method in [(pd.Series, "value_counts"), (pd.DataFrame, "memory_usage")]:
+        original = getattr(cls, method)
+        monkeypatch.setattr(cls, method, lambda self, *args, _f=original, **kwargs:
+                            stat_calls.append(1) or _f(self, *args, **kwargs))
+
+    df = data_prep.load_raw_data()
+    X_train, *_ = data_prep.train_val_test_split(df, data_prep.compute_split_indices(df[TARGET_COL]))
+    for binner_cls in (feature_binning.FixedBinnerForLR, feature_binning.FixedBinnerForXGBoost):
+        for engine in ("pandas", "numpy"):
+            binner_cls(engine=engine).fit(X_train).transform(X_train)
+    assert bool(stat_calls) == expect_stats
+
+
+def test_iter_raw_data_chunks_streams_whole_file(churn_frame, tmp_path):
+    """อ่านทีละ chunk ได้ทุกแถวครบตามลำดับ (index ต่อเนื่อง) เหมือนอ่านทั้งไฟล์ และตรวจคอลัมน์ทุก chunk"""
+    from config import CATEGORICAL_COLS
+    from data_prep import iter_raw_data_chunks
+
+    csv_path = tmp_path / "churn.csv"
+    churn_frame.to_csv(csv_path, index=False)
+
+    chunks = list(iter_raw_data_chunks(chunk_size=300, data_path=csv_path, usecols_only=False))
+    assert [len(chunk) for chunk in chunks] == [300] * 6 + [200]
+    streamed = pd.concat(chunks)
+    pd.testing.assert_index_equal(streamed.index, pd.RangeIndex(len(churn_frame)))
+    # categories ของแต่ละ chunk อาจต่างกัน -> เทียบค่าเป็น string
+    streamed = streamed.astype({col: str for col in CATEGORICAL_COLS})
+    pd.testing.assert_frame_equal(streamed, churn_frame.astype({col: str for col in CATEGORICAL_COLS}),
+                                  check_dtype=False)
+
+    # usecols_only: parse เฉพาะคอลัมน์ที่ต้องการ + optional ที่มีในไฟล์
+    first = next(iter_raw_data_chunks(chunk_size=100, data_path=csv_path, required_cols=["Age", "Geography"],
+                                      optional_cols=["CustomerId", "NotInFile"]))
+    assert set(first.columns) == {"Age", "Geography", "CustomerId"}
+
+    with pytest.raises(ValueError, match="Missing required columns"):
+        next(iter_raw_data_chunks(chunk_size=100, data_path=csv_path, required_cols=["Age", "NotInFile"]))
+    with pytest.raises(ValueError, match="chunk_size"):
+        next(iter_raw_data_chunks(chunk_size=0, data_path=csv_path))
+    (tmp_path / "empty.csv").write_text("")
+    with pytest.raises(ValueError, match="empty"):
+        next(iter_raw_data_chunks(chunk_size=100, data_path=tmp_path / "empty.csv"))
+
+
+def test_data_cache_keeps_same_named_files_apart(churn_frame, tmp_path):
+    """ไฟล์ชื่อเดียวกันจากคนละโฟลเดอร์ที่ใช้ cache_dir ร่วมกันมี cache แยกกัน"""
+    from data_cache import load_cached_frame, save_cached_frame
+
+    cache_dir = tmp_path / "cache"
+    frames = {"a": churn_frame.head(100), "b": churn_frame.tail(50)}
+    for name, frame in frames.items():
+        (tmp_path / name).mkdir()
+        frame.to_csv(tmp_path / name / "churn.csv", index=False)
+        save_cached_frame(frame.reset_index(drop=True), tmp_path / name / "churn.csv", cache_dir, "schema")
+
+    for name, frame in frames.items():
+        pd.testing.assert_frame_equal(load_cached_frame(tmp_path / name / "churn.csv", cache_dir, "schema"),
+                                      frame.reset_index(drop=True))
+
+
+def test_split_indices_round_trip(features, tmp_path, monkeypatch):
+    """split ถูกบันทึกเฉพาะเมื่อ save=True, โหลดกลับได้ตรงกัน และถูกคำนวณใหม่เมื่อ config เปลี่ยน"""
+    import data_prep
+    from config import SPLIT_INDICES_FILE
+    from data_cache import load_split_indices, save_split_indices
+
+    _, y = features
+    monkeypatch.setattr(data_prep, "USE_CACHED_SPLITS", True)
+    path = tmp_path / SPLIT_INDICES_FILE
+    expected = data_prep.compute_split_indices(y)
+
+    # consumers ที่อ่านอย่างเดียว (save=False) ไม่เขียนไฟล์
+    indices = data_prep.get_split_indices(y, run_dir=tmp_path)
+    assert not path.exists()
+    assert indices.keys() == expected.keys()
+
+    data_prep.get_split_indices(y, run_dir=tmp_path, save=True)
+    loaded = load_split_indices(path, data_prep._split_meta(y))
+    for key, value in expected.items():
+        np.testing.assert_array_equal(loaded[key], value)
+        assert loaded[key].dtype == value.dtype
+    parts = np.concatenate([loaded["train"], loaded["val"], loaded["test"]])
+    np.testing.assert_array_equal(np.sort(parts), np.arange(len(y)))
+    assert len(loaded["cv_fold"]) == len(loaded["train"])
+
+    # split ที่บันทึกไว้ถูกใช้แทนการคำนวณใหม่ ตราบใดที่ meta ยังตรง
+    saved = {key: value[::-1].copy() for key, value in expected.items()}
+    save_split_indices(path, saved, data_prep._split_meta(y))
+    np.testing.assert_array_equal(data_prep.get_split_indices(y, run_dir=tmp_path)["train"], saved["train"])
+
+    # config เปลี่ยน -> split เดิม stale: คำนวณใหม่และไม่เขียนทับไฟล์ถ้า save=False
+    monkeypatch.setattr(data_prep, "RANDOM_STATE", data_prep.RANDOM_STATE + 1)
+    resplit = data_prep.get_split_indices(y, run_dir=tmp_path)
+    np.testing.assert_array_equal(resplit["train"], data_prep.compute_split_indices(y)["train"])
+    assert load_split_indices(path, data_prep._split_meta(y)) is None
+
+
+@pytest.mark.filterwarnings("error::DeprecationWarning")  # Categorical จากค่าที่ไม่อยู่ใน categories จะ error ใน pandas 4
+@pytest.mark.parametrize("binner_cls", ["FixedBinnerForLR", "FixedBinnerForXGBoost"])
+def test_binning_engines_match(features, binner_cls):
+    """engine="numpy" ให้ผลเหมือน engine="pandas" ทั้งค่าบน bin edges, categories ที่ไม่รู้จัก และ errors"""
+    import feature_binning
+    from binning_core import FIXED_BINS
+
+    X, _ = features
+    binner_type = getattr(feature_binning, binner_cls)
+    pandas_binner = binner_type(engine="pandas").fit(X)
+    numpy_binner = binner_type(engine="numpy").fit(X)
+
+    # ค่าที่อยู่บน edges พอดี (ช่วง (a, b]) และ edges ของ Balance ที่เรียนรู้มา
+    edge_rows = X.iloc[:1].copy().loc[[X.index[0]] * 8].reset_index(drop=True)
+    for col, edges in FIXED_BINS:
+        inner = [edge for edge in edges[1:-1] if edge >= X[col].min()]
+        edge_rows[col] = (inner * 8)[:8]
+    edge_rows["Balance"] = (pandas_binner.balance_edges_[:-1] * 8)[:8]
+    edge_rows["Geography"] = ["Italy"] + edge_rows["Geography"].tolist()[1:]
+    X_test = pd.concat([X, edge_rows.astype(X.dtypes.to_dict())], ignore_index=True)
+
+    # numpy engine เก็บ codes เป็น int8 ส่วน pandas engine เป็น int64 - ค่าต้องเหมือนกัน
+    pd.testing.assert_frame_equal(numpy_binner.transform(X_test), pandas_binner.transform(X_test), check_dtype=False)
+
+    # ค่านอกช่วง bins ต้อง error ทั้งสอง engine (pandas engine ของ XGBoost ล้มตอน astype(int) จึงไม่มีชื่อคอลัมน์)
+    invalid = X.head(3).assign(Age=[25, -5, 40])
+    with pytest.raises(ValueError):
+        pandas_binner.transform(invalid)
+    with pytest.raises(ValueError, match="Age"):
+        numpy_binner.transform(invalid)
+
+
+@pytest.mark.parametrize("engine", ["pandas", "numpy"])
+@pytest.mark.parametrize("binner_cls", ["FixedBinnerForLR", "FixedBinnerForXGBoost"])
+def test_copy_free_transform_leaves_input_untouched(features, binner_cls, engine):
+    """copy=False ให้ผลเหมือน copy=True และไม่แก้ไข DataFrame ที่ส่งเข้ามา (รวมถึงตอนแก้ output ภายหลัง)"""
+    import feature_binning
+
+    X, _ = features
+    binner_type = getattr(feature_binning, binner_cls)
+    # ทั้ง categorical แบบ object และแบบ category (จาก RAW_DTYPES)
+    for X_in in (X.copy(), X.astype({"Geography": "category", "Gender": "category"})):
+        snapshot = X_in.copy(deep=True)
+        copied = binner_type(engine=engine, copy=True).fit(X_in).transform(X_in)
+        shared = binner_type(engine=engine, copy=False).fit(X_in).transform(X_in)
+        pd.testing.assert_frame_equal(shared, copied)
+        pd.testing.assert_frame_equal(X_in, snapshot)
+
+        for col in shared.columns:
+            shared.loc[shared.index[0], col] = shared[col].iloc[1]
+        pd.testing.assert_frame_equal(X_in, snapshot)
+
+
+def test_shared_binner_matches_separate_preprocessors(features, monkeypatch):
+    """SharedBinner ให้ผลเหมือน preprocessor_lr / preprocessor_xgb ที่ fit แยกกัน และ fit_transform bin ครั้งเดียว"""
+    import data_prep
+    import feature_binning
+
+    X, _ = features
+    X_train, X_new = X.iloc[:1500], X.iloc[1500:]
+    separate_lr = data_prep.build_preprocess_pipeline_lr().fit(X_train)
+    separate_xgb = data_prep.build_preprocess_pipeline_xgb().fit(X_train)
+    preprocessor_lr = data_prep.build_preprocess_pipeline_lr()
+    preprocessor_xgb = data_prep.build_preprocess_pipeline_xgb()
+    shared = data_prep.build_shared_binner(preprocessor_lr, preprocessor_xgb)
+
+    n_binning_passes = []
+    numeric_bin_codes = feature_binning._numeric_bin_codes
+    monkeypatch.setattr(feature_binning, "_numeric_bin_codes",
+                        lambda *args: n_binning_passes.append(1) or numeric_bin_codes(*args))
+    train_lr, train_xgb = shared.fit_transform(X_train)
+    assert len(n_binning_passes) == 1
+
+    for data, (X_lr, X_xgb) in [(X_train, (train_lr, train_xgb)), (X_new, shared.transform(X_new))]:
+        np.testing.assert_array_equal(X_lr.toarray(), separate_lr.transform(data).toarray())
+        pd.testing.assert_frame_equal(X_xgb, separate_xgb.transform(data))
+        # pipelines ที่ fit ผ่าน SharedBinner ใช้แยกกันได้ตามปกติ
+        np.testing.assert_array_equal(preprocessor_lr.transform(data).toarray(), X_lr.toarray())
+        pd.testing.assert_frame_equal(preprocessor_xgb.transform(data), X_xgb)
+    assert list(preprocessor_lr[-1].get_feature_names_out()) == list(separate_lr[-1].get_feature_names_out())
+
+
+def test_xgb_binner_codes_do_not_overflow(features):
+    """categorical ที่มีเกิน 127 ค่าต้องไม่ล้น int8 ของ numpy engine (codes เหมือน pandas engine)"""
+    from feature_binning import FixedBinnerForXGBoost
+
+    X, _ = features
+    X = X.assign(Geography=[f"Region{i % 300:03d}" for i in range(len(X))])
+    pandas_binner = FixedBinnerForXGBoost(engine="pandas").fit(X)
+    numpy_binner = FixedBinnerForXGBoost(engine="numpy").fit(X)
+
+    encoded = numpy_binner.transform(X)
+    assert encoded["Geography"].min() == 0 and encoded["Geography"].max() == 299
+    assert encoded["Age"].dtype == encoded["Geography"].dtype == np.int16
+    pd.testing.assert_frame_equal(encoded, pandas_binner.transform(X), check_dtype=False)
+
+
+def test_fused_lr_encoder_matches_onehot_pipeline(features, tmp_path, monkeypatch):
+    """FusedBinnerEncoderForLR ได้ features / matrix เดียวกับ FixedBinnerForLR + OneHotEncoder
+    รวมถึงค่าว่างใน Geography / Gender (OneHotEncoder เก็บ NaN เป็น category สุดท้าย)"""
+    import xgboost as xgb
+    from sklearn.base import clone
+    from sklearn.linear_model import LogisticRegression
+
+    import data_prep
+    from feature_binning import FusedBinnerEncoderForLR
+    from model_artifacts import load_model_artifacts
+    from train_models import save_models
+
+    X, y = features
+    X = X.copy()
+    X.loc[X.index[[1, 2, 1700]], "Geography"] = np.nan
+    X.loc[X.index[[3, 1800]], "Gender"] = np.nan
+    X_train, X_new = X.iloc[:1500], X.iloc[1500:].copy()
+    X_new.loc[X_new.index[0], "Geography"] = "Italy"  # ไม่เคยเห็นตอน fit
+
+    preprocessors = {}
+    for fused in (True, False):
+        monkeypatch.setattr(data_prep, "USE_FUSED_LR_ENCODER", fused)
+        preprocessors[fused] = data_prep.build_preprocess_pipeline_lr().fit(X_train)
+    fused, unfused = preprocessors[True], preprocessors[False]
+    assert list(fused[-1].get_feature_names_out()) == list(unfused[-1].get_feature_names_out())
+    assert "cat__Geography_nan" in set(fused[-1].get_feature_names_out())
+    np.testing.assert_array_equal(fused.transform(X_new).toarray(), unfused.transform(X_new).toarray())
+
+    encoder = fused[-1]
+    for i in [200, 300, 0]:  # Geography ว่าง, Gender ว่าง, Geography ที่ไม่รู้จัก
+        record = X_new.iloc[i].to_dict()
+        np.testing.assert_array_equal(encoder.transform_one(record), encoder.transform(X_new.iloc[[i]]).indices)
+
+    # native artifacts (preprocessor.json) encode ค่าว่างแบบเดียวกัน
+    lr_model = LogisticRegression(max_iter=1000).fit(fused.transform(X_train), y.iloc[:1500])
+    X_complete = X_train.dropna()
+    preprocessor_xgb = data_prep.build_preprocess_pipeline_xgb().fit(X_complete)
+    xgb_model = xgb.XGBClassifier(n_estimators=5, n_jobs=1).fit(
+        preprocessor_xgb.transform(X_complete), y.loc[X_complete.index])
+    save_models(lr_model, xgb_model, fused, preprocessor_xgb, tmp_path)
+    artifacts = load_model_artifacts(tmp_path)
+    expected = lr_model.predict_proba(fused.transform(X_new))[:, 1]
+    np.testing.assert_allclose(artifacts.predict_proba_lr(X_new), expected, rtol=0, atol=1e-12)
+    for i in [200, 300]:
+        record = {**X_new.iloc[i].to_dict(), "Geography": None} if i == 200 else X_new.iloc[i].to_dict()
+        assert artifacts.predict_proba_lr_one(record) == pytest.approx(expected[i], abs=1e-12)
+
+    # engine / copy เป็น params ของ sklearn (get_params / clone / set_params)
+    params = clone(encoder).get_params()
+    assert params["engine"] == "numpy" and params["copy"] is False
+    with pytest.raises(ValueError, match="Unsupported binning engine"):
+        FusedBinnerEncoderForLR().set_params(engine="pandas").fit(X_train)
+
+
+@pytest.mark.parametrize("k, max_rank_error", [(200, 0.02), (2000, 0.002)])
+def test_kll_sketch_rank_error_bound(k, max_rank_error):
+    """rank error ของ quantiles อยู่ในขอบเขตที่ docstring ของ quantile_sketch ระบุ ทั้งแบบ update ทีละ chunk และ merge"""
+    from quantile_sketch import KLLSketch
+
+    qs = np.linspace(0.01, 0.99, 99)
+
+    def rank_error(sorted_data, estimates):
+        # ค่าที่ซ้ำกัน (เช่น Balance = 0) ครอบคลุมช่วง rank [lo, hi] - นับ error เฉพาะส่วนที่อยู่นอกช่วงนั้น
+        lo = np.searchsorted(sorted_data, estimates, side="left") / len(sorted_data)
+        hi = np.searchsorted(sorted_data, estimates, side="right") / len(sorted_data)
+        return np.maximum(0, np.maximum(lo - qs, qs - hi)).max()
+
+    for seed in range(3):
+        rng = np.random.default_rng(seed)
+        data = np.where(rng.random(200_000) < 0.35, 0.0, rng.lognormal(11, 0.5, 200_000))
+        sorted_data = np.sort(data)
+
+        streamed = KLLSketch(k=k, seed=seed)
+        for chunk in np.array_split(data, 10):
+            streamed.update(chunk)
+        merged = KLLSketch(k=k, seed=seed)
+        for i, chunk in enumerate(np.array_split(data, 4)):
+            merged.merge(KLLSketch(k=k, seed=seed + 100 + i).update(chunk))
+
+        for sketch in (streamed, merged):
+            assert sketch.n == len(data)
+            assert sketch.n_retained < 2 * k  # memory O(k) ไม่ขึ้นกับจำนวนแถว
+            assert rank_error(sorted_data, sketch.quantiles(qs)) <= max_rank_error
+            assert sketch.quantile(0) == data.min() and sketch.quantile(1) == data.max()
+
+    # ยังไม่เคย compact -> exact เหมือน pandas Series.quantile
+    small = rng.normal(size=k)
+    np.testing.assert_allclose(KLLSketch(k=k).update(small).quantiles([0.25, 0.5, 0.75]),
+                               pd.Series(small).quantile([0.25, 0.5, 0.75]).to_numpy())
+
+
+def test_parallel_transform_preserves_row_order(features, saved_run):
+    """ParallelTransformer ต่อผลของ blocks ตามลำดับแถวเดิม ทั้ง DataFrame และ CSR output"""
+    from parallel_transform import ParallelTransformer
+
+    X, _ = features
+    _, _, _, preprocessor_lr, preprocessor_xgb = saved_run
+    X = X.sample(frac=1.0, random_state=0)  # index ไม่เรียง - ต้องคงไว้ตามเดิม
+    for preprocessor in (preprocessor_xgb, preprocessor_lr):
+        expected = preprocessor.transform(X)
+        with ParallelTransformer(preprocessor, n_jobs=2, block_size=300) as parallel:
+            result = parallel.transform(X)
+            assert parallel._executor is not None  # ใช้ process pool จริง ไม่ใช่ fallback ใน process
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(result, expected)
+        else:
+            assert result.format == expected.format
+            assert (result != expected).nnz == 0
+
+
+@pytest.mark.parametrize("n_cpus", [-1, 1, 2, 3, 8, 64])
+@pytest.mark.parametrize("cv_n_jobs", [1, 2, -1, -2, None])
+@pytest.mark.parametrize("parallel_models", [False, True])
+def test_thread_budget_never_oversubscribes(monkeypatch, n_cpus, cv_n_jobs, parallel_models):
+    """threads ที่รันพร้อมกัน (CV folds x XGBoost threads + LR jobs ถ้า train คู่กัน) ไม่เกินจำนวน cores"""
+    import os
+
+    from train_models import get_thread_budget
+
+    for machine_cpus in [1, 2, 4, 16]:
+        monkeypatch.setattr(os, "cpu_count", lambda: machine_cpus)
+        budget = get_thread_budget(n_cpus=n_cpus, cv_n_jobs=cv_n_jobs, parallel_models=parallel_models, n_folds=5)
+        xgb_threads = budget["xgb_cv_jobs"] * budget["xgb_threads"]
+        assert 1 <= budget["lr_cv_jobs"] <= 5 and 1 <= budget["xgb_cv_jobs"] <= 5 and budget["xgb_threads"] >= 1
+        if budget["parallel_models"]:
+            assert xgb_threads + budget["lr_cv_jobs"] <= machine_cpus
+        else:
+            assert xgb_threads <= machine_cpus and budget["lr_cv_jobs"] <= machine_cpus
+        assert budget["parallel_models"] == (parallel_models and min(machine_cpus, n_cpus if n_cpus > 0 else machine_cpus) > 1)
+
+
+def test_stage_profiler_records_nested_stages(tmp_path, monkeypatch):
+    """stages ซ้อนกันได้ (depth / ลำดับ / peak ของ stage นอกครอบ stage ใน) และ profile_stage ไม่ทำอะไรถ้าไม่มี profiler"""
+    import json
+    import time
+
+    import run_profiler
+    from run_profiler import StageProfiler, profile_stage
+
+    monkeypatch.setattr(run_profiler, "_active_profiler", None)
+    with profile_stage("ignored") as record:
+        assert record is None
+
+    profiler = StageProfiler().activate()
+    with profile_stage("outer"):
+        with profile_stage("inner.alloc"):
+            block = np.ones(32 * 1024 * 1024 // 8)  # 32 MB
+            del block
+        with pytest.raises(RuntimeError), profile_stage("inner.failed"):
+            time.sleep(0.01)
+            raise RuntimeError("stage ที่ error ยังต้องถูกบันทึก")
+    with profile_stage("after"):
+        pass
+    profiler.add_records([{"name": "lr.fit", "depth": 0, "wall_s": 0.5, "cpu_s": 0.5, "peak_rss_mb": 1.0}], "lr")
+
+    report = profiler.save(tmp_path / "run_profile.json", run_number=1)
+    assert json.loads((tmp_path / "run_profile.json").read_text())["stages"] == report["stages"]
+    stages = {record["name"]: record for record in report["stages"]}
+    assert list(stages) == ["outer", "inner.alloc", "inner.failed", "after", "lr.fit"]
+    assert [record["depth"] for record in report["stages"]] == [0, 1, 1, 0, 0]
+    assert [record["process"] for record in report["stages"]] == ["main"] * 4 + ["lr"]
+    assert stages["inner.failed"]["wall_s"] >= 0.01
+    assert stages["outer"]["wall_s"] >= stages["inner.alloc"]["wall_s"] + stages["inner.failed"]["wall_s"]
+    assert stages["outer"]["peak_rss_mb"] >= stages["inner.alloc"]["peak_rss_mb"]
+    assert report["total"]["peak_rss_mb"] >= stages["outer"]["peak_rss_mb"]
+    if report["peak_rss_scope"] == "stage":
+        assert stages["inner.alloc"]["peak_rss_mb"] >= stages["after"]["peak_rss_mb"] + 16
+
+
+@pytest.fixture(scope="module")
+def xgb_splits(features):
+    """train / val / test ที่ผ่าน preprocessor ของ XGBoost แล้ว (ตามลำดับที่ train_xgboost รับ)"""
+    from data_prep import build_preprocess_pipeline_xgb
+
+    X, y = features
+    X_xgb = build_preprocess_pipeline_xgb().fit(X).transform(X)
+    y = y.to_numpy()
+    train, val, test = slice(0, 1200), slice(1200, 1600), slice(1600, None)
+    return (X_xgb.iloc[train], y[train], X_xgb.iloc[val], y[val], X_xgb.iloc[test], y[test])
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+@pytest.mark.parametrize("early_stopping_rounds", [None, 3])
+def test_fit_xgb_from_matrix_matches_classifier_fit(xgb_splits, weighted, early_stopping_rounds):
+    """train จาก QuantileDMatrix ที่สร้างไว้แล้วได้ model เดียวกับ XGBClassifier.fit บนข้อมูลชุดเดียวกัน"""
+    import xgboost as xgb
+
+    from train_models import build_xgb_train_matrix, fit_xgb_from_matrix
+
+    X_train, y_train, X_val, y_val, X_test, _ = xgb_splits
+    sample_weight = np.where(y_train == 1, 3.0, 1.0) if weighted else None
+    params = dict(n_estimators=30, max_depth=3, learning_rate=0.3, subsample=0.8, random_state=42,
+                  eval_metric="logloss", n_jobs=1)
+
+    expected = xgb.XGBClassifier(**params, early_stopping_rounds=early_stopping_rounds)
+    expected.fit(X_train, y_train, sample_weight=sample_weight,
+                 eval_set=[(X_val, y_val)] if early_stopping_rounds else None, verbose=False)
+
+    _, dtrain = build_xgb_train_matrix(X_train, y_train, sample_weight, n_jobs=1)
+    dval = xgb.QuantileDMatrix(X_val.to_numpy(dtype=np.float32), label=y_val, ref=dtrain,
+                               feature_names=list(X_val.columns))
+    model = fit_xgb_from_matrix(xgb.XGBClassifier(**params), dtrain, dval=dval,
+                                early_stopping_rounds=early_stopping_rounds)
+
+    if early_stopping_rounds:
+        assert model.get_booster().num_boosted_rounds() == expected.best_iteration + 1 < params["n_estimators"]
+    np.testing.assert_allclose(model.predict_proba(X_test), expected.predict_proba(X_test), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("reuse_dmatrix", [True, False])
+def test_early_stopping_saves_truncated_model(features, xgb_splits, tmp_path, monkeypatch, reuse_dmatrix):
+    """early stopping: model ที่บันทึก (.pkl, xgboost.ubj, compiled trees) เหลือ best_iteration + 1 trees
+    และ best_iteration ถูกเขียนลง run_info.txt"""
+    import xgboost as xgb
+
+    import train_models
+    from model_artifacts import load_model_artifacts
+    from xgb_compiler import load_compiled_trees
+
+    monkeypatch.setattr(train_models, "XGB_REUSE_DMATRIX", reuse_dmatrix)
+    monkeypatch.setattr(train_models, "XGB_LEARNING_RATE", 1.0)  # overfit เร็ว -> early stopping หยุดก่อนครบ rounds
+    X_train, y_train, X_val, y_val, X_test, y_test = xgb_splits
+    xgb_model, *_ = train_models.train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test,
+                                               early_stopping_rounds=2)
+    best_iteration = train_models.get_best_iteration(xgb_model)
+    assert best_iteration is not None and best_iteration + 1 < train_models.XGB_N_ESTIMATORS
+    assert xgb_model.get_booster().num_boosted_rounds() == best_iteration + 1
+
+    X, y = features
+    lr_model, _, preprocessor_lr, preprocessor_xgb = fit_models(X, y, True, monkeypatch)
+    train_models.save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, tmp_path)
+
+    assert f"best_iteration = {best_iteration} ({best_iteration + 1} trees)" in (tmp_path / "run_info.txt").read_text()
+    with open(tmp_path / "xgboost.pkl", "rb") as f:
+        assert pickle.load(f).get_booster().num_boosted_rounds() == best_iteration + 1
+    native = xgb.Booster(model_file=str(tmp_path / "xgboost.ubj"))
+    assert native.num_boosted_rounds() == best_iteration + 1
+    assert native.attr("best_iteration") == str(best_iteration)
+    assert load_compiled_trees(tmp_path).n_trees == best_iteration + 1
+
+    expected = xgb_model.predict_proba(X_test)[:, 1]
+    artifacts = load_model_artifacts(tmp_path)
+    np.testing.assert_allclose(artifacts.predict_proba_xgb(X.iloc[1600:]), expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("reuse_dmatrix", [True, False])
+def test_incremental_xgb_keeps_new_trees(xgb_splits, monkeypatch, reuse_dmatrix):
+    """boost ต่อจาก run ที่ใช้ early stopping ต้องไม่ถูกตัดกลับด้วย best_iteration ของ run เดิม"""
+    import train_models
+    from config import INCREMENTAL_XGB_N_ESTIMATORS
+
+    monkeypatch.setattr(train_models, "XGB_REUSE_DMATRIX", reuse_dmatrix)
+    monkeypatch.setattr(train_models, "XGB_LEARNING_RATE", 1.0)  # overfit เร็ว -> early stopping หยุดก่อนครบ rounds
+    X_train, y_train, X_val, y_val, X_test, y_test = xgb_splits
+
+    previous, *_ = train_models.train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test,
+                                              early_stopping_rounds=3)
+    previous_rounds = previous.get_booster().num_boosted_rounds()
+    assert train_models.get_best_iteration(previous) == previous_rounds - 1
+    assert previous_rounds < train_models.XGB_N_ESTIMATORS
+
+    continued, *_ = train_models.train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test,
+                                               early_stopping_rounds=None, init_model=previous)
+    assert continued.get_booster().num_boosted_rounds() == previous_rounds + INCREMENTAL_XGB_N_ESTIMATORS
+    assert train_models.get_best_iteration(continued) is None
+    assert train_models.get_best_iteration(previous) == previous_rounds - 1  # model เดิมไม่ถูกแก้
+
+    # early stopping ของ run ที่ boost ต่อ: best_iteration ต้องมาจาก rounds ของ run นี้
+    stopped, *_ = train_models.train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test,
+                                             early_stopping_rounds=3, init_model=previous)
+    best_iteration = train_models.get_best_iteration(stopped)
+    assert best_iteration >= previous_rounds
+    assert stopped.get_booster().num_boosted_rounds() == best_iteration + 1
+
+
+@pytest.mark.parametrize("fused_lr_encoder", [True, False])
+def test_native_artifacts_match_pickles(features, tmp_path, monkeypatch, fused_lr_encoder):
+    """save_models ทำงานได้กับ LR encoder ทั้ง 2 แบบ และ native artifacts ให้ผลเหมือน .pkl"""
+    from model_artifacts import load_model_artifacts
+    from train_models import save_models
+
+    X, y = features
+    lr_model, xgb_model, preprocessor_lr, preprocessor_xgb = fit_models(X, y, fused_lr_encoder, monkeypatch)
+    save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, tmp_path)
+
+    expected_lr = lr_model.predict_proba(preprocessor_lr.transform(X))[:, 1]
+    expected_xgb = xgb_model.predict_proba(preprocessor_xgb.transform(X))[:, 1]
+    artifacts = load_model_artifacts(tmp_path)
+    assert (artifacts.preprocessor_spec["lr"] is not None) == fused_lr_encoder
+    np.testing.assert_allclose(artifacts.predict_proba_lr(X), expected_lr, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(artifacts.predict_proba_xgb(X), expected_xgb, rtol=0, atol=1e-6)
+    assert list(artifacts.lr_feature_names) == [str(name) for name in preprocessor_lr[-1].get_feature_names_out()]
+
+    record = X.iloc[0].to_dict()
+    assert artifacts.predict_proba_lr_one(record) == pytest.approx(expected_lr[0], abs=1e-12)
+    assert artifacts.predict_proba_xgb_one(record) == pytest.approx(expected_xgb[0], abs=1e-6)
+
+
+def test_native_artifacts_load_without_sklearn(features, saved_run, tmp_path):
+    """ใน process ใหม่: load_model_artifacts + predict (LR และ XGBoost ผ่าน compiled trees)
+    ได้ผลเหมือน models เดิม โดยไม่มีการ import sklearn หรือ xgboost"""
+    import json
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    models_dir, lr_model, xgb_model, preprocessor_lr, preprocessor_xgb = saved_run
+    X, _ = features
+    X.to_csv(tmp_path / "X.csv", index=False)
+    script = (
+        "import json, sys\n"
+        "import pandas as pd\n"
+        "from model_artifacts import load_model_artifacts\n"
+        "artifacts = load_model_artifacts(sys.argv[1])\n"
+        "X = pd.read_csv(sys.argv[2])\n"
+        "record = X.iloc[0].to_dict()\n"
+        "result = {'lr': artifacts.predict_proba_lr(X).tolist(), 'xgb': artifacts.predict_proba_xgb(X).tolist(),\n"
+        "          'lr_one': artifacts.predict_proba_lr_one(record),\n"
+        "          'xgb_one': artifacts.predict_proba_xgb_one(record),\n"
+        "          'imported': sorted({m.split('.')[0] for m in sys.modules} & {'sklearn', 'xgboost', 'scipy'})}\n"
+        "print(json.dumps(result))\n"
+    )
+    completed = subprocess.run([sys.executable, "-c", script, str(models_dir), str(tmp_path / "X.csv")],
+                               cwd=Path(__file__).parent, capture_output=True, text=True, check=True)
+    result = json.loads(completed.stdout.splitlines()[-1])
+
+    assert result["imported"] == []
+    expected_lr = lr_model.predict_proba(preprocessor_lr.transform(X))[:, 1]
+    expected_xgb = xgb_model.predict_proba(preprocessor_xgb.transform(X))[:, 1]
+    np.testing.assert_allclose(result["lr"], expected_lr, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(result["xgb"], expected_xgb, rtol=0, atol=1e-6)
+    assert result["lr_one"] == pytest.approx(expected_lr[0], abs=1e-12)
+    assert result["xgb_one"] == pytest.approx(expected_xgb[0], abs=1e-6)
+
+
+def test_pickle_only_run_falls_back(features, tmp_path, monkeypatch):
+    """run ที่มีแต่ .pkl (train ก่อนมี native artifacts) ยังโหลดผ่าน load_model_artifacts ได้"""
+    from model_artifacts import load_model_artifacts
+
+    X, y = features
+    lr_model, xgb_model, preprocessor_lr, preprocessor_xgb = fit_models(X, y, False, monkeypatch)
+    for name, obj in [("logistic_regression", lr_model), ("xgboost", xgb_model),
+                      ("preprocessor_lr", preprocessor_lr), ("preprocessor_xgb", preprocessor_xgb)]:
+        with open(tmp_path / f"{name}.pkl", "wb") as f:
+            pickle.dump(obj, f)
+
+    artifacts = load_model_artifacts(tmp_path)
+    np.testing.assert_allclose(artifacts.predict_proba_lr(X),
+                               lr_model.predict_proba(preprocessor_lr.transform(X))[:, 1], rtol=0, atol=1e-12)
+    np.testing.assert_allclose(artifacts.predict_proba_xgb(X),
+                               xgb_model.predict_proba(preprocessor_xgb.transform(X))[:, 1], rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("max_depth", [3, 7])
+@pytest.mark.parametrize("with_nan", [False, True])
+def test_compiled_trees_match_booster(max_depth, with_nan):
+    """CompiledTrees (lookup table: depth <= 4, level walk: ลึกกว่า) ให้ผลเหมือน Booster.inplace_predict"""
+    import xgboost as xgb
+    from xgb_compiler import LOOKUP_MAX_DEPTH, compile_booster
+
+    rng = np.random.default_rng(max_depth)
+    X = rng.normal(size=(5000, 8)).astype(np.float32)
+    y = (X[:, 0] + X[:, 1] ** 2 + rng.normal(size=len(X)) > 1).astype(int)
+    if with_nan:
+        X[rng.random(X.shape) < 0.1] = np.nan
+    booster = xgb.train({"max_depth": max_depth, "objective": "binary:logistic", "nthread": 1},
+                        xgb.DMatrix(X, label=y), num_boost_round=50)
+
+    compiled = compile_booster(booster)
+    assert (compiled._key_weights is not None) == (compiled.depth <= LOOKUP_MAX_DEPTH)
+    # leaf values และลำดับการบวกเหมือน XGBoost - base margin อาจต่างได้ 1 ulp (ดู docstring ของ xgb_compiler)
+    np.testing.assert_allclose(compiled.predict_margin(X), booster.inplace_predict(X, predict_type="margin"),
+                               rtol=0, atol=2e-6)
+    np.testing.assert_allclose(compiled.predict_proba(X), booster.inplace_predict(X), rtol=0, atol=1e-6)
+
+
+def test_lr_score_table_matches_predict_proba(features, saved_run):
+    """score table lookup ให้ P(churn) เหมือน LogisticRegression.predict_proba ทั้งแบบ batch และทีละราย"""
+    from lr_tables import LRScoreTable, load_lr_score_table
+
+    X, _ = features
+    X = pd.concat([X, X.head(3).assign(Geography="Italy")], ignore_index=True)  # category ที่ไม่เคยเห็นตอน fit
+    models_dir, lr_model, _, preprocessor_lr, _ = saved_run
+    table = load_lr_score_table(models_dir, threshold=0.3)
+    expected = lr_model.predict_proba(preprocessor_lr.transform(X))[:, 1]
+
+    np.testing.assert_allclose(table.predict_proba(X), expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(table.predict(X), (expected >= 0.3).astype(int))
+    for i in [0, 1, len(X) - 1]:
+        record = X.iloc[i].to_dict()
+        assert table.predict_proba_one(record) == pytest.approx(expected[i], abs=1e-12)
+        assert table.predict_one(record) == int(expected[i] >= 0.3)
+
+    with pytest.raises(ValueError, match="shape"):
+        LRScoreTable(table.artifacts, table.proba[..., :-1])
+
+
+def test_lr_reason_codes_push_towards_churn(features, saved_run):
+    """reason codes นับเฉพาะ features ที่ contribution สูงกว่า baseline (bin ที่เสี่ยงน้อยที่สุด) ของ feature นั้น"""
+    from lr_tables import load_lr_contribution_table
+
+    X, _ = features
+    models_dir, lr_model, _, preprocessor_lr, _ = saved_run
+    table = load_lr_contribution_table(models_dir)
+    explanation = table.explain(X, top_k=3)
+
+    np.testing.assert_allclose(explanation["proba"],
+                               lr_model.predict_proba(preprocessor_lr.transform(X))[:, 1], rtol=0, atol=1e-12)
+    features_idx = explanation["reason_features"]
+    has_reason = features_idx >= 0
+    assert (explanation["reason_contributions"][has_reason] > 0).all()
+    assert (explanation["reason_contributions"][~has_reason] == 0).all()
+    assert (np.diff(explanation["reason_contributions"], axis=1) <= 0).all()
+
+    contributions, _ = table.gather(X)
+    relative = contributions - table.baselines
+    rows = np.nonzero(has_reason[:, 0])[0]
+    np.testing.assert_allclose(explanation["reason_contributions"][rows, 0], relative[rows].max(axis=1))
+    names = table.reason_names({key: value[:20] for key, value in explanation.items()})
+    assert [len(row) for row in names] == has_reason[:20].sum(axis=1).tolist()
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_score_file_rejects_bad_rows(churn_frame, saved_run, tmp_path, monkeypatch, n_jobs):
+    """แถวที่ score ไม่ได้ได้ค่าว่างและนับใน summary โดยแถวอื่นใน chunk เดียวกันยัง score ตามปกติ
+    (ข้อความในคอลัมน์ตัวเลขไม่ทำให้ job ล้ม, แต่ละ chunk predict ครั้งเดียวไม่ต้องแบ่งครึ่งหาแถวเสีย
+    n_jobs=2: chunk ถูกแบ่งให้ process pool แล้วต่อผลกลับตามลำดับแถวเดิม)"""
+    import score
+    from model_artifacts import load_model_artifacts
+    from score import FEATURE_COLS, PRED_COL, PROBA_COL, score_file
+
+    models_dir = saved_run[0]
+    frame = churn_frame.head(500).copy()
+    bad_rows = [3, 4, 250, 251]
+    frame[["Age", "EstimatedSalary"]] = frame[["Age", "EstimatedSalary"]].astype(object)
+    frame.loc[3, "Age"] = np.nan
+    frame.loc[4, "Age"] = "abc"
+    frame.loc[250, "Age"] = 999
+    frame.loc[251, "EstimatedSalary"] = "unknown"  # คอลัมน์ที่ไม่ถูก bin - XGBoost จะมองเป็น missing ถ้าไม่ reject
+    input_path = tmp_path / "customers.csv"
+    frame.to_csv(input_path, index=False)
+
+    good = frame.drop(index=bad_rows).astype({"Age": "int64", "EstimatedSalary": "float64"})
+    expected = load_model_artifacts(models_dir).predict_proba_xgb(good[FEATURE_COLS])
+    threshold = float(expected[0])  # probability ที่เท่ากับ threshold พอดีต้องได้ prediction = 1
+    predict_calls = []
+    predict_proba = score._predict_proba
+    monkeypatch.setattr(score, "_predict_proba",
+                        lambda *args: predict_calls.append(len(args[1])) or predict_proba(*args))
+    summary = score_file(input_path, tmp_path / "scores.csv", model="xgb", threshold=threshold,
+                         chunk_size=200, models_dir=models_dir, n_jobs=n_jobs)
+    if n_jobs == 1:
+        assert predict_calls == [198, 198, 100]
+    scores = pd.read_csv(tmp_path / "scores.csv")
+
+    assert summary["rows"] == len(frame) and summary["rows_rejected"] == len(bad_rows)
+    assert scores.loc[scores["RowNumber"].isin(frame.loc[bad_rows, "RowNumber"]), [PROBA_COL, PRED_COL]].isna().all().all()
+    scored = scores.dropna(subset=[PROBA_COL])
+    assert scored["RowNumber"].tolist() == good["RowNumber"].tolist()
+    np.testing.assert_allclose(scored[PROBA_COL], expected, rtol=0, atol=1e-6)
+    assert scored[PRED_COL].iloc[0] == 1
+    assert summary["churn_predictions"] == int(scored[PRED_COL].sum())
+
+
+def _post_score(server, record):
+    """เรียก ScoringRequestHandler.do_POST ใน process นี้โดยไม่เปิด socket - คืน (status, JSON body)"""
+    import io
+    import json
+
+    from serve import ScoringRequestHandler
+
+    body = json.dumps(record).encode("utf-8")
+    handler = ScoringRequestHandler.__new__(ScoringRequestHandler)
+    handler.server = server
+    handler.command, handler.path, handler.request_version = "POST", "/score", "HTTP/1.1"
+    handler.requestline = "POST /score HTTP/1.1"
+    handler.client_address = ("test", 0)
+    handler.headers = {"Content-Length": str(len(body))}
+    handler.rfile, handler.wfile = io.BytesIO(body), io.BytesIO()
+    handler.do_POST()
+    head, _, payload = handler.wfile.getvalue().partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def test_micro_batcher_routes_results_and_isolates_bad_records(churn_frame, saved_run):
+    """requests พร้อมกันถูกรวมเป็น batch ไม่เกิน max_batch_size, แต่ละ caller ได้ผลของ record ตัวเอง
+    และ record ที่ไม่ถูกต้องได้ 400 เฉพาะ request นั้น (requests อื่นใน batch เดียวกันได้ 200)"""
+    import json
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    from model_artifacts import load_model_artifacts
+    from score import FEATURE_COLS
+    from serve import MicroBatcher
+
+    artifacts = load_model_artifacts(saved_run[0])
+    batcher = MicroBatcher(artifacts, max_batch_size=4, max_wait_ms=200, threshold=0.5)
+    batch_sizes = []
+    predict_batch = batcher._predict_batch
+    batcher._predict_batch = lambda batch: batch_sizes.append(len(batch)) or predict_batch(batch)
+
+    records = json.loads(churn_frame[FEATURE_COLS].head(18).to_json(orient="records"))
+    bad = {5: {**records[5], "Age": -5}, 11: {k: v for k, v in records[11].items() if k != "Balance"}}
+    records = [bad.get(i, record) for i, record in enumerate(records)]
+    good = [i for i in range(len(records)) if i not in bad]
+    expected = artifacts.predict_proba_xgb(pd.DataFrame.from_records([records[i] for i in good]))
+    assert len(np.unique(expected)) == len(good)  # ผลคนละค่า -> ตรวจได้ว่าผลถึง caller ถูกคน
+
+    # requests ทั้งหมดเข้าคิวก่อน worker เริ่ม -> batches = 4, 4, 4, 4, 2
+    server = SimpleNamespace(batcher=batcher)
+    responses = [None] * len(records)
+
+    def call(i):
+        responses[i] = _post_score(server, records[i])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(records))]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while batcher._queue.qsize() < len(records) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    batcher.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    batcher.stop()
+
+    assert batch_sizes == [4, 4, 4, 4, 2]
+    assert [responses[i][0] for i in bad] == [400, 400]
+    assert "Age" in responses[5][1]["error"] and "Balance" in responses[11][1]["error"]
+    assert all(responses[i][0] == 200 for i in good)
+    np.testing.assert_allclose([responses[i][1]["churn_probability"] for i in good], expected, rtol=0, atol=1e-6)
+    assert [responses[i][1]["churn_prediction"] for i in good] == [int(p >= 0.5) for p in expected]
+    metrics = batcher.metrics.snapshot()
+    assert (metrics["requests"], metrics["errors"], metrics["batches"]) == (len(records), len(bad), 5)
+
 
 if __name__ == "__main__":
+    from data_prep import get_prepared_data
+
     print("\n" + "="*70)
     print("Testing Data Preparation Pipeline")
     print("="*70 + "\n")
-    
+
     # รัน pipeline
-    X_train, X_val, X_test, y_train, y_val, y_test, preprocessor = get_prepared_data()
-    
+    X_train, X_val, X_test, y_train, y_val, y_test, preprocessor_lr, preprocessor_xgb = get_prepared_data()
+
     print("\n" + "="*70)
     print("Testing Complete! Summary:")
     print("="*70)
     print(f"✓ X_train shape: {X_train.shape}")
     print(f"✓ X_val shape:   {X_val.shape}")
     print(f"✓ X_test shape:  {X_test.shape}")
-    print(f"✓ Preprocessor:  {type(preprocessor).__name__}")
+    print(f"✓ Preprocessors: {type(preprocessor_lr).__name__}, {type(preprocessor_xgb).__name__}")
     print("="*70 + "\n")
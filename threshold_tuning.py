@@ -6,7 +6,6 @@ Threshold Tuning Script
 
 import numpy as np
 import pandas as pd
-import pickle
 import matplotlib.pyplot as plt
 from pathlib import Path
 from sklearn.metrics import (
@@ -18,6 +17,7 @@ from sklearn.metrics import (
 from data_prep import get_prepared_data
 from logger_config import setup_logger
 from config import RUN_NUMBER, MODELS_DIR
+from model_artifacts import load_model_artifacts
 
 logger = setup_logger("threshold_tuning")
 
@@ -166,11 +166,7 @@ def main():
     logger.info(f"Loading models from: {models_dir}")
     
     # Load XGBoost model (ใช้ XGBoost เพราะดีที่สุด)
-    with open(models_dir / "xgboost.pkl", 'rb') as f:
-        xgb_model = pickle.load(f)
-    
-    with open(models_dir / "preprocessor_xgb.pkl", 'rb') as f:
-        preprocessor_xgb = pickle.load(f)
+    artifacts = load_model_artifacts(models_dir)
     
     logger.info("Models loaded successfully")
     
@@ -178,12 +174,9 @@ def main():
     logger.info("Loading test data...")
     X_train, X_val, X_test, y_train, y_val, y_test, _, _ = get_prepared_data()
     
-    # Preprocess test data
-    X_test_processed = preprocessor_xgb.transform(X_test)
-    
-    # Get predictions (probabilities)
+    # Get predictions (probabilities) - artifacts preprocess test data เอง
     logger.info("Getting predictions...")
-    y_pred_proba = xgb_model.predict_proba(X_test_processed)[:, 1]
+    y_pred_proba = artifacts.predict_proba_xgb(X_test)
     
     # Test different thresholds
     logger.info("Testing different thresholds...")
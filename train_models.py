@@ -3,27 +3,43 @@ Model Training Script
 Train Logistic Regression และ XGBoost models พร้อม 5-Fold Cross-Validation
 """
 
+import importlib
+import multiprocessing
+import os
+import time
 import numpy as np
 import pandas as pd
 import pickle
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import cross_validate
+from sklearn.base import clone
+from sklearn.model_selection import cross_validate, check_cv, PredefinedSplit
 from sklearn.metrics import (
     accuracy_score, precision_score, recall_score, 
     f1_score, roc_auc_score, confusion_matrix
 )
 import xgboost as xgb
+from joblib import Parallel, delayed
+from joblib.externals.loky import get_reusable_executor
 
-from data_prep import get_prepared_data
+from data_prep import get_prepared_data, build_shared_binner
 from imbalance_handlers import get_resampler
 from cost_sensitive import get_sample_weights
 from logger_config import setup_logger
+from lr_tables import save_lr_contribution_table, save_lr_score_table
+from model_artifacts import load_model_artifacts, save_model_artifacts
+from xgb_compiler import compile_booster, save_compiled_trees
+from parallel_transform import resolve_n_jobs
+from run_profiler import StageProfiler, profile_stage
 from config import (
     MODELS_DIR, PLOTS_DIR, RUN_NUMBER, CV_FOLDS, RANDOM_STATE,
     LR_MAX_ITER, LR_SOLVER,
     XGB_N_ESTIMATORS, XGB_MAX_DEPTH, XGB_LEARNING_RATE, XGB_RANDOM_STATE,
-    RESAMPLING_METHOD, USE_COST_SENSITIVE, COST_RATIO
+    RESAMPLING_METHOD, USE_COST_SENSITIVE, COST_RATIO,
+    USE_SHARED_BINNING, CV_N_JOBS, TRAIN_PARALLEL, TRAIN_N_CPUS,
+    XGB_REUSE_DMATRIX, XGB_EARLY_STOPPING_ROUNDS, XGB_EVAL_METRIC,
+    INCREMENTAL_FROM_RUN, INCREMENTAL_XGB_N_ESTIMATORS, RUN_PROFILE_FILE
 )
 
 logger = setup_logger("train_models")
@@ -56,10 +72,317 @@ def calculate_metrics(y_true, y_pred, y_pred_proba):
     }
 
 
-def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test):
+def get_cv(split_indices, n_train_samples):
+    """
+    เลือก CV splitter: ใช้ fold assignments ที่บันทึกไว้ถ้าจำนวนแถวยังตรงกับ train set
+    (resampling เช่น SMOTE เปลี่ยนจำนวนแถว จึงต้องกลับไปใช้ CV_FOLDS ปกติ)
+    """
+    if split_indices is not None and len(split_indices['cv_fold']) == n_train_samples:
+        logger.debug("Using persisted CV fold assignments")
+        return PredefinedSplit(split_indices['cv_fold'])
+    return CV_FOLDS
+
+
+def get_thread_budget(n_cpus=TRAIN_N_CPUS, cv_n_jobs=CV_N_JOBS, parallel_models=TRAIN_PARALLEL, n_folds=CV_FOLDS):
+    """
+    แบ่ง CPU cores ให้ LR / XGBoost และ CV folds โดยไม่ให้จำนวน threads รวมเกิน budget
+    
+    - budget ไม่เกินจำนวน cores ของเครื่อง
+    - parallel_models=True: LR ได้ครึ่งหนึ่ง (อย่างน้อย 1), XGBoost ได้ส่วนที่เหลือ
+      (ถ้ามี core เดียว LR จะ train ก่อน XGBoost ใน process หลักแทน)
+    - CV folds ที่รันพร้อมกันไม่เกินจำนวน folds และจำนวน cores ของ model นั้น
+    - XGBoost threads ต่อ fit = cores ของ XGBoost // จำนวน CV folds ที่รันพร้อมกัน
+    
+    Returns:
+        dict: {'parallel_models', 'lr_cv_jobs', 'xgb_cv_jobs', 'xgb_threads'}
+    """
+    total = min(resolve_n_jobs(n_cpus), os.cpu_count() or 1)
+    parallel_models = bool(parallel_models) and total > 1
+    if parallel_models:
+        lr_cpus = max(1, total // 2)
+        xgb_cpus = total - lr_cpus
+    else:
+        lr_cpus = xgb_cpus = total
+    
+    def cv_jobs(cpus):
+        # ค่าติดลบนับจาก cores ของ model นั้น (-1 = ทุก cores ที่ได้รับ)
+        jobs = cpus + 1 + cv_n_jobs if cv_n_jobs is not None and cv_n_jobs < 0 else resolve_n_jobs(cv_n_jobs)
+        return max(1, min(jobs, n_folds, cpus))
+    
+    budget = {'parallel_models': parallel_models, 'lr_cv_jobs': cv_jobs(lr_cpus), 'xgb_cv_jobs': cv_jobs(xgb_cpus)}
+    budget['xgb_threads'] = max(1, xgb_cpus // budget['xgb_cv_jobs'])
+    logger.info(f"Thread budget ({total} CPUs, parallel models={parallel_models}): {budget}")
+    return budget
+
+
+def _take_rows(data, indices):
+    return data.iloc[indices] if hasattr(data, "iloc") else data[indices]
+
+
+def _fit_and_score_weighted_fold(model, X, y, sample_weight, train_idx, test_idx, fit_params=None):
+    """fit 1 fold ด้วย sample_weight ของแถว train แล้วคำนวณ metrics ทั้งหมดจาก predict_proba ครั้งเดียว"""
+    X_fold_train = _take_rows(X, train_idx)
+    X_fold_test = _take_rows(X, test_idx)
+    y_fold_test = y[test_idx]
+    
+    start = time.perf_counter()
+    fold_weight = sample_weight[train_idx] if sample_weight is not None else None
+    model.fit(X_fold_train, y[train_idx], sample_weight=fold_weight, **(fit_params or {}))
+    fit_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    y_proba = model.predict_proba(X_fold_test)[:, 1]
+    # class 1 เมื่อ probability >= 0.5 (กติกาเดียวกับ threshold_tuning / score / serve)
+    y_pred = (y_proba >= 0.5).astype(int)
+    metrics = calculate_metrics(y_fold_test, y_pred, y_proba)
+    score_time = time.perf_counter() - start
+    return metrics, fit_time, score_time
+
+
+def cross_validate_weighted(model, X, y, sample_weight, cv=CV_FOLDS, n_jobs=None, fit_params=None):
+    """
+    Cross-validation ที่ส่ง sample_weight / fit params ของแต่ละ fold ไปตอน fit
+    (cross_validate ของ sklearn ส่ง sample_weight ให้ XGBoost ไม่ได้)
+    
+    - weights ถูก slice ตาม train rows ของแต่ละ fold, metrics คำนวณแบบไม่ถ่วงน้ำหนัก
+      (เทียบกับ CV ของ run ที่ไม่ใช้ cost-sensitive ได้โดยตรง)
+    - folds รันพร้อมกันด้วย joblib (n_jobs)
+    
+    Args:
+        model: estimator ที่ยังไม่ fit (จะถูก clone ต่อ fold)
+        sample_weight: array ของ weights ความยาวเท่า y (None = ไม่ถ่วงน้ำหนัก)
+        cv: จำนวน folds หรือ CV splitter
+        n_jobs: จำนวน folds ที่รันพร้อมกัน (None = ทีละ fold)
+        fit_params: kwargs เพิ่มเติมของ model.fit() (เช่น xgb_model สำหรับ train ต่อจาก model เดิม)
+    
+    Returns:
+        dict: keys เหมือน cross_validate() เช่น 'test_roc_auc', 'fit_time', 'score_time'
+    """
+    y = np.asarray(y)
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight)
+    folds = list(check_cv(cv, y, classifier=True).split(X, y))
+    
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_and_score_weighted_fold)(clone(model), X, y, sample_weight, train_idx, test_idx, fit_params)
+        for train_idx, test_idx in folds
+    )
+    return _collect_fold_scores(results)
+
+
+def _collect_fold_scores(results):
+    """รวมผลของแต่ละ fold [(metrics, fit_time, score_time), ...] เป็น dict แบบ cross_validate()"""
+    cv_scores = {
+        'fit_time': np.array([fit_time for _, fit_time, _ in results]),
+        'score_time': np.array([score_time for _, _, score_time in results]),
+    }
+    for metric in results[0][0]:
+        cv_scores[f'test_{metric}'] = np.array([metrics[metric] for metrics, _, _ in results])
+    return cv_scores
+
+
+def build_xgb_train_matrix(X, y, sample_weight=None, n_jobs=None):
+    """
+    แปลง train set เป็น float32 array และ QuantileDMatrix ครั้งเดียว
+    
+    QuantileDMatrix เก็บ histogram cuts ของ train set ทั้งหมด - final fit ใช้ matrix นี้โดยตรง
+    ส่วน CV folds ยังคัดลอก rows ของ array นี้ (X_array[train_idx]) และ quantize เป็น matrix ใหม่ทุก fold
+    แต่อ้างอิง cuts เดิม (ref) จึงไม่ต้องแปลง DataFrame และ sketch cuts ใหม่
+    
+    Returns:
+        tuple: (X_array, dtrain)
+    """
+    feature_names = list(X.columns) if hasattr(X, "columns") else None
+    X_array = np.ascontiguousarray(
+        X.to_numpy(dtype=np.float32) if hasattr(X, "to_numpy") else np.asarray(X, dtype=np.float32)
+    )
+    dtrain = xgb.QuantileDMatrix(
+        X_array, label=np.asarray(y), weight=sample_weight,
+        feature_names=feature_names, nthread=n_jobs
+    )
+    return X_array, dtrain
+
+
+def _xgb_train_params(xgb_model):
+    """booster params + จำนวน rounds แบบเดียวกับที่ XGBClassifier.fit() ใช้"""
+    params = {key: value for key, value in xgb_model.get_xgb_params().items() if value is not None}
+    return params, xgb_model.n_estimators
+
+
+def _fit_and_score_xgb_fold(params, num_boost_round, X_array, y, sample_weight, dtrain, train_idx, test_idx,
+                            init_booster=None):
+    """train booster 1 fold จาก rows ของ X_array (copy + quantize ด้วย cuts ของ dtrain) แล้วคำนวณ metrics"""
+    y_fold_test = y[test_idx]
+    
+    start = time.perf_counter()
+    dfold = xgb.QuantileDMatrix(
+        X_array[train_idx], label=y[train_idx],
+        weight=sample_weight[train_idx] if sample_weight is not None else None,
+        feature_names=dtrain.feature_names, ref=dtrain
+    )
+    booster = xgb.train(params, dfold, num_boost_round=num_boost_round, xgb_model=init_booster)
+    fit_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    y_proba = booster.inplace_predict(X_array[test_idx], validate_features=False)
+    y_pred = (y_proba >= 0.5).astype(int)
+    metrics = calculate_metrics(y_fold_test, y_pred, y_proba)
+    score_time = time.perf_counter() - start
+    return metrics, fit_time, score_time
+
+
+def cross_validate_xgb(xgb_model, X_array, y, dtrain, sample_weight=None, cv=CV_FOLDS, n_jobs=None,
+                       init_booster=None):
+    """
+    Cross-validation ของ XGBoost บน matrix ที่สร้างไว้แล้ว (build_xgb_train_matrix)
+    
+    - ทุก fold ใช้ histogram cuts ชุดเดียวกันของ dtrain (ไม่ sketch ใหม่ แต่ rows ของ fold ยังถูก copy และ quantize ใหม่)
+    - sample_weight (ถ้ามี) ถูก slice ตาม train rows ของแต่ละ fold
+    - folds รันพร้อมกันเป็น threads (xgb.train ปล่อย GIL และ DMatrix ไม่ต้อง pickle ข้าม process)
+    - init_booster (ถ้ามี): ทุก fold boost ต่อจาก model เดิม (incremental retraining)
+    
+    Returns:
+        dict: keys เหมือน cross_validate() เช่น 'test_roc_auc', 'fit_time', 'score_time'
+    """
+    y = np.asarray(y)
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight)
+    folds = list(check_cv(cv, y, classifier=True).split(X_array, y))
+    params, num_boost_round = _xgb_train_params(xgb_model)
+    # ส่ง model เดิมเป็น bytes - xgb.train โหลดสำเนาแยกของแต่ละ fold
+    init_raw = bytearray(init_booster.save_raw()) if init_booster is not None else None
+    
+    results = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(_fit_and_score_xgb_fold)(
+            params, num_boost_round, X_array, y, sample_weight, dtrain, train_idx, test_idx, init_raw
+        )
+        for train_idx, test_idx in folds
+    )
+    return _collect_fold_scores(results)
+
+
+def fit_xgb_from_matrix(xgb_model, dtrain, dval=None, early_stopping_rounds=None, init_booster=None):
+    """
+    Train xgb_model (XGBClassifier) บน dtrain ที่สร้างไว้แล้ว
+    ผลลัพธ์เหมือน xgb_model.fit(X, y, sample_weight) แต่ไม่ต้องแปลงข้อมูลซ้ำ
+    
+    Args:
+        dval: QuantileDMatrix ของ validation set (ใช้เมื่อมี early_stopping_rounds)
+        early_stopping_rounds: หยุดเมื่อ validation metric ไม่ดีขึ้นกี่ rounds (None = ไม่ใช้)
+        init_booster: booster เดิมที่จะ boost ต่อ (None = train ใหม่) - best_iteration ของ run เดิม
+            ถูกล้างก่อน train จึง truncate เฉพาะ best_iteration ที่ early stopping ของ run นี้บันทึก
+    """
+    params, num_boost_round = _xgb_train_params(xgb_model)
+    if init_booster is not None:
+        init_booster = clear_best_iteration(init_booster)
+    use_early_stopping = dval is not None and early_stopping_rounds is not None
+    booster = xgb.train(
+        params, dtrain,
+        num_boost_round=num_boost_round,
+        evals=[(dval, 'validation')] if use_early_stopping else (),
+        early_stopping_rounds=early_stopping_rounds if use_early_stopping else None,
+        verbose_eval=False,
+        xgb_model=init_booster
+    )
+    _load_booster(xgb_model, truncate_to_best_iteration(booster))
+    return xgb_model
+
+
+def _load_booster(xgb_model, booster):
+    # load_model ตั้ง attributes ของ sklearn wrapper (n_classes_, feature_names_in_ ฯลฯ) จาก booster
+    xgb_model.load_model(bytearray(booster.save_raw()))
+
+
+def truncate_to_best_iteration(booster):
+    """
+    ตัด trees หลัง best_iteration (ที่ early stopping ยัง train ต่อไปอีก early_stopping_rounds) ออก
+    เพื่อให้ model ที่บันทึก, SHAP และ scoring ใช้ trees ชุดเดียวกัน
+    
+    Returns:
+        xgb.Booster: booster ที่เหลือ best_iteration + 1 rounds (attributes best_iteration /
+            best_score ยังอยู่) หรือ booster เดิมถ้าไม่ได้ใช้ early stopping
+    """
+    best_iteration = booster.attr('best_iteration')
+    if best_iteration is None:
+        return booster
+    truncated = booster[:int(best_iteration) + 1]
+    truncated.set_attr(best_iteration=best_iteration, best_score=booster.attr('best_score'))
+    return truncated
+
+
+def clear_best_iteration(booster):
+    """
+    สำเนาของ booster ที่ไม่มี attributes best_iteration / best_score
+    
+    ใช้กับ model ของ run ก่อนหน้าก่อน boost ต่อ - attributes เหล่านี้ถูกคัดลอกไปยัง booster ใหม่
+    ถ้าไม่ล้าง truncate_to_best_iteration, XGBClassifier.predict และ compile_booster จะใช้
+    best_iteration ของ run เดิมและตัด trees ที่เพิ่งเพิ่มทิ้งทั้งหมด
+    
+    Returns:
+        xgb.Booster: สำเนาของ booster (booster เดิมไม่ถูกแก้)
+    """
+    cleared = booster.copy()
+    cleared.set_attr(best_iteration=None, best_score=None)
+    return cleared
+
+
+def get_best_iteration(xgb_model):
+    """best_iteration ของ model ที่ train ด้วย early stopping (None ถ้าไม่ได้ใช้)"""
+    try:
+        return xgb_model.best_iteration
+    except AttributeError:
+        return None
+
+
+def load_previous_run(run_number):
+    """
+    โหลด models + preprocessors ของ run ก่อนหน้าสำหรับ incremental retraining
+    
+    Returns:
+        dict: lr_model, xgb_model, preprocessor_lr, preprocessor_xgb และ lineage
+            (list ของ run numbers ตั้งแต่ run แรกที่ train ใหม่ทั้งหมดจนถึง run นี้)
+    
+    Raises:
+        ValueError: ถ้าไม่พบโฟลเดอร์หรือไฟล์ของ run นั้น
+    """
+    previous_dir = Path(MODELS_DIR) / f"run_{run_number}"
+    logger.info(f"Loading previous run #{run_number} from {previous_dir} for incremental training...")
+    
+    previous_run = {}
+    for key, filename in [('lr_model', 'logistic_regression.pkl'), ('xgb_model', 'xgboost.pkl'),
+                          ('preprocessor_lr', 'preprocessor_lr.pkl'), ('preprocessor_xgb', 'preprocessor_xgb.pkl')]:
+        path = previous_dir / filename
+        if not path.exists():
+            error_msg = f"Cannot continue from run #{run_number}: {path} not found"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        with open(path, 'rb') as f:
+            previous_run[key] = pickle.load(f)
+    
+    # run ก่อนหน้าที่เป็น incremental เองจะมีบรรทัด "Lineage: a -> b" ใน run_info.txt
+    lineage = [str(run_number)]
+    info_path = previous_dir / "run_info.txt"
+    if info_path.exists():
+        with open(info_path) as f:
+            for line in f:
+                if line.startswith("Lineage:"):
+                    lineage = [run.strip() for run in line.split(":", 1)[1].split("->")]
+    previous_run['lineage'] = lineage
+    logger.info(f"Previous run lineage: {' -> '.join(lineage)}")
+    return previous_run
+
+
+def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test, cv=CV_FOLDS, n_jobs=None,
+                              init_model=None):
     """
     Train Logistic Regression with class_weight='balanced'
     และทำ 5-Fold Cross-Validation
+    
+    Args:
+        cv: จำนวน folds หรือ CV splitter (เช่น จาก get_cv())
+        n_jobs: จำนวน CV folds ที่รันพร้อมกัน (None = ทีละ fold)
+        init_model: LogisticRegression ของ run ก่อนหน้า - final fit เริ่มจาก coefficients เดิม
+            (warm start) ส่วน CV folds train ใหม่ (LR เป็น convex จึงได้ optimum เดียวกัน)
     """
     logger.info("="*70)
     logger.info("Training Logistic Regression")
@@ -76,12 +399,14 @@ def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test):
     
     # Cross-Validation
     logger.info(f"Performing {CV_FOLDS}-Fold Cross-Validation...")
-    cv_scores = cross_validate(
-        lr_model, X_train, y_train,
-        cv=CV_FOLDS,
-        scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'],
-        return_train_score=False
-    )
+    with profile_stage("lr.cv"):
+        cv_scores = cross_validate(
+            lr_model, X_train, y_train,
+            cv=cv,
+            scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'],
+            return_train_score=False,
+            n_jobs=n_jobs
+        )
     
     logger.info("Cross-Validation Results:")
     for metric in ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']:
@@ -90,13 +415,26 @@ def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test):
     
     # Train บน train set ทั้งหมด
     logger.info("Training on full training set...")
-    lr_model.fit(X_train, y_train)
+    if init_model is not None:
+        if init_model.coef_.shape[1] != X_train.shape[1]:
+            error_msg = (f"Previous LR model has {init_model.coef_.shape[1]} features "
+                         f"but training data has {X_train.shape[1]}")
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        logger.info("Warm-starting from previous run's coefficients")
+        lr_model.set_params(warm_start=True)
+        lr_model.coef_ = init_model.coef_.copy()
+        lr_model.intercept_ = init_model.intercept_.copy()
+    with profile_stage("lr.fit"):
+        lr_model.fit(X_train, y_train)
+    logger.info(f"Converged in {lr_model.n_iter_[0]} iterations")
     
     # Evaluate บน validation set
     logger.info("Evaluating on validation set...")
-    y_val_pred = lr_model.predict(X_val)
-    y_val_proba = lr_model.predict_proba(X_val)[:, 1]
-    val_metrics = calculate_metrics(y_val, y_val_pred, y_val_proba)
+    with profile_stage("lr.evaluate.val"):
+        y_val_pred = lr_model.predict(X_val)
+        y_val_proba = lr_model.predict_proba(X_val)[:, 1]
+        val_metrics = calculate_metrics(y_val, y_val_pred, y_val_proba)
     
     logger.info("Validation Metrics:")
     for metric, value in val_metrics.items():
@@ -104,9 +442,10 @@ def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test):
     
     # Evaluate บน test set
     logger.info("Evaluating on test set...")
-    y_test_pred = lr_model.predict(X_test)
-    y_test_proba = lr_model.predict_proba(X_test)[:, 1]
-    test_metrics = calculate_metrics(y_test, y_test_pred, y_test_proba)
+    with profile_stage("lr.evaluate.test"):
+        y_test_pred = lr_model.predict(X_test)
+        y_test_proba = lr_model.predict_proba(X_test)[:, 1]
+        test_metrics = calculate_metrics(y_test, y_test_pred, y_test_proba)
     
     logger.info("Test Metrics:")
     for metric, value in test_metrics.items():
@@ -115,13 +454,39 @@ def train_logistic_regression(X_train, y_train, X_val, y_val, X_test, y_test):
     return lr_model, cv_scores, val_metrics, test_metrics
 
 
-def train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test, sample_weight=None):
+def train_logistic_regression_process(*args, **kwargs):
+    """
+    train_logistic_regression() สำหรับรันใน process แยก (TRAIN_PARALLEL)
+    
+    ปิด joblib worker pool ของ CV ก่อน return - ไม่งั้น process ลูกจะไม่จบและ
+    executor.shutdown() ของ process หลักจะรอค้าง
+    
+    Returns:
+        tuple: (ผลลัพธ์ของ train_logistic_regression(), stage profile records ของ process นี้)
+    """
+    profiler = StageProfiler().activate()
+    try:
+        return train_logistic_regression(*args, **kwargs), profiler.stages
+    finally:
+        if (kwargs.get('n_jobs') or 1) != 1:
+            get_reusable_executor().shutdown(wait=True)
+
+
+def train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test, sample_weight=None, cv=CV_FOLDS,
+                  n_jobs=None, cv_n_jobs=None, early_stopping_rounds=XGB_EARLY_STOPPING_ROUNDS, init_model=None):
     """
     Train XGBoost with scale_pos_weight
     และทำ 5-Fold Cross-Validation
     
     Args:
         sample_weight: Optional sample weights for cost-sensitive learning
+        cv: จำนวน folds หรือ CV splitter (เช่น จาก get_cv())
+        n_jobs: จำนวน threads ของ XGBoost ต่อการ fit 1 ครั้ง (None = ค่า default ของ XGBoost)
+        cv_n_jobs: จำนวน CV folds ที่รันพร้อมกัน (None = ทีละ fold)
+        early_stopping_rounds: หยุด final fit เมื่อ validation XGB_EVAL_METRIC ไม่ดีขึ้นกี่ rounds
+            (None = train ครบ XGB_N_ESTIMATORS) - CV folds ยัง train ครบทุก rounds
+        init_model: XGBClassifier ของ run ก่อนหน้า - CV folds และ final fit boost ต่อจาก trees เดิม
+            อีก INCREMENTAL_XGB_N_ESTIMATORS rounds (ข้อมูลต้องผ่าน preprocessor เดิมของ run นั้น)
     """
     logger.info("="*70)
     logger.info("Training XGBoost")
@@ -139,51 +504,117 @@ def train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test, sample_weight=
         logger.info(f"  Unique weights: {np.unique(sample_weight)}")
         logger.info(f"  Total weight: {sample_weight.sum():.2f}")
     
+    init_booster = None
+    n_estimators = XGB_N_ESTIMATORS
+    if init_model is not None:
+        # ล้าง best_iteration ของ run เดิม - early stopping (ถ้าใช้) บันทึกค่าใหม่ของ run นี้เอง
+        init_booster = clear_best_iteration(init_model.get_booster())
+        n_estimators = INCREMENTAL_XGB_N_ESTIMATORS
+        logger.info(f"Continuing from previous model ({init_booster.num_boosted_rounds()} rounds) "
+                    f"with {n_estimators} additional rounds")
+    
     # สร้าง model
     xgb_model = xgb.XGBClassifier(
-        n_estimators=XGB_N_ESTIMATORS,
+        n_estimators=n_estimators,
         max_depth=XGB_MAX_DEPTH,
         learning_rate=XGB_LEARNING_RATE,
         scale_pos_weight=scale_pos_weight,
         random_state=XGB_RANDOM_STATE,
-        eval_metric='logloss'
+        eval_metric=XGB_EVAL_METRIC,
+        n_jobs=n_jobs
     )
     logger.debug(f"Model params: {xgb_model.get_params()}")
     
     # Cross-Validation
     logger.info(f"Performing {CV_FOLDS}-Fold Cross-Validation...")
     
+    # XGB_REUSE_DMATRIX: แปลงข้อมูล + histogram cuts ครั้งเดียว ใช้ร่วมกันทุก fold และ final fit
     # Note: cross_validate ไม่รองรับ sample_weight โดยตรง
-    # ถ้าใช้ sample_weight จะต้อง skip CV หรือใช้ manual CV
-    if sample_weight is None:
-        cv_scores = cross_validate(
-            xgb_model, X_train, y_train,
-            cv=CV_FOLDS,
-            scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'],
-            return_train_score=False
-        )
-        
-        logger.info("Cross-Validation Results:")
-        for metric in ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']:
-            scores = cv_scores[f'test_{metric}']
-            logger.info(f"  {metric.upper()}: {scores.mean():.4f} (+/- {scores.std():.4f})")
+    # ถ้าใช้ sample_weight จะใช้ manual CV (cross_validate_weighted) แทน
+    if XGB_REUSE_DMATRIX:
+        logger.info("Building QuantileDMatrix once for CV folds and final fit...")
+        with profile_stage("xgb.build_matrix"):
+            X_train_array, dtrain = build_xgb_train_matrix(X_train, y_train, sample_weight, n_jobs=n_jobs)
+        with profile_stage("xgb.cv"):
+            cv_scores = cross_validate_xgb(
+                xgb_model, X_train_array, y_train, dtrain, sample_weight,
+                cv=cv,
+                n_jobs=cv_n_jobs,
+                init_booster=init_booster
+            )
+    elif sample_weight is None and init_booster is None:
+        with profile_stage("xgb.cv"):
+            cv_scores = cross_validate(
+                xgb_model, X_train, y_train,
+                cv=cv,
+                scoring=['accuracy', 'precision', 'recall', 'f1', 'roc_auc'],
+                return_train_score=False,
+                n_jobs=cv_n_jobs
+            )
     else:
-        logger.warning("Skipping Cross-Validation when using sample_weight")
-        logger.warning("(sklearn's cross_validate doesn't support sample_weight for XGBoost)")
-        cv_scores = None
+        # manual CV ส่ง sample_weight และ model เดิม (xgb_model) ให้ fit ของแต่ละ fold ได้
+        logger.info("Using manual Cross-Validation (sample_weight / previous model passed per fold)")
+        with profile_stage("xgb.cv"):
+            cv_scores = cross_validate_weighted(
+                xgb_model, X_train, y_train, sample_weight,
+                cv=cv,
+                n_jobs=cv_n_jobs,
+                fit_params={'xgb_model': init_booster} if init_booster is not None else None
+            )
     
-    # Train บน train set ทั้งหมด
+    logger.info("Cross-Validation Results:")
+    for metric in ['accuracy', 'precision', 'recall', 'f1', 'roc_auc']:
+        scores = cv_scores[f'test_{metric}']
+        logger.info(f"  {metric.upper()}: {scores.mean():.4f} (+/- {scores.std():.4f})")
+    
+    # Train บน train set ทั้งหมด (fit เดียว จึงใช้ threads ทั้งหมดที่ CV folds เคยแบ่งกันใช้)
     logger.info("Training on full training set...")
-    if sample_weight is not None:
-        xgb_model.fit(X_train, y_train, sample_weight=sample_weight)
-    else:
-        xgb_model.fit(X_train, y_train)
+    if n_jobs is not None and cv_n_jobs is not None and cv_n_jobs > 1:
+        xgb_model.set_params(n_jobs=n_jobs * cv_n_jobs)
+    if early_stopping_rounds is not None:
+        logger.info(f"Early stopping on validation {XGB_EVAL_METRIC} "
+                    f"(patience {early_stopping_rounds} rounds, max {n_estimators})")
+    with profile_stage("xgb.fit"):
+        if XGB_REUSE_DMATRIX:
+            dval = None
+            if early_stopping_rounds is not None:
+                X_val_array = np.ascontiguousarray(
+                    X_val.to_numpy(dtype=np.float32) if hasattr(X_val, "to_numpy") else np.asarray(X_val, dtype=np.float32)
+                )
+                dval = xgb.QuantileDMatrix(
+                    X_val_array, label=np.asarray(y_val),
+                    feature_names=dtrain.feature_names, ref=dtrain
+                )
+            fit_xgb_from_matrix(xgb_model, dtrain, dval, early_stopping_rounds=early_stopping_rounds,
+                                init_booster=init_booster)
+        else:
+            fit_kwargs = {}
+            if init_booster is not None:
+                fit_kwargs['xgb_model'] = init_booster
+            if sample_weight is not None:
+                fit_kwargs['sample_weight'] = sample_weight
+            if early_stopping_rounds is not None:
+                xgb_model.set_params(early_stopping_rounds=early_stopping_rounds)
+                fit_kwargs['eval_set'] = [(X_val, y_val)]
+                fit_kwargs['verbose'] = False
+            xgb_model.fit(X_train, y_train, **fit_kwargs)
+            if early_stopping_rounds is not None:
+                # model ที่ได้ refit ต่อได้โดยไม่ต้องมี eval_set
+                xgb_model.set_params(early_stopping_rounds=None)
+                _load_booster(xgb_model, truncate_to_best_iteration(xgb_model.get_booster()))
+    
+    best_iteration = get_best_iteration(xgb_model)
+    if best_iteration is not None:
+        logger.info(f"Best iteration: {best_iteration} "
+                    f"(validation {XGB_EVAL_METRIC}: {float(xgb_model.get_booster().attr('best_score')):.4f}, "
+                    f"kept {best_iteration + 1} rounds)")
     
     # Evaluate บน validation set
     logger.info("Evaluating on validation set...")
-    y_val_pred = xgb_model.predict(X_val)
-    y_val_proba = xgb_model.predict_proba(X_val)[:, 1]
-    val_metrics = calculate_metrics(y_val, y_val_pred, y_val_proba)
+    with profile_stage("xgb.evaluate.val"):
+        y_val_pred = xgb_model.predict(X_val)
+        y_val_proba = xgb_model.predict_proba(X_val)[:, 1]
+        val_metrics = calculate_metrics(y_val, y_val_pred, y_val_proba)
     
     logger.info("Validation Metrics:")
     for metric, value in val_metrics.items():
@@ -191,9 +622,10 @@ def train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test, sample_weight=
     
     # Evaluate บน test set
     logger.info("Evaluating on test set...")
-    y_test_pred = xgb_model.predict(X_test)
-    y_test_proba = xgb_model.predict_proba(X_test)[:, 1]
-    test_metrics = calculate_metrics(y_test, y_test_pred, y_test_proba)
+    with profile_stage("xgb.evaluate.test"):
+        y_test_pred = xgb_model.predict(X_test)
+        y_test_proba = xgb_model.predict_proba(X_test)[:, 1]
+        test_metrics = calculate_metrics(y_test, y_test_pred, y_test_proba)
     
     logger.info("Test Metrics:")
     for metric, value in test_metrics.items():
@@ -202,8 +634,13 @@ def train_xgboost(X_train, y_train, X_val, y_val, X_test, y_test, sample_weight=
     return xgb_model, cv_scores, val_metrics, test_metrics
 
 
-def save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_dir):
-    """Save trained models and their respective preprocessors"""
+def save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_dir, lineage=None):
+    """
+    Save trained models and their respective preprocessors
+    
+    Args:
+        lineage: run numbers ของ runs ก่อนหน้า (incremental training) - None = train ใหม่ทั้งหมด
+    """
     # Save Logistic Regression
     lr_path = models_dir / "logistic_regression.pkl"
     with open(lr_path, 'wb') as f:
@@ -228,6 +665,20 @@ def save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_d
         pickle.dump(preprocessor_xgb, f)
     logger.info(f"Saved XGBoost Preprocessor to {prep_xgb_path}")
     
+    # Native artifacts (xgboost.ubj / logistic_regression.npz / preprocessor.json)
+    # โหลดเร็วกว่าและไม่ต้อง import sklearn - ใช้โดย evaluate_models, threshold_tuning, shap_analysis
+    save_model_artifacts(models_dir, lr_model, xgb_model, preprocessor_lr, preprocessor_xgb)
+    
+    # XGBoost trees แบบ flat NumPy arrays (predict ทั้ง batch โดยไม่ต้อง import xgboost)
+    save_compiled_trees(models_dir, compile_booster(xgb_model.get_booster()))
+    
+    # LR tables: P(churn) ของทุก combination ของ input codes (scoring ด้วย lookup ครั้งเดียว)
+    # และ logit contribution ของแต่ละ (feature, bin) สำหรับ reason codes
+    artifacts = load_model_artifacts(models_dir)
+    if artifacts.preprocessor_spec.get("lr") is not None:
+        save_lr_score_table(models_dir, artifacts)
+        save_lr_contribution_table(models_dir, artifacts)
+    
     # Save run info
     info_path = models_dir / "run_info.txt"
     with open(info_path, 'w') as f:
@@ -239,14 +690,25 @@ def save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_d
         f.write(f"  XGB n_estimators: {XGB_N_ESTIMATORS}\n")
         f.write(f"  XGB max_depth: {XGB_MAX_DEPTH}\n")
         f.write(f"  XGB learning_rate: {XGB_LEARNING_RATE}\n")
+        best_iteration = get_best_iteration(xgb_model)
+        if best_iteration is not None:
+            f.write(f"  XGB early stopping: validation {XGB_EVAL_METRIC}, "
+                    f"best_iteration = {best_iteration} ({best_iteration + 1} trees)\n")
         f.write(f"\nPreprocessing:\n")
-        f.write(f"  LR: FixedBinnerForLR + OneHotEncoder\n")
-        f.write(f"  XGBoost: FixedBinnerForXGBoost (Label Encoding)\n")
+        f.write(f"  LR: {' + '.join(type(step).__name__ for _, step in preprocessor_lr.steps)}\n")
+        f.write(f"  XGBoost: {' + '.join(type(step).__name__ for _, step in preprocessor_xgb.steps)} (Label Encoding)\n")
         f.write(f"\nImbalanced Data Handling:\n")
         f.write(f"  Resampling Method: {RESAMPLING_METHOD}\n")
         f.write(f"  Cost-Sensitive Learning: {USE_COST_SENSITIVE}\n")
         if USE_COST_SENSITIVE:
             f.write(f"  Cost Ratio: {COST_RATIO}\n")
+        if lineage:
+            f.write(f"\nIncremental Training:\n")
+            f.write(f"  Previous Run: {lineage[-1]}\n")
+            f.write(f"  XGB rounds added: {INCREMENTAL_XGB_N_ESTIMATORS} "
+                    f"(total: {xgb_model.get_booster().num_boosted_rounds()})\n")
+            f.write(f"  LR: warm start from previous coefficients\n")
+            f.write(f"Lineage: {' -> '.join(list(lineage) + [str(RUN_NUMBER)])}\n")
     logger.info(f"Saved run info to {info_path}")
 
 
@@ -270,83 +732,163 @@ if __name__ == "__main__":
     logger.info("STARTING MODEL TRAINING PIPELINE")
     logger.info("="*70)
     
+    # วัดเวลา / CPU / memory ของแต่ละ stage -> models/run_{RUN_NUMBER}/run_profile.json
+    profiler = StageProfiler().activate()
+    
     # สร้างโฟลเดอร์
     models_dir, plots_dir = create_directories()
     
     # โหลดและเตรียมข้อมูล
     logger.info("Loading and preparing data...")
-    X_train, X_val, X_test, y_train, y_val, y_test, preprocessor_lr, preprocessor_xgb = get_prepared_data()
+    (X_train, X_val, X_test, y_train, y_val, y_test,
+     preprocessor_lr, preprocessor_xgb, split_indices) = get_prepared_data(return_split_indices=True, save_split=True)
+    
+    # แบ่ง CPU ให้ CV folds / XGBoost threads / LR process
+    thread_budget = get_thread_budget()
+    
+    # Incremental: ใช้ preprocessors เดิม (ไม่ fit ใหม่) เพื่อให้ bins / encodings ตรงกับ models เดิม
+    previous_run = None
+    if INCREMENTAL_FROM_RUN is not None:
+        with profile_stage("load_previous_run"):
+            previous_run = load_previous_run(INCREMENTAL_FROM_RUN)
+        preprocessor_lr = previous_run['preprocessor_lr']
+        preprocessor_xgb = previous_run['preprocessor_xgb']
+    
+    # Binning ครั้งเดียวสำหรับทั้ง 2 models (ถ้า preprocessors รองรับ)
+    shared_binner = None
+    if USE_SHARED_BINNING and previous_run is None:
+        shared_binner = build_shared_binner(preprocessor_lr, preprocessor_xgb)
+    if shared_binner is not None:
+        logger.info("Fitting shared binner (LR + XGBoost preprocessors in one pass)...")
+        # fit_transform: bin training data ครั้งเดียวทั้งตอนเรียนรู้ categories และตอนสร้างผลลัพธ์
+        with profile_stage("shared.preprocessor_fit_transform.train"):
+            X_train_lr, X_train_xgb = shared_binner.fit_transform(X_train, y_train)
+        
+        logger.info("Transforming datasets for LR and XGBoost...")
+        with profile_stage("shared.transform.val"):
+            X_val_lr, X_val_xgb = shared_binner.transform(X_val)
+        with profile_stage("shared.transform.test"):
+            X_test_lr, X_test_xgb = shared_binner.transform(X_test)
     
     # ===== Logistic Regression Pipeline =====
     logger.info("="*70)
     logger.info("LOGISTIC REGRESSION PIPELINE (with OneHot Encoding)")
     logger.info("="*70)
     
-    # Fit preprocessor และ transform สำหรับ LR
-    logger.info("Fitting LR preprocessor...")
-    preprocessor_lr.fit(X_train, y_train)
-    
-    logger.info("Transforming datasets for LR...")
-    X_train_lr = preprocessor_lr.transform(X_train)
-    X_val_lr = preprocessor_lr.transform(X_val)
-    X_test_lr = preprocessor_lr.transform(X_test)
+    if shared_binner is None:
+        # Fit preprocessor และ transform สำหรับ LR
+        if previous_run is None:
+            logger.info("Fitting LR preprocessor...")
+            with profile_stage("lr.preprocessor_fit"):
+                preprocessor_lr.fit(X_train, y_train)
+        else:
+            logger.info(f"Using LR preprocessor from run #{INCREMENTAL_FROM_RUN}")
+        
+        logger.info("Transforming datasets for LR...")
+        with profile_stage("lr.transform.train"):
+            X_train_lr = preprocessor_lr.transform(X_train)
+        with profile_stage("lr.transform.val"):
+            X_val_lr = preprocessor_lr.transform(X_val)
+        with profile_stage("lr.transform.test"):
+            X_test_lr = preprocessor_lr.transform(X_test)
     
     logger.info(f"LR Transformed shapes - Train: {X_train_lr.shape}, Val: {X_val_lr.shape}, Test: {X_test_lr.shape}")
     
     # Apply resampling if specified (เฉพาะ training set!)
     resampler = get_resampler(RESAMPLING_METHOD, random_state=RANDOM_STATE)
-    X_train_lr_resampled, y_train_lr_resampled = resampler(X_train_lr, y_train)
+    with profile_stage("lr.resample"):
+        X_train_lr_resampled, y_train_lr_resampled = resampler(X_train_lr, y_train)
     
     # Train Logistic Regression
-    lr_model, lr_cv, lr_val_metrics, lr_test_metrics = train_logistic_regression(
-        X_train_lr_resampled, y_train_lr_resampled,
-        X_val_lr, y_val,
-        X_test_lr, y_test
+    lr_args = (X_train_lr_resampled, y_train_lr_resampled, X_val_lr, y_val, X_test_lr, y_test)
+    lr_kwargs = dict(
+        cv=get_cv(split_indices, X_train_lr_resampled.shape[0]),
+        n_jobs=thread_budget['lr_cv_jobs'],
+        init_model=previous_run['lr_model'] if previous_run is not None else None,
     )
+    lr_executor = None
+    if thread_budget['parallel_models']:
+        # LR train ใน process แยกระหว่างที่ process หลักเตรียมข้อมูลและ train XGBoost
+        logger.info("Training Logistic Regression in a separate process (parallel with XGBoost)...")
+        # spawn: process ใหม่ไม่สืบทอด thread pools (OpenMP / BLAS) ของ process หลัก
+        # อ้างฟังก์ชันผ่าน module train_models เพื่อให้ process ลูก import ได้ (ไม่รัน __main__ ซ้ำ)
+        lr_executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        lr_future = lr_executor.submit(
+            importlib.import_module("train_models").train_logistic_regression_process, *lr_args, **lr_kwargs
+        )
+    else:
+        lr_model, lr_cv, lr_val_metrics, lr_test_metrics = train_logistic_regression(*lr_args, **lr_kwargs)
     
-    # ===== XGBoost Pipeline =====
-    logger.info("="*70)
-    logger.info("XGBOOST PIPELINE (with Label Encoding)")
-    logger.info("="*70)
-    
-    # Fit preprocessor และ transform สำหรับ XGBoost
-    logger.info("Fitting XGBoost preprocessor...")
-    preprocessor_xgb.fit(X_train, y_train)
-    
-    logger.info("Transforming datasets for XGBoost...")
-    X_train_xgb = preprocessor_xgb.transform(X_train)
-    X_val_xgb = preprocessor_xgb.transform(X_val)
-    X_test_xgb = preprocessor_xgb.transform(X_test)
-    
-    logger.info(f"XGBoost Transformed shapes - Train: {X_train_xgb.shape}, Val: {X_val_xgb.shape}, Test: {X_test_xgb.shape}")
-    
-    # Apply resampling if specified (เฉพาะ training set!)
-    # ใช้ resampler เดียวกันกับ LR
-    X_train_xgb_resampled, y_train_xgb_resampled = resampler(X_train_xgb, y_train)
-    
-    # Create sample weights for cost-sensitive learning (if enabled)
-    sample_weights_xgb = None
-    if USE_COST_SENSITIVE:
+    # process ของ LR ถูกปิดเสมอ แม้ XGBoost pipeline จะ error (ยกเลิกงานที่ยังไม่เริ่ม แล้วรอ process จบ)
+    try:
+        # ===== XGBoost Pipeline =====
         logger.info("="*70)
-        logger.info("COST-SENSITIVE LEARNING ENABLED")
+        logger.info("XGBOOST PIPELINE (with Label Encoding)")
         logger.info("="*70)
-        logger.info(f"Creating sample weights with cost_ratio={COST_RATIO}")
-        sample_weights_xgb = get_sample_weights(
-            y_train_xgb_resampled, 
-            method='cost_ratio', 
-            cost_ratio=COST_RATIO
+    
+        if shared_binner is None:
+            # Fit preprocessor และ transform สำหรับ XGBoost
+            if previous_run is None:
+                logger.info("Fitting XGBoost preprocessor...")
+                with profile_stage("xgb.preprocessor_fit"):
+                    preprocessor_xgb.fit(X_train, y_train)
+            else:
+                logger.info(f"Using XGBoost preprocessor from run #{INCREMENTAL_FROM_RUN}")
+        
+            logger.info("Transforming datasets for XGBoost...")
+            with profile_stage("xgb.transform.train"):
+                X_train_xgb = preprocessor_xgb.transform(X_train)
+            with profile_stage("xgb.transform.val"):
+                X_val_xgb = preprocessor_xgb.transform(X_val)
+            with profile_stage("xgb.transform.test"):
+                X_test_xgb = preprocessor_xgb.transform(X_test)
+    
+        logger.info(f"XGBoost Transformed shapes - Train: {X_train_xgb.shape}, Val: {X_val_xgb.shape}, Test: {X_test_xgb.shape}")
+    
+        # Apply resampling if specified (เฉพาะ training set!)
+        # ใช้ resampler เดียวกันกับ LR
+        with profile_stage("xgb.resample"):
+            X_train_xgb_resampled, y_train_xgb_resampled = resampler(X_train_xgb, y_train)
+    
+        # Create sample weights for cost-sensitive learning (if enabled)
+        sample_weights_xgb = None
+        if USE_COST_SENSITIVE:
+            logger.info("="*70)
+            logger.info("COST-SENSITIVE LEARNING ENABLED")
+            logger.info("="*70)
+            logger.info(f"Creating sample weights with cost_ratio={COST_RATIO}")
+            sample_weights_xgb = get_sample_weights(
+                y_train_xgb_resampled, 
+                method='cost_ratio', 
+                cost_ratio=COST_RATIO
+            )
+    
+        # Train XGBoost
+        xgb_model, xgb_cv, xgb_val_metrics, xgb_test_metrics = train_xgboost(
+            X_train_xgb_resampled, y_train_xgb_resampled,
+            X_val_xgb, y_val,
+            X_test_xgb, y_test,
+            sample_weight=sample_weights_xgb,
+            cv=get_cv(split_indices, X_train_xgb_resampled.shape[0]),
+            n_jobs=thread_budget['xgb_threads'],
+            cv_n_jobs=thread_budget['xgb_cv_jobs'],
+            init_model=previous_run['xgb_model'] if previous_run is not None else None
         )
     
-    # Train XGBoost
-    xgb_model, xgb_cv, xgb_val_metrics, xgb_test_metrics = train_xgboost(
-        X_train_xgb_resampled, y_train_xgb_resampled,
-        X_val_xgb, y_val,
-        X_test_xgb, y_test,
-        sample_weight=sample_weights_xgb
-    )
+        if lr_executor is not None:
+            with profile_stage("lr.wait_for_worker"):
+                (lr_model, lr_cv, lr_val_metrics, lr_test_metrics), lr_stages = lr_future.result()
+            profiler.add_records(lr_stages, process="lr_worker")
+            logger.info("Logistic Regression training process finished")
+    finally:
+        if lr_executor is not None:
+            lr_executor.shutdown(cancel_futures=True)
     
     # Save models
-    save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_dir)
+    with profile_stage("save"):
+        save_models(lr_model, xgb_model, preprocessor_lr, preprocessor_xgb, models_dir,
+                    lineage=previous_run['lineage'] if previous_run is not None else None)
+    profiler.save(models_dir / RUN_PROFILE_FILE, run_number=RUN_NUMBER)
     
     # Print comparison
     print_comparison(lr_test_metrics, xgb_test_metrics)
@@ -0,0 +1,332 @@
+"""
+XGBoost Compiler
+แปลง trees ของ XGBoost booster เป็น flat NumPy arrays แล้วทำนายแบบ vectorized ทั้ง batch
+โดยไม่ต้อง import xgboost / สร้าง DMatrix ตอน inference
+
+Layout: ทุก tree ถูก pad เป็น complete binary tree ลึก max_depth เก็บแบบ heap
+(children ของ node i คือ 2i+1 / 2i+2 จึงไม่ต้องเก็บ left / right) - leaf ที่ตื้นกว่า
+max_depth ถูกขยายเป็น leaves ที่มีค่าเดียวกัน ส่วน (feature, threshold, default_left)
+ที่ซ้ำกันระหว่าง nodes (trees บน binned features ใช้ thresholds ชุดเดียวกันบ่อย) ถูกเก็บครั้งเดียว
+
+Predict ต่อ block ของแถว:
+1. เทียบทุก unique split ครั้งเดียว -> bits (n_splits, n_rows)
+2. max_depth <= 4: bits ของ nodes ใน tree รวมเป็น key ด้วย matmul ครั้งเดียว แล้ว lookup
+   leaf value จากตารางของแต่ละ tree (ทุก key ที่เป็นไปได้คำนวณไว้ตอนโหลด)
+   trees ที่ลึกกว่า: เดินทีละ level แบบ vectorized (gather ของ bits ตาม node ปัจจุบัน)
+3. รวม leaf values ทีละ tree ตามลำดับใน float32 แบบเดียวกับ CPU predictor ของ XGBoost
+
+trees ให้ leaf values เดียวกับ XGBoost ทุก bit (ทั้ง 2 วิธีในข้อ 2 และเมื่อมี NaN) และลำดับการบวก
+เหมือนกัน แต่ margin ไม่รับประกันว่าตรงทุก bit: base margin คำนวณจาก log ของ NumPy / math
+ไม่ใช่ logf ของ C library ที่ XGBoost ใช้ จึงอาจต่างกัน 1 ulp (พบ ~1 ใน 160 models ที่ทดสอบ)
+ซึ่งทำให้ margin ต่างได้ ~1e-6 - probability ต่างได้อีก ~1 ulp ของ float32 จาก implementation ของ exp
+
+Usage:
+    compiled = compile_booster(xgb_model.get_booster())   # ตอน train (ต้องมี xgboost)
+    save_compiled_trees(models_dir, compiled)
+
+    compiled = load_compiled_trees(models_dir)             # ตอน inference (NumPy อย่างเดียว)
+    proba = compiled.predict_proba(X_encoded)              # X ที่ผ่าน preprocessor_xgb แล้ว
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+
+from config import MODELS_DIR, RUN_NUMBER
+from logger_config import setup_logger
+
+logger = setup_logger("xgb_compiler")
+
+XGB_COMPILED_TREES_FILE = "xgboost_trees.npz"
+
+# จำนวนแถวต่อ block (memory ต่อ block ~ block x (n_splits + n_trees) x 4-8 bytes)
+PREDICT_BLOCK_SIZE = 16_384
+
+# ความลึกสูงสุดที่ใช้ leaf lookup table (ตารางละ 2^(2^depth - 1) ค่า: depth 4 = 32,768)
+LOOKUP_MAX_DEPTH = 4
+
+
+class CompiledTrees:
+    """
+    Tree ensemble (binary:logistic, gbtree) ในรูป flat arrays
+
+    Args:
+        split_feature: (n_splits,) int32 - feature index ของแต่ละ unique split
+        split_threshold: (n_splits,) float32 - ไปขวาถ้า x >= threshold
+        split_default_left: (n_splits,) bool - ทางที่ missing value (NaN) ไป
+        node_split: (n_trees, 2^depth - 1) int32 - split ของแต่ละ node (heap order),
+            n_splits = node ที่ pad ไว้ (ไปซ้ายเสมอ)
+        leaf_value: (n_trees, 2^depth) float32 - leaf values ตามลำดับซ้ายไปขวา
+        base_margin: float32 - margin เริ่มต้น (logit ของ base_score)
+        feature_names: ลำดับ features ตอน train (optional)
+    """
+
+    def __init__(self, split_feature, split_threshold, split_default_left, node_split, leaf_value,
+                 base_margin, feature_names=None):
+        self.split_feature = np.asarray(split_feature, dtype=np.intp)
+        self.split_threshold = np.asarray(split_threshold, dtype=np.float32)
+        self.split_default_left = np.asarray(split_default_left, dtype=bool)
+        self.node_split = np.asarray(node_split, dtype=np.int32)
+        self.leaf_value = np.asarray(leaf_value, dtype=np.float32)
+        self.base_margin = np.float32(base_margin)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+
+        n_internal = self.node_split.shape[1]
+        self.depth = int(np.log2(n_internal + 1))
+        n_splits = len(self.split_feature)
+
+        if self.depth <= LOOKUP_MAX_DEPTH:
+            # key ของแถวใน tree t = ผลรวม 2^h ของ nodes h ที่ไปขวา -> weights (n_trees, n_splits)
+            self._key_weights = np.zeros((n_splits + 1, self.n_trees), dtype=np.float32)
+            for t in range(self.n_trees):
+                np.add.at(self._key_weights[:, t], self.node_split[t], 2.0 ** np.arange(n_internal))
+            self._key_weights = np.ascontiguousarray(self._key_weights[:n_splits].T)
+
+            # leaf ของทุก key: เดิน heap ตาม bit ของ node ปัจจุบัน
+            keys = np.arange(2 ** n_internal)
+            node = np.zeros_like(keys)
+            for _ in range(self.depth):
+                node = 2 * node + 1 + ((keys >> node) & 1)
+            self._leaf_lookup = self.leaf_value[:, node - n_internal].ravel()
+            self._key_offsets = (np.arange(self.n_trees, dtype=np.float32) * 2 ** n_internal)[:, None]
+        else:
+            self._key_weights = None
+
+    @property
+    def n_trees(self):
+        return self.node_split.shape[0]
+
+    def _split_bits(self, X_columns):
+        """ผลของทุก unique split (True = ไปขวา) - shape (n_splits, n_rows)"""
+        values = X_columns[self.split_feature]
+        go_right = values >= self.split_threshold[:, None]
+        missing = np.isnan(values)
+        if missing.any():
+            # NaN >= threshold เป็น False อยู่แล้ว -> ต้องแก้เฉพาะ splits ที่ default ไปขวา
+            go_right |= missing & ~self.split_default_left[:, None]
+        return go_right
+
+    def _leaf_values(self, X_columns):
+        """leaf value ของทุก (tree, row) - shape (n_trees, n_rows) float32"""
+        go_right = self._split_bits(X_columns)
+        n_rows = X_columns.shape[1]
+
+        if self._key_weights is not None:
+            # matmul ของ 0/1 กับ powers of 2 ได้ integer ที่ exact ใน float32 (keys + offsets < 2^24)
+            keys = self._key_weights @ go_right.astype(np.float32)
+            keys += self._key_offsets
+            return self._leaf_lookup.take(keys.astype(np.int32))
+
+        # trees ลึก: เดินทีละ level - แถวสุดท้ายของ bits (= 0) ใช้กับ nodes ที่ pad ไว้
+        n_splits = go_right.shape[0]
+        bits = np.zeros((n_splits + 1, n_rows), dtype=np.intp)
+        bits[:n_splits] = go_right
+        bits = bits.ravel()
+        rows = np.arange(n_rows, dtype=np.intp)
+        n_internal = self.node_split.shape[1]
+        tree_offsets = (np.arange(self.n_trees, dtype=np.intp) * n_internal)[:, None]
+        node_split = self.node_split.ravel().astype(np.intp)
+        node = np.zeros((self.n_trees, n_rows), dtype=np.intp)
+        for _ in range(self.depth):
+            split = node_split.take(node + tree_offsets)
+            node = 2 * node + 1 + bits.take(split * n_rows + rows)
+        leaf_offsets = (np.arange(self.n_trees, dtype=np.intp) * self.leaf_value.shape[1])[:, None]
+        return self.leaf_value.ravel().take(node - n_internal + leaf_offsets)
+
+    def predict_margin(self, X):
+        """
+        Margin (logit) ของทุกแถว
+
+        Args:
+            X: array (n_rows, n_features) ที่ผ่าน preprocessor_xgb แล้ว (จะถูกแปลงเป็น float32)
+
+        Returns:
+            np.ndarray (float32): shape (n_rows,)
+        """
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2:
+            error_msg = f"Expected a 2D array, got shape {X.shape}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        if self.feature_names is not None and X.shape[1] != len(self.feature_names):
+            error_msg = f"Expected {len(self.feature_names)} features, got {X.shape[1]}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        margin = np.empty(X.shape[0], dtype=np.float32)
+        for start in range(0, X.shape[0], PREDICT_BLOCK_SIZE):
+            # layout (features, rows): แต่ละ split เทียบกับแถวของ array ที่ต่อเนื่องกันใน memory
+            X_columns = np.ascontiguousarray(X[start:start + PREDICT_BLOCK_SIZE].T)
+            leaves = self._leaf_values(X_columns)
+            block_margin = np.full(X_columns.shape[1], self.base_margin, dtype=np.float32)
+            # รวมทีละ tree ตามลำดับ (float32) ให้ได้ค่าเดียวกับ XGBoost - sum() ของ NumPy
+            # เป็นแบบ pairwise ซึ่งลำดับการบวกต่างออกไป
+            for tree_leaves in leaves:
+                block_margin += tree_leaves
+            margin[start:start + X_columns.shape[1]] = block_margin
+        return margin
+
+    def predict_proba(self, X):
+        """P(churn) ของทุกแถว (1D float32 array เหมือน Booster.inplace_predict)"""
+        margin = self.predict_margin(X)
+        return np.float32(1.0) / (np.float32(1.0) + np.exp(-margin))
+
+    def predict(self, X, threshold=0.5):
+        """ทำนาย 0/1 (probability >= threshold เหมือน score.py / serve.py)"""
+        return (self.predict_proba(X) >= threshold).astype(int)
+
+
+def _iteration_range(booster):
+    """trees ถึง best_iteration (early stopping) เหมือน XGBClassifier.predict_proba"""
+    best_iteration = booster.attr("best_iteration")
+    return (0, int(best_iteration) + 1) if best_iteration is not None else (0, 0)
+
+
+def _tree_depth(left, right):
+    """ความลึกของ tree (root อย่างเดียว = 0)"""
+    depth, stack = 0, [(0, 0)]
+    while stack:
+        node, node_depth = stack.pop()
+        if left[node] == -1:
+            depth = max(depth, node_depth)
+        else:
+            stack.append((left[node], node_depth + 1))
+            stack.append((right[node], node_depth + 1))
+    return depth
+
+
+def compile_booster(booster, iteration_range=None):
+    """
+    แปลง xgb.Booster เป็น CompiledTrees
+
+    Args:
+        booster: xgb.Booster ที่ train แล้ว (objective binary:logistic, booster gbtree)
+        iteration_range: (start, end) ของ boosting rounds - None = ถึง best_iteration ถ้ามี
+
+    Raises:
+        ValueError: ถ้า model ไม่รองรับ (objective / booster อื่น, categorical splits)
+    """
+    if iteration_range is None:
+        iteration_range = _iteration_range(booster)
+
+    learner = json.loads(booster.save_raw(raw_format="json"))["learner"]
+    gbm = learner["gradient_booster"]
+    if learner["objective"]["name"] != "binary:logistic" or gbm.get("name") != "gbtree":
+        error_msg = (f"Only binary:logistic gbtree models can be compiled, got "
+                     f"{learner['objective']['name']} / {gbm.get('name')}")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    model = gbm["model"]
+    trees_json = model["trees"]
+    start, end = iteration_range
+    if end > 0:
+        per_round = int(model["gbtree_model_param"]["num_parallel_tree"])
+        trees_json = trees_json[start * per_round:end * per_round]
+    if any(any(tree["split_type"]) for tree in trees_json):
+        error_msg = "Categorical splits are not supported by the tree compiler"
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    depth = max(_tree_depth(tree["left_children"], tree["right_children"]) for tree in trees_json)
+    n_internal = 2 ** depth - 1
+
+    splits = {}  # (feature, threshold, default_left) -> split index
+    node_split = np.empty((len(trees_json), n_internal), dtype=np.int32)
+    leaf_value = np.empty((len(trees_json), 2 ** depth), dtype=np.float32)
+    padded = np.zeros((len(trees_json), n_internal), dtype=bool)
+    for t, tree in enumerate(trees_json):
+        left, right = tree["left_children"], tree["right_children"]
+        # XGBoost เทียบ split ด้วย float32 และ leaf value ถูกเก็บใน split_conditions
+        condition = np.asarray(tree["split_conditions"], dtype=np.float32)
+        stack = [(0, 0)]  # (node, heap position)
+        while stack:
+            node, position = stack.pop()
+            if left[node] != -1:
+                key = (int(tree["split_indices"][node]), float(condition[node]), bool(tree["default_left"][node]))
+                node_split[t, position] = splits.setdefault(key, len(splits))
+                stack.append((left[node], 2 * position + 1))
+                stack.append((right[node], 2 * position + 2))
+                continue
+            # leaf ที่ตื้นกว่า depth: nodes ใต้ตำแหน่งนี้เป็น padding และ leaves ทั้งช่วงได้ค่าเดียวกัน
+            first, width = position, 1
+            while first < n_internal:
+                padded[t, first:first + width] = True
+                first, width = 2 * first + 1, width * 2
+            leaf_value[t, first - n_internal:first - n_internal + width] = condition[node]
+    node_split[padded] = len(splits)
+
+    # base_score เก็บเป็น probability (เช่น "[5E-1]") -> แปลงเป็น logit แบบเดียวกับ XGBoost:
+    # -log(1 / p - 1) โดย 1 / p - 1 คำนวณใน float32 (logit แบบ float64 ต่างได้ 1 ulp ใน ~2/3 ของ models)
+    base_score = np.float32(learner["learner_model_param"]["base_score"].strip("[]"))
+    base_margin = -math.log(float(np.float32(1.0) / base_score - np.float32(1.0)))
+
+    keys = list(splits)
+    compiled = CompiledTrees(
+        split_feature=[key[0] for key in keys],
+        split_threshold=[key[1] for key in keys],
+        split_default_left=[key[2] for key in keys],
+        node_split=node_split,
+        leaf_value=leaf_value,
+        base_margin=base_margin,
+        feature_names=learner.get("feature_names") or None,
+    )
+    logger.debug(f"Compiled {compiled.n_trees} trees (depth {depth}, {len(keys)} unique splits)")
+    return compiled
+
+
+def save_compiled_trees(models_dir, compiled):
+    """บันทึก CompiledTrees ลง models_dir - คืน Path ของไฟล์"""
+    path = Path(models_dir) / XGB_COMPILED_TREES_FILE
+    np.savez_compressed(
+        path,
+        split_feature=compiled.split_feature.astype(np.int32),
+        split_threshold=compiled.split_threshold,
+        split_default_left=compiled.split_default_left,
+        node_split=compiled.node_split,
+        leaf_value=compiled.leaf_value,
+        base_margin=compiled.base_margin,
+        feature_names=np.asarray(compiled.feature_names or [], dtype=str),
+    )
+    logger.info(f"Saved compiled XGBoost trees ({compiled.n_trees} trees, depth {compiled.depth}) to {path}")
+    return path
+
+
+def load_compiled_trees(models_dir=None):
+    """
+    โหลด CompiledTrees จาก models/run_{RUN_NUMBER}/ (ไม่ import xgboost)
+
+    Raises:
+        ValueError: ถ้าไม่พบไฟล์
+    """
+    if models_dir is None:
+        models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    path = Path(models_dir) / XGB_COMPILED_TREES_FILE
+    if not path.exists():
+        error_msg = (f"Compiled XGBoost trees not found: {path}. "
+                     f"Run 'python xgb_compiler.py' to compile the booster of this run.")
+        logger.error(error_msg)
+        raise ValueError(error_msg)
+
+    with np.load(path) as data:
+        return CompiledTrees(
+            split_feature=data["split_feature"],
+            split_threshold=data["split_threshold"],
+            split_default_left=data["split_default_left"],
+            node_split=data["node_split"],
+            leaf_value=data["leaf_value"],
+            base_margin=data["base_margin"],
+            feature_names=data["feature_names"].tolist() or None,
+        )
+
+
+if __name__ == "__main__":
+    import xgboost as xgb
+
+    from model_artifacts import XGB_ARTIFACT_FILE
+
+    models_dir = Path(MODELS_DIR) / f"run_{RUN_NUMBER}"
+    booster = xgb.Booster(model_file=str(models_dir / XGB_ARTIFACT_FILE))
+    save_compiled_trees(models_dir, compile_booster(booster))